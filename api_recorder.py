@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上游API响应的录制与回放
+功能：
+1. APIRecorder：把fetch_user_live_videos的原始响应（时间戳、webcast_id、HTTP状态、响应体）写入gzip压缩的JSONL文件
+   （后台线程写入，不阻塞事件循环）
+2. ReplayServer：本地HTTP服务器按录制时间线回放响应，可实时、加速，或由调用方直接设置回放时刻
+3. 命令行：录制真实API，启动回放服务器替代localhost:8000，或生成模拟录制
+
+用法：
+    python api_recorder.py record --out recording.jsonl.gz --interval 10 --duration 600
+    python api_recorder.py replay recording.jsonl.gz --speed 10 --port 8000
+    python api_recorder.py synth --out synthetic.jsonl.gz --rooms 50 --duration 3600
+"""
+
+import argparse
+import asyncio
+import bisect
+import gzip
+import json
+import random
+import threading
+import time
+
+from aiohttp import web
+
+from douyin_api_client import DEFAULT_API_BASE_URL, AsyncDouyinAPIClient
+from room_poller import AsyncRoomPoller
+
+
+class APIRecorder:
+    """把原始响应追加到gzip压缩的JSONL文件
+
+    record只在内存中排队，JSON编码和gzip压缩写入由后台线程完成（与history_log相同），
+    不占用事件循环；每flush_interval秒或排队达到flush_every条时写入一次。
+    """
+
+    def __init__(self, path, flush_every=100, flush_interval=1.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval    # 后台线程写入间隔（秒）
+        self.records = 0
+        self.records_written = 0
+        self._pending = []
+        self._lock = threading.Lock()           # 保护排队的响应
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+
+    def record(self, webcast_id, status, body, timestamp=None):
+        """排队一条响应（由后台线程写入）"""
+        record = (time.time() if timestamp is None else timestamp, webcast_id, status, body)
+        with self._lock:
+            self._pending.append(record)
+            pending = len(self._pending)
+        self.records += 1
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='api-recorder', daemon=True)
+            self._thread.start()
+        if pending >= self.flush_every:
+            self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            stopping = self._stopping
+            try:
+                self._write_pending()
+            except Exception as e:
+                print(f"❌ 写入录制文件出错: {e}")
+            if stopping:
+                break
+
+    def _write_pending(self):
+        with self._lock:
+            records, self._pending = self._pending, []
+        if not records:
+            return
+        lines = [json.dumps({'t': t, 'webcast_id': webcast_id, 'status': status, 'body': body}, ensure_ascii=False)
+                 for t, webcast_id, status, body in records]
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+        self.records_written += len(records)
+
+    def close(self):
+        """写完剩余响应后停止后台线程并关闭文件"""
+        if self._thread is not None:
+            self._stopping = True
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+        if self._file is not None:
+            self._write_pending()
+            self._file.close()
+            self._file = None
+
+
+def load_recording(path):
+    """读取录制文件，按时间排序返回记录列表"""
+    records = []
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    records.sort(key=lambda record: record['t'])
+    return records
+
+
+class ReplayServer:
+    """按录制时间线回放上游响应
+
+    每个请求返回该直播间在"当前回放时刻"之前最近的一条响应（回放时刻早于第一条时返回第一条）。
+    回放时刻默认为 录制开始时间 + 实际经过时间 × speed；调用set_time后改为手动控制，
+    用于确定性地驱动控制器。
+    """
+
+    NOT_FOUND_BODY = json.dumps({'code': 404, 'data': None})
+
+    def __init__(self, records, speed=1.0):
+        self.speed = speed
+        self.rooms = {}   # webcast_id -> (时间列表, 记录列表)
+        for record in records:
+            times, items = self.rooms.setdefault(record['webcast_id'], ([], []))
+            times.append(record['t'])
+            items.append(record)
+        self.start_time = records[0]['t'] if records else 0.0
+        self.end_time = records[-1]['t'] if records else 0.0
+        self.manual_time = None
+        self._started = time.monotonic()
+        self._runner = None
+        self.served = 0
+        self.unknown = 0
+
+    @classmethod
+    def from_file(cls, path, speed=1.0):
+        return cls(load_recording(path), speed)
+
+    def now(self):
+        """当前回放时刻（录制时的Unix时间）"""
+        if self.manual_time is not None:
+            return self.manual_time
+        return self.start_time + (time.monotonic() - self._started) * self.speed
+
+    def set_time(self, timestamp):
+        self.manual_time = timestamp
+
+    @property
+    def finished(self):
+        return self.now() > self.end_time
+
+    def lookup(self, webcast_id, at=None):
+        room = self.rooms.get(webcast_id)
+        if room is None:
+            return None
+        times, items = room
+        index = bisect.bisect_right(times, self.now() if at is None else at) - 1
+        return items[max(index, 0)]
+
+    async def handle(self, request):
+        record = self.lookup(request.query.get('webcast_id', ''))
+        if record is None:
+            self.unknown += 1
+            return web.Response(text=self.NOT_FOUND_BODY, content_type='application/json')
+        self.served += 1
+        return web.Response(status=record['status'], text=record['body'], content_type='application/json')
+
+    async def start(self, host='127.0.0.1', port=8000):
+        app = web.Application()
+        app.router.add_get('/{tail:.*}', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        self._started = time.monotonic()
+        return f"http://{host}:{port}/api/douyin/web/fetch_user_live_videos"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def synthetic_body(webcast_id, user_count, status=2):
+    """构造与fetch_user_live_videos格式一致的响应体"""
+    return json.dumps({
+        'code': 200,
+        'data': {'data': {
+            'data': [{'status': status, 'title': f'直播{webcast_id[-4:]}', 'id_str': webcast_id,
+                      'stats': {'user_count_str': str(user_count)}}],
+            'user': {'nickname': f'主播{webcast_id[-4:]}'}
+        }}
+    }, ensure_ascii=False)
+
+
+def synthesize(path, rooms=50, duration=3600.0, interval=3.0, seed=0):
+    """生成模拟录制：人数随机游走，前几名人数接近，部分直播间会下播，结果可复现"""
+    rng = random.Random(seed)
+    start = 1700000000.0
+    counts = {str(7000000000000 + index): 20000 / (1 + 0.08 * index) for index in range(rooms)}
+    offline_at = {webcast_id: rng.uniform(0, duration) for webcast_id in rng.sample(sorted(counts), rooms // 10)}
+    recorder = APIRecorder(path)
+    try:
+        elapsed = 0.0
+        while elapsed <= duration:
+            for webcast_id in counts:
+                counts[webcast_id] = max(counts[webcast_id] * (1 + rng.gauss(0, 0.02)), 0)
+                if elapsed >= offline_at.get(webcast_id, duration + 1):
+                    body = json.dumps({'code': 200, 'data': {'data': {'data': [], 'user': {}}}})
+                else:
+                    body = synthetic_body(webcast_id, int(counts[webcast_id]))
+                recorder.record(webcast_id, 200, body, timestamp=start + elapsed)
+            elapsed += interval
+    finally:
+        recorder.close()
+    return recorder.records
+
+
+def _read_webcast_ids(path):
+    webcast_ids = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if 'live.douyin.com/' in line:
+                webcast_id = line.split('live.douyin.com/')[1].split('?')[0].strip('/')
+                if webcast_id.isdigit():
+                    webcast_ids.append(webcast_id)
+    return webcast_ids
+
+
+async def record_main(args):
+    webcast_ids = _read_webcast_ids(args.urls)
+    if not webcast_ids:
+        print(f"❌ {args.urls} 中没有有效的直播间URL")
+        return
+    recorder = APIRecorder(args.out)
+    client = AsyncDouyinAPIClient(args.api)
+    client.recorder = recorder
+    poller = AsyncRoomPoller(client, max_concurrency=8)
+    print(f"⏺️ 开始录制 {len(webcast_ids)} 个直播间，每{args.interval}秒一轮，共{args.duration}秒 → {args.out}")
+    deadline = time.monotonic() + args.duration
+    try:
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            live_infos = await poller.poll(webcast_ids)
+            ok = sum(1 for info in live_infos if info['success'])
+            print(f"📥 已录制 {recorder.records} 条响应（本轮成功 {ok}/{len(live_infos)}）")
+            await asyncio.sleep(max(args.interval - (time.monotonic() - started), 0))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        await poller.close()
+        recorder.close()
+    print(f"✅ 录制完成: {recorder.records} 条响应")
+
+
+async def replay_main(args):
+    server = ReplayServer.from_file(args.recording, speed=args.speed)
+    url = await server.start(args.host, args.port)
+    duration = (server.end_time - server.start_time) / args.speed
+    print(f"▶️ 回放 {len(server.rooms)} 个直播间，录制时长 {server.end_time - server.start_time:.0f}秒，"
+          f"{args.speed:g}倍速约 {duration:.0f}秒")
+    print(f"🔗 API地址: {url}")
+    try:
+        while not server.finished:
+            await asyncio.sleep(1)
+        print(f"⏹️ 回放结束，共响应 {server.served} 次（未知直播间 {server.unknown} 次），继续返回最后一条响应，按Ctrl+C退出")
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='上游API响应录制与回放')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record = subparsers.add_parser('record', help='录制真实API的响应')
+    record.add_argument('--out', default='recording.jsonl.gz', help='输出文件（gzip压缩的JSONL）')
+    record.add_argument('--urls', default='live_url.txt', help='直播间URL列表')
+    record.add_argument('--api', default=DEFAULT_API_BASE_URL, help='上游API地址')
+    record.add_argument('--interval', type=float, default=10.0, help='每轮间隔（秒）')
+    record.add_argument('--duration', type=float, default=600.0, help='录制时长（秒）')
+
+    replay = subparsers.add_parser('replay', help='启动本地回放服务器')
+    replay.add_argument('recording', help='录制文件')
+    replay.add_argument('--speed', type=float, default=1.0, help='回放倍速')
+    replay.add_argument('--host', default='127.0.0.1')
+    replay.add_argument('--port', type=int, default=8000)
+
+    synth = subparsers.add_parser('synth', help='生成模拟录制（可复现）')
+    synth.add_argument('--out', default='synthetic.jsonl.gz', help='输出文件')
+    synth.add_argument('--rooms', type=int, default=50, help='直播间数量')
+    synth.add_argument('--duration', type=float, default=3600.0, help='录制时长（秒）')
+    synth.add_argument('--interval', type=float, default=3.0, help='采样间隔（秒）')
+    synth.add_argument('--seed', type=int, default=0, help='随机种子')
+
+    args = parser.parse_args()
+    if args.command == 'synth':
+        records = synthesize(args.out, args.rooms, args.duration, args.interval, args.seed)
+        print(f"✅ 已生成 {records} 条模拟响应 → {args.out}")
+        return
+    try:
+        asyncio.run(record_main(args) if args.command == 'record' else replay_main(args))
+    except KeyboardInterrupt:
+        print("\n👋 已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+控制循环离线基准测试
+用录制文件（api_recorder.py）回放上游API，按虚拟时钟确定性地驱动DouyinOBSWebSocketController的
+轮询、排名和布局决策，输出每轮耗时和切换决策，并可与另一版本的报告对比。
+
+不连接OBS：每轮记录第1名和期望布局（LayoutReconciler.desired_layout），不发送OBS请求。
+虚拟时钟按调度器的下次到期时间推进，不会真正等待，1小时的录制几秒即可跑完。
+
+用法：
+    python api_recorder.py synth --out synthetic.jsonl.gz
+    python benchmark_control_loop.py synthetic.jsonl.gz --out report.json
+    python benchmark_control_loop.py synthetic.jsonl.gz --compare report.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+
+from api_recorder import ReplayServer
+from history_log import HistoryLog
+from obs_websocket_controller import DouyinOBSWebSocketController
+from room_poller import AsyncRoomPoller
+
+
+class VirtualClock:
+    """可手动推进的monotonic时钟"""
+
+    def __init__(self, start=1000.0):
+        self.value = start
+
+    def __call__(self):
+        return self.value
+
+    def advance(self, seconds):
+        self.value += seconds
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+
+async def run(recording, port=8798, seed=0, max_cycles=None):
+    random.seed(seed)
+    server = ReplayServer.from_file(recording)
+    api_url = await server.start('127.0.0.1', port)
+    clock = VirtualClock()
+    server.set_time(server.start_time)
+
+    controller = DouyinOBSWebSocketController()
+    controller.live_urls = [f"https://live.douyin.com/{webcast_id}" for webcast_id in server.rooms]
+    controller.webcast_ids = None
+    controller.api_client.api_base_url = api_url
+    controller.poller = AsyncRoomPoller(controller.api_client, max_concurrency=controller.poll_concurrency,
+                                        room_timeout=controller.room_timeout,
+                                        cycle_timeout=controller.cycle_timeout)
+    controller.history_log = HistoryLog(tempfile.mkdtemp(prefix='bench_history_'))
+    controller.clock = clock
+
+    decisions, latencies, rank_latencies = [], [], []
+    previous_layout = None
+    layout_changes = 0
+    try:
+        elapsed = 0.0
+        live_infos = await controller.get_all_rooms_sorted()
+        while True:
+            if live_infos is not None:
+                rank_start = time.perf_counter()
+                layout = [webcast_id for webcast_id, (slot, info) in
+                          sorted(controller.layout.desired_layout(live_infos).items(), key=lambda item: item[1][0])]
+                rank_latencies.append(time.perf_counter() - rank_start)
+                if previous_layout is not None and layout != previous_layout:
+                    layout_changes += 1
+                previous_layout = layout
+                decisions.append({'t': round(elapsed, 3), 'leader': controller.ranking.leader, 'layout': layout})
+                if max_cycles and len(decisions) >= max_cycles:
+                    break
+
+            wait = max(controller.scheduler.wait_time(clock()), controller.min_cycle_interval)
+            elapsed += wait
+            if server.start_time + elapsed > server.end_time:
+                break
+            clock.advance(wait)
+            server.set_time(server.start_time + elapsed)
+
+            cycle_start = time.perf_counter()
+            live_infos = await controller.get_due_rooms_sorted()
+            if live_infos is not None:
+                latencies.append(time.perf_counter() - cycle_start)
+    finally:
+        await controller.poller.close()
+        controller.history_log.close()
+        await server.stop()
+
+    ranking_stats = controller.ranking.get_stats()
+    poll_stats = controller.scheduler.get_stats()
+    return {
+        'recording': recording,
+        'seed': seed,
+        'summary': {
+            'rooms': len(server.rooms),
+            'virtual_seconds': round(elapsed, 1),
+            'cycles': len(decisions),
+            'polls': poll_stats['polls'],
+            'leader_switches': ranking_stats['switches'],
+            'suppressed_switches': ranking_stats['suppressed'],
+            'raw_switches': ranking_stats['raw_switches'],
+            'layout_changes': layout_changes,
+            'cycle_ms_p50': round(percentile(latencies, 0.5) * 1000, 3),
+            'cycle_ms_p95': round(percentile(latencies, 0.95) * 1000, 3),
+            'cycle_ms_max': round(max(latencies, default=0.0) * 1000, 3),
+            'plan_ms_p50': round(percentile(rank_latencies, 0.5) * 1000, 3)
+        },
+        'decisions': decisions
+    }
+
+
+def compare(report, baseline):
+    """对比两份报告的切换决策和耗时"""
+    print("-" * 60)
+    print(f"📊 与基线对比: {baseline['recording']}")
+    for key, value in report['summary'].items():
+        old = baseline['summary'].get(key)
+        marker = '' if old == value else '  ←'
+        print(f"   {key:22} {str(old):>12} → {str(value):<12}{marker}")
+
+    current = {decision['t']: decision for decision in report['decisions']}
+    previous = {decision['t']: decision for decision in baseline['decisions']}
+    shared = sorted(set(current) & set(previous))
+    leader_diffs = [t for t in shared if current[t]['leader'] != previous[t]['leader']]
+    layout_diffs = [t for t in shared if current[t]['layout'] != previous[t]['layout']]
+    print(f"   共同时刻 {len(shared)} 个 / 第1名不同 {len(leader_diffs)} 个 / 布局不同 {len(layout_diffs)} 个")
+    for t in leader_diffs[:5]:
+        print(f"   t={t}s 第1名 {previous[t]['leader']} → {current[t]['leader']}")
+    return not leader_diffs and not layout_diffs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='控制循环离线基准测试')
+    parser.add_argument('recording', help='录制文件（gzip JSONL）')
+    parser.add_argument('--out', help='把报告写入JSON文件')
+    parser.add_argument('--compare', help='与之前的报告对比')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（调度抖动）')
+    parser.add_argument('--max-cycles', type=int, help='最多运行的轮数')
+    parser.add_argument('--port', type=int, default=8798, help='回放服务器端口')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.recording, args.port, args.seed, args.max_cycles))
+    print("=" * 60)
+    for key, value in report['summary'].items():
+        print(f"   {key:22} {value}")
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        print(f"💾 报告已保存: {args.out}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(report, baseline):
+            print("✅ 切换决策与基线一致")
+        else:
+            print("⚠️ 切换决策与基线不同")
+
+
+if __name__ == "__main__":
+    main()
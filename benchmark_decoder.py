@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应解码微基准
+对比每个fetch_user_live_videos响应的解析耗时和内存分配：
+1. 改造前：requests的response.json()等价流程（bytes解码成str → json.loads → 逐层isinstance/str/strip取字段）
+2. live_decoder：当前JSON后端直接解析bytes，一次取出排名字段（同时测量标准库json后端作为对照）
+
+响应体默认使用与真实接口结构相近的模拟响应（房间、主播、拉流地址等嵌套字段，约9KB），
+也可以用api_recorder.py录制的文件（--recording）。
+内存分配用tracemalloc统计：每次解析期间分配内存的峰值（完整的中间对象树都计入）。
+
+用法：python benchmark_decoder.py [--responses 2000] [--recording recording.jsonl.gz] [--out report.json]
+"""
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+import live_decoder
+from api_recorder import load_recording
+
+COUNT_SAMPLES = ["12345", "1234.0", "1,234", "999+", "1.2万", "10万+", "3.5w", "1亿", "", "  ", None, 2048, 1234.0]
+
+
+def legacy_parse_live_info(webcast_id, data):
+    """改造前的字段提取（对照）"""
+    url = f"https://live.douyin.com/{webcast_id}"
+    if not (data['code'] == 200 and data['data']['data']['data']):
+        return live_decoder.error_info(webcast_id, '直播间关闭')
+    live_data = data['data']['data']['data'][0]
+    user_info = data['data']['data']['user']
+    accurate_count_str = None
+    if 'stats' in live_data and isinstance(live_data['stats'], dict):
+        stats_count = live_data['stats'].get('user_count_str')
+        if stats_count and str(stats_count).strip():
+            accurate_count_str = str(stats_count).strip()
+    if not accurate_count_str:
+        if 'room_view_stats' in live_data and isinstance(live_data['room_view_stats'], dict):
+            display_value = live_data['room_view_stats'].get('display_value')
+            if display_value is not None:
+                accurate_count_str = str(display_value)
+    if not accurate_count_str:
+        accurate_count_str = live_data.get('user_count_str', '0')
+    try:
+        if '+' in accurate_count_str:
+            user_count = int(accurate_count_str.replace('+', ''))
+        else:
+            user_count = int(accurate_count_str)
+        user_count_display = f"{user_count}"
+    except ValueError:
+        user_count = 0
+        user_count_display = "--"
+    return {'success': True, 'webcast_id': webcast_id, 'url': url, 'nickname': user_info['nickname'],
+            'title': live_data['title'], 'user_count': user_count, 'user_count_display': user_count_display,
+            'status': live_data['status'], 'room_id': live_data['id_str']}
+
+
+def legacy_decode(webcast_id, body):
+    return legacy_parse_live_info(webcast_id, json.loads(body.decode('utf-8')))
+
+
+def full_body(webcast_id, count_str, rng):
+    """与真实接口结构相近的完整响应（只有少数字段会被用到）"""
+    def url_list(name):
+        return {'uri': f"{name}/{rng.getrandbits(64):x}",
+                'url_list': [f"https://p{index}.douyinpic.com/{name}/{rng.getrandbits(64):x}.jpeg?from=3067671334"
+                             for index in range(3, 6)]}
+
+    qualities = ['FULL_HD1', 'HD1', 'SD1', 'SD2']
+    stream_data = {quality: {'main': {'flv': f"https://pull-flv-l1.douyincdn.com/stage/stream-{webcast_id}_{quality}.flv",
+                                      'hls': f"https://pull-hls-l1.douyincdn.com/stage/stream-{webcast_id}_{quality}.m3u8",
+                                      'sdk_params': json.dumps({'resolution': '1080x1920', 'vbitrate': rng.randint(1, 8) * 500000,
+                                                                'VCodec': 'h264', 'gop': 4})}}
+                   for quality in qualities}
+    room = {
+        'id': int(webcast_id), 'id_str': webcast_id, 'status': 2, 'status_str': '2',
+        'title': f"直播{webcast_id[-4:]}", 'user_count_str': count_str,
+        'stats': {'user_count_str': count_str, 'total_user_str': count_str, 'like_count': rng.randint(0, 10 ** 7),
+                  'fan_ticket': rng.randint(0, 10 ** 5)},
+        'room_view_stats': {'display_value': rng.randint(0, 10 ** 5), 'display_short': count_str,
+                            'display_middle': count_str, 'display_long': f"{count_str}在线观众", 'is_hidden': False},
+        'cover': url_list('cover'), 'dynamic_cover': url_list('dynamic'), 'dynamic_cover_low': url_list('dynamic_low'),
+        'stream_url': {
+            'flv_pull_url': {quality: stream_data[quality]['main']['flv'] for quality in qualities},
+            'hls_pull_url_map': {quality: stream_data[quality]['main']['hls'] for quality in qualities},
+            'live_core_sdk_data': {'pull_data': {'stream_data': json.dumps({'data': stream_data}),
+                                                 'options': {'qualities': [{'name': quality, 'level': level, 'sdk_key': quality.lower()}
+                                                                           for level, quality in enumerate(qualities)]}}},
+            'extra': {'height': 1920, 'width': 1080, 'fps': 30, 'max_bitrate': 4000, 'gop_sec': 4}
+        },
+        'owner': {'id_str': str(rng.getrandbits(52)), 'nickname': f"主播{webcast_id[-4:]}", 'avatar_thumb': url_list('avatar'),
+                  'avatar_medium': url_list('avatar_medium'), 'avatar_large': url_list('avatar_large'),
+                  'follow_info': {'follower_count': rng.randint(0, 10 ** 7), 'following_count': rng.randint(0, 1000)},
+                  'badge_image_list': [url_list('badge') for _ in range(4)]},
+        'room_auth': {key: rng.random() < 0.5 for key in ('Chat', 'Danmaku', 'Gift', 'Like', 'Share', 'Banner', 'Props',
+                                                          'PublicScreen', 'Landscape', 'LandscapeChat', 'Poi', 'Promote')},
+        'admin_user_ids': [rng.getrandbits(52) for _ in range(20)],
+        'linkmic_layout': 0, 'has_commerce_goods': False, 'mosaic_status': 0,
+    }
+    user = dict(room['owner'], sec_uid=f"MS4wLjABAAAA{rng.getrandbits(128):x}", signature="直播间简介" * 10)
+    return json.dumps({'code': 200, 'router': '/api/douyin/web/fetch_user_live_videos',
+                       'data': {'status_code': 0, 'data': {'data': [room], 'user': user, 'qrcode_url': -1,
+                                                           'enter_room_id': webcast_id}, 'extra': {'now': 1700000000000}}},
+                      ensure_ascii=False).encode('utf-8')
+
+
+def make_bodies(responses, recording, seed):
+    if recording:
+        records = [record for record in load_recording(recording) if record['status'] == 200]
+        return [(record['webcast_id'], record['body'].encode('utf-8')) for record in records[:responses]]
+    rng = random.Random(seed)
+    formats = ["{}", "{}", "{}+", "{:.1f}万", "{:.0f}万+"]
+    bodies = []
+    for index in range(min(responses, 200)):
+        count = rng.randint(100, 300000)
+        fmt = rng.choice(formats)
+        count_str = fmt.format(count / 10000 if '万' in fmt else count)
+        bodies.append((str(7000000000000 + index), full_body(str(7000000000000 + index), count_str, rng)))
+    return [bodies[index % len(bodies)] for index in range(responses)]
+
+
+def measure(variants, bodies, repeats=7):
+    """各方式每个响应的平均耗时（微秒）、平均峰值内存（KB）和解析结果
+
+    各方式轮流计时repeats轮、取最快的一轮，机器负载波动对各方式的影响相同。
+    """
+    for name, decode in variants:
+        for webcast_id, body in bodies[:50]:
+            decode(webcast_id, body)   # 预热
+    elapsed = {name: float('inf') for name, decode in variants}
+    results = {}
+    for _ in range(repeats):
+        for name, decode in variants:
+            start = time.perf_counter()
+            results[name] = [decode(webcast_id, body) for webcast_id, body in bodies]
+            elapsed[name] = min(elapsed[name], time.perf_counter() - start)
+
+    sample = bodies[:min(len(bodies), 200)]
+    measured = {}
+    for name, decode in variants:
+        peaks = []
+        tracemalloc.start()
+        for webcast_id, body in sample:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            decode(webcast_id, body)
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+        tracemalloc.stop()
+        measured[name] = ({
+            'us_per_response': elapsed[name] / len(bodies) * 1e6,
+            'peak_kb_per_response': sum(peaks) / len(peaks) / 1024
+        }, results[name])
+    return measured
+
+
+def main():
+    parser = argparse.ArgumentParser(description='fetch_user_live_videos响应解码微基准')
+    parser.add_argument('--responses', type=int, default=2000, help='解析的响应数量')
+    parser.add_argument('--recording', help='使用api_recorder.py录制的响应')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--out', help='把结果写入JSON文件')
+    args = parser.parse_args()
+
+    bodies = make_bodies(args.responses, args.recording, args.seed)
+    if not bodies:
+        print("❌ 没有可用的响应")
+        return
+    average_size = sum(len(body) for _, body in bodies) / len(bodies)
+    print(f"📦 {len(bodies)}个响应，平均{average_size / 1024:.1f}KB，JSON后端: {live_decoder.JSON_BACKEND}")
+
+    variants = [('改造前(json + 逐层取字段)', legacy_decode)]
+    if live_decoder.JSON_BACKEND != 'json':
+        variants.append(('live_decoder(json)', lambda webcast_id, body: live_decoder.parse_live_info(webcast_id, live_decoder.stdlib_loads(body))))
+    variants.append((f"live_decoder({live_decoder.JSON_BACKEND})", live_decoder.decode_live_info))
+
+    report = {'backend': live_decoder.JSON_BACKEND, 'responses': len(bodies), 'average_bytes': average_size, 'variants': {}}
+    print(f"{'方式':<28} {'耗时/响应':>10} {'峰值内存/响应':>14} {'加速':>8}")
+    print("-" * 66)
+    baseline, baseline_results = None, None
+    measured = measure(variants, bodies)
+    for name, decode in variants:
+        stats, results = measured[name]
+        report['variants'][name] = stats
+        if baseline is None:
+            baseline, baseline_results = stats, results
+        speedup = baseline['us_per_response'] / stats['us_per_response']
+        print(f"{name:<28} {stats['us_per_response']:>8.1f}µs {stats['peak_kb_per_response']:>12.1f}KB {speedup:>7.2f}x")
+    print("-" * 66)
+
+    lost = sum(1 for old, new in zip(baseline_results, results)
+               if old['success'] and old['user_count'] == 0 and new['user_count'] > 0)
+    print(f"🔢 改造前被记为0人、现在正确解析的响应: {lost}/{len(bodies)}")
+    print("🔢 人数格式: " + ', '.join(f"{value!r}→{live_decoder.parse_count(value)[0]}" for value in COUNT_SAMPLES))
+    report['recovered_counts'] = lost
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        print(f"💾 结果已保存: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大规模直播间轮询基准测试
+对比两种模式在100 / 1000 / 10000个直播间下的每轮耗时和内存：
+1. 全量：单进程AsyncRoomPoller轮询全部直播间 + 每轮list.sort
+2. 分片：ShardedRoomPoller多进程轮询 + Leaderboard逐个更新，只取前K名
+
+上游API由本地模拟服务器（多个进程共享端口，需支持SO_REUSEPORT）提供，响应格式与fetch_user_live_videos一致。
+计时各轮不开启tracemalloc（开启后分配密集的代码会慢数倍）；内存另外用一轮统计主进程的峰值（分片模式的工作进程不计入）。
+全量模式同时统计主进程每个请求的CPU时间，据此估算单个核心能支撑的每秒请求数：
+只有轮询量接近这个上限、并且有多个CPU核心时，分片才会比单进程快。
+
+用法：python benchmark_leaderboard.py [--rooms 100,1000,10000] [--workers 4] [--cycles 3] [--server-procs 4]
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+import tracemalloc
+
+from aiohttp import web
+
+from leaderboard import Leaderboard
+from room_poller import AsyncRoomPoller
+from sharded_poller import ShardedRoomPoller
+
+HOST = '127.0.0.1'
+PORT = 8799
+TOP_K = 10
+
+
+def _mock_payload(webcast_id):
+    count = random.randint(0, 100000)
+    return {
+        'code': 200,
+        'data': {'data': {
+            'data': [{'status': 2, 'title': f'直播{webcast_id}', 'id_str': webcast_id,
+                      'stats': {'user_count_str': str(count)}}],
+            'user': {'nickname': f'主播{webcast_id[-4:]}'}
+        }}
+    }
+
+
+async def _mock_handler(request):
+    return web.json_response(_mock_payload(request.query.get('webcast_id', '0')))
+
+
+def _run_mock_server():
+    app = web.Application()
+    app.router.add_get('/api', _mock_handler)
+    web.run_app(app, host=HOST, port=PORT, print=None, access_log=None, reuse_port=True)
+
+
+async def _wait_for_server(api_base_url, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    poller = AsyncRoomPoller(api_base_url, max_concurrency=1, room_timeout=1.0)
+    try:
+        while time.monotonic() < deadline:
+            result = (await poller.poll(['1']))[0]
+            if result['success']:
+                return True
+            await asyncio.sleep(0.2)
+        return False
+    finally:
+        await poller.close()
+
+
+async def run_cycles(poller, rank, webcast_ids, cycles):
+    """预热一轮后计时cycles轮，再开启tracemalloc跑一轮统计内存峰值
+
+    返回(每轮耗时, 排名耗时, 每个请求的主进程CPU时间, 内存峰值)
+    """
+    rank(await poller.poll(webcast_ids))
+    cycle_times, rank_times = [], []
+    cpu_start = time.process_time()
+    for _ in range(cycles):
+        start = time.perf_counter()
+        live_infos = await poller.poll(webcast_ids)
+        rank_start = time.perf_counter()
+        rank(live_infos)
+        rank_times.append(time.perf_counter() - rank_start)
+        cycle_times.append(time.perf_counter() - start)
+    cpu_per_request = (time.process_time() - cpu_start) / (cycles * len(webcast_ids))
+
+    tracemalloc.start()
+    rank(await poller.poll(webcast_ids))
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return cycle_times, rank_times, cpu_per_request, peak
+
+
+async def bench_full(api_base_url, webcast_ids, cycles, concurrency):
+    """单进程全量轮询 + 整表排序"""
+    poller = AsyncRoomPoller(api_base_url, max_concurrency=concurrency, room_timeout=30.0, cycle_timeout=120.0)
+
+    def rank(live_infos):
+        live_infos.sort(key=lambda x: x.get('user_count', 0) if x['success'] else -1, reverse=True)
+        return live_infos[:TOP_K]
+
+    try:
+        return await run_cycles(poller, rank, webcast_ids, cycles)
+    finally:
+        await poller.close()
+
+
+async def bench_sharded(api_base_url, webcast_ids, cycles, concurrency, workers):
+    """多进程分片轮询 + 增量排行榜（强制分片，不受直播间数和CPU核心数限制）"""
+    poller = ShardedRoomPoller(api_base_url, workers=workers, max_concurrency=concurrency,
+                               room_timeout=30.0, cycle_timeout=120.0, min_rooms=0, require_multicore=False)
+    leaderboard = Leaderboard()
+
+    def rank(live_infos):
+        leaderboard.update_many(live_infos)
+        return leaderboard.top(TOP_K)
+
+    try:
+        return await run_cycles(poller, rank, webcast_ids, cycles)
+    finally:
+        await poller.close()
+
+
+def bench_rank_only(rooms, updates):
+    """只比较排名本身：每次有updates个直播间更新后取前K名"""
+    infos = [{'webcast_id': str(index), 'success': True, 'user_count': random.randint(0, 100000)}
+             for index in range(rooms)]
+
+    start = time.perf_counter()
+    for _ in range(10):
+        for info in random.sample(infos, updates):
+            info['user_count'] = random.randint(0, 100000)
+        ordered = sorted(infos, key=lambda x: x['user_count'], reverse=True)[:TOP_K]
+    full = (time.perf_counter() - start) / 10
+
+    leaderboard = Leaderboard()
+    leaderboard.update_many(infos)
+    start = time.perf_counter()
+    for _ in range(10):
+        for info in random.sample(infos, updates):
+            info = dict(info, user_count=random.randint(0, 100000))
+            leaderboard.update(info)
+        ordered = leaderboard.top(TOP_K)
+    incremental = (time.perf_counter() - start) / 10
+    return full, incremental, len(ordered)
+
+
+async def run_size(api_base_url, rooms, cycles, concurrency, workers):
+    webcast_ids = [str(7000000000000 + index) for index in range(rooms)]
+    rows = []
+    for mode in ('全量', '分片'):
+        if mode == '全量':
+            result = await bench_full(api_base_url, webcast_ids, cycles, concurrency)
+        else:
+            result = await bench_sharded(api_base_url, webcast_ids, cycles, concurrency, workers)
+        cycle_times, rank_times, cpu_per_request, peak = result
+        rows.append((mode, sum(cycle_times) / len(cycle_times), sum(rank_times) / len(rank_times),
+                     cpu_per_request, peak))
+    return rows
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='大规模直播间轮询基准测试')
+    parser.add_argument('--rooms', default='100,1000,10000', help='直播间数量，逗号分隔')
+    parser.add_argument('--workers', type=int, default=4, help='分片模式的工作进程数')
+    parser.add_argument('--cycles', type=int, default=3, help='每种模式的轮数')
+    parser.add_argument('--concurrency', type=int, default=50, help='每个进程的并发请求数')
+    parser.add_argument('--server-procs', type=int, default=4, help='模拟API服务器进程数')
+    args = parser.parse_args()
+
+    servers = [multiprocessing.Process(target=_run_mock_server, daemon=True) for _ in range(args.server_procs)]
+    for server in servers:
+        server.start()
+    api_base_url = f"http://{HOST}:{PORT}/api"
+    try:
+        if not await _wait_for_server(api_base_url):
+            print("❌ 模拟API服务器启动失败")
+            return
+
+        print(f"🖥️ CPU核心: {os.cpu_count()}（只有一个核心时分片不可能更快）")
+        print(f"{'直播间':>8} {'模式':>4} {'每轮耗时':>10} {'排名耗时':>10} {'主进程CPU/请求':>14} {'主进程峰值内存':>14}")
+        print("-" * 76)
+        full_cpu = []
+        for rooms in (int(value) for value in args.rooms.split(',')):
+            for mode, cycle_time, rank_time, cpu_per_request, peak in await run_size(
+                    api_base_url, rooms, args.cycles, args.concurrency, args.workers):
+                if mode == '全量':
+                    full_cpu.append(cpu_per_request)
+                print(f"{rooms:>8} {mode:>4} {cycle_time * 1000:>8.1f}ms {rank_time * 1000:>8.3f}ms "
+                      f"{cpu_per_request * 1000:>12.3f}ms {peak / 1024 / 1024:>12.2f}MB")
+
+        print("-" * 76)
+        cpu_per_request = sum(full_cpu) / len(full_cpu)
+        print(f"单进程每个请求约{cpu_per_request * 1000:.2f}ms CPU，一个核心最多约{1 / cpu_per_request:.0f}次/秒；"
+              f"每3秒轮询一遍时约{3 / cpu_per_request:.0f}个直播间以上分片才有收益（需要多个CPU核心）")
+        print("-" * 76)
+        print("排名本身（每轮1%直播间更新后取前10名）:")
+        for rooms in (int(value) for value in args.rooms.split(',')):
+            full, incremental, _ = bench_rank_only(rooms, max(rooms // 100, 1))
+            print(f"{rooms:>8} 整表排序 {full * 1000:>8.3f}ms / 增量排行榜 {incremental * 1000:>8.3f}ms")
+    finally:
+        for server in servers:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
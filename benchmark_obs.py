@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OBS链路基准测试（无需真实OBS）
+用进程内的模拟OBS服务器（mock_obs_server.py）驱动DouyinOBSWebSocketController的OBS相关逻辑，
+在6 / 50 / 500个浏览器源下测量：
+1. 连接耗时：connect_obs（握手 + 加载场景图）
+2. 布局创建耗时：setup_obs_scenes（创建场景、浏览器源并设置位置）
+3. 切换延迟：switch_scene（SetCurrentProgramScene往返）和排名变化后布局调整（LayoutReconciler.reconcile）的p50/p95
+4. 大规模重排期间的切换延迟：整个排名打乱、布局调整进行中时发出SetCurrentProgramScene，
+   对比直接经由OBSConnection和经由命令队列（OBSCommandQueue）两种方式
+5. 每秒命令数：串行请求、并发请求、RequestBatch三种方式
+
+用法：python benchmark_obs.py [--sources 6,50,500] [--latency 0.002] [--jitter 0.001] [--error-rate 0] [--out report.json]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import time
+
+from browser_source_pool import BrowserSourcePool
+from layout_reconciler import LayoutReconciler
+from mock_obs_server import MockOBSServer
+from obs_websocket_controller import DouyinOBSWebSocketController
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+
+def make_live_infos(rooms, rng):
+    """构造排名结果（人数降序）"""
+    infos = []
+    for index in range(rooms):
+        webcast_id = str(7000000000000 + index)
+        infos.append({'success': True, 'webcast_id': webcast_id, 'status': 2,
+                      'url': f"https://live.douyin.com/{webcast_id}", 'nickname': f"主播{index}",
+                      'user_count': rng.randint(1000, 100000), 'user_count_display': '0'})
+    infos.sort(key=lambda info: info['user_count'], reverse=True)
+    return infos
+
+
+def reshuffle(live_infos, slots, rng):
+    """模拟一次排名变化：前N名内交换两个位置，并有一个N名之外的直播间进入前N名"""
+    infos = list(live_infos)
+    a, b = rng.sample(range(min(slots, len(infos))), 2) if slots > 1 else (0, 0)
+    infos[a], infos[b] = infos[b], infos[a]
+    if len(infos) > slots:
+        outside = rng.randrange(slots, len(infos))
+        infos[slots - 1], infos[outside] = infos[outside], infos[slots - 1]
+    return infos
+
+
+async def switch_during_relayout(controller, live_infos, switches, target, rng):
+    """布局调整进行中发出场景切换，返回切换延迟列表（target为OBSConnection或命令队列）"""
+    latencies = []
+    scene_names = ["基准测试_备用场景", controller.master_scene_name]
+    for index in range(switches):
+        live_infos = list(live_infos)
+        rng.shuffle(live_infos)
+        relayout = asyncio.ensure_future(controller.layout.reconcile(target, controller.scene_graph, live_infos))
+        await asyncio.sleep(0)   # 让布局调整先发出请求
+        start = time.perf_counter()
+        await target.call("SetCurrentProgramScene", {"sceneName": scene_names[index % 2]})
+        latencies.append(time.perf_counter() - start)
+        await relayout
+    return live_infos, latencies
+
+
+async def throughput(obs, scene_name, item_ids, requests, rng):
+    """三种方式发送相同数量的SetSceneItemTransform，返回每秒命令数"""
+    def request():
+        return ("SetSceneItemTransform", {"sceneName": scene_name, "sceneItemId": rng.choice(item_ids),
+                                          "sceneItemTransform": {"positionX": float(rng.randint(0, 3000))}})
+
+    rates = {}
+    serial = max(requests // 10, 1)
+    start = time.perf_counter()
+    for _ in range(serial):
+        await obs.call(*request())
+    rates['serial'] = serial / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(obs.call(*request()) for _ in range(requests)))
+    rates['concurrent'] = requests / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await obs.call_batch([request() for _ in range(requests)], timeout=60.0)
+    rates['batch'] = requests / (time.perf_counter() - start)
+    return rates
+
+
+async def bench_sources(sources, latency, jitter, error_rate, switches, requests, seed):
+    rng = random.Random(seed)
+    server = MockOBSServer(latency=latency, jitter=jitter, error_rate=error_rate, seed=seed)
+    port = await server.start('127.0.0.1', 0)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        controller = DouyinOBSWebSocketController()
+    controller.obs_host, controller.obs_port = '127.0.0.1', port
+    controller.source_pool = BrowserSourcePool(sources)
+    controller.layout = LayoutReconciler(controller.master_scene_name, controller.browser_source_settings,
+                                         max_slots=sources, columns=max(int(sources ** 0.5), 3),
+                                         pool=controller.source_pool)
+    live_infos = make_live_infos(sources * 2, rng)
+    result = {'sources': sources}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            connected = await controller.connect_obs()
+            result['connect_ms'] = (time.perf_counter() - start) * 1000
+            if not connected:
+                raise ConnectionError(f"无法连接模拟OBS服务器: {server.url}")
+
+            before = server.total_requests
+            start = time.perf_counter()
+            await controller.setup_obs_scenes(live_infos)
+            result['setup_ms'] = (time.perf_counter() - start) * 1000
+            result['setup_commands'] = server.total_requests - before
+
+            # 场景切换：在主场景和另一个场景之间来回切换
+            await controller.create_scene("基准测试_备用场景")
+            scene_latencies = []
+            for index in range(switches):
+                start = time.perf_counter()
+                await controller.switch_scene("基准测试_备用场景" if index % 2 == 0 else controller.master_scene_name)
+                scene_latencies.append(time.perf_counter() - start)
+
+            # 排名变化后的布局调整
+            layout_latencies, failed = [], 0
+            for _ in range(switches):
+                live_infos = reshuffle(live_infos, sources, rng)
+                start = time.perf_counter()
+                stats = await controller.layout.reconcile(controller.obs_queue, controller.scene_graph, live_infos)
+                layout_latencies.append(time.perf_counter() - start)
+                failed += stats['failed']
+
+            live_infos, direct = await switch_during_relayout(controller, live_infos, switches,
+                                                              controller.obs, rng)
+            live_infos, queued = await switch_during_relayout(controller, live_infos, switches,
+                                                              controller.obs_queue, rng)
+
+        item_ids = list(controller.scene_graph.scenes.get(controller.master_scene_name, {}).values())
+        rates = await throughput(controller.obs, controller.master_scene_name, item_ids, requests, rng)
+        result.update({
+            'scene_switch_ms_p50': percentile(scene_latencies, 0.5) * 1000,
+            'scene_switch_ms_p95': percentile(scene_latencies, 0.95) * 1000,
+            'layout_switch_ms_p50': percentile(layout_latencies, 0.5) * 1000,
+            'layout_switch_ms_p95': percentile(layout_latencies, 0.95) * 1000,
+            'layout_failed': failed,
+            'relayout_switch_ms_p50_direct': percentile(direct, 0.5) * 1000,
+            'relayout_switch_ms_p50_queued': percentile(queued, 0.5) * 1000,
+            'queue': controller.obs_queue.get_stats(),
+            'cmd_per_sec_serial': rates['serial'],
+            'cmd_per_sec_concurrent': rates['concurrent'],
+            'cmd_per_sec_batch': rates['batch'],
+            'server': server.get_stats()
+        })
+    finally:
+        await controller.obs_queue.close()
+        if controller.obs:
+            await controller.obs.close()
+        await controller.poller.close()
+        await server.stop()
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='OBS链路基准测试（模拟OBS服务器）')
+    parser.add_argument('--sources', default='6,50,500', help='浏览器源数量，逗号分隔')
+    parser.add_argument('--latency', type=float, default=0.002, help='模拟OBS的响应延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.001, help='延迟抖动（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='请求失败的概率')
+    parser.add_argument('--switches', type=int, default=20, help='每种切换测量的次数')
+    parser.add_argument('--requests', type=int, default=1000, help='吞吐量测试的命令数')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子')
+    parser.add_argument('--out', help='把结果写入JSON文件')
+    args = parser.parse_args()
+
+    print(f"🎭 模拟OBS: 延迟{args.latency * 1000:g}±{args.jitter * 1000:g}ms，错误率{args.error_rate:.1%}")
+    print(f"{'源数量':>6} {'连接':>8} {'布局创建':>10} {'换场景p50/p95':>16} {'布局切换p50/p95':>18} "
+          f"{'串行/并发/批量 命令每秒':>26}")
+    print("-" * 96)
+    results = []
+    for sources in (int(value) for value in args.sources.split(',')):
+        result = await bench_sources(sources, args.latency, args.jitter, args.error_rate,
+                                     args.switches, args.requests, args.seed)
+        results.append(result)
+        print(f"{sources:>6} {result['connect_ms']:>6.1f}ms {result['setup_ms']:>8.1f}ms "
+              f"{result['scene_switch_ms_p50']:>7.2f}/{result['scene_switch_ms_p95']:<6.2f}ms "
+              f"{result['layout_switch_ms_p50']:>8.2f}/{result['layout_switch_ms_p95']:<7.2f}ms "
+              f"{result['cmd_per_sec_serial']:>8.0f}/{result['cmd_per_sec_concurrent']:.0f}/{result['cmd_per_sec_batch']:.0f}")
+        if result['layout_failed'] or result['server']['injected_errors']:
+            print(f"       ⚠️ 注入错误 {result['server']['injected_errors']} 个，布局调整失败 {result['layout_failed']} 项")
+    print("-" * 96)
+    print(f"布局创建命令数: {', '.join(str(result['setup_commands']) for result in results)}")
+    print("大规模重排期间的切换延迟p50（直接发送 → 命令队列）: " + ', '.join(
+        f"{result['sources']}源 {result['relayout_switch_ms_p50_direct']:.2f} → {result['relayout_switch_ms_p50_queued']:.2f}ms"
+        for result in results))
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=1)
+        print(f"💾 结果已保存: {args.out}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+浏览器源池
+功能：
+1. 预先创建固定数量的浏览器源，OBS中Chromium实例数量恒定
+2. 直播间进入前N名时，通过SetInputSettings将空闲（或最久未用）的源重新指向新URL
+3. 离开前N名的直播间保留在原源中，keep_loaded_seconds内重新进入时无需重新加载页面
+   （超过后渲染预算会关闭该源的浏览器，再进入时页面要重新加载，不算命中）
+4. 备用槽位可用于预热即将进入画面的直播间
+5. 命中/未命中/淘汰计数
+"""
+
+import time
+
+
+class BrowserSourcePool:
+    """固定大小的浏览器源池"""
+
+    SOURCE_PREFIX = "直播池_"
+
+    def __init__(self, size, keep_loaded_seconds=120.0, clock=time.monotonic):
+        self.size = size
+        self.keep_loaded_seconds = keep_loaded_seconds   # 离开画面后页面保持加载的时长，None为一直保持
+        self.clock = clock
+        self.slots = [{'source_name': f"{self.SOURCE_PREFIX}{index + 1}", 'webcast_id': None, 'url': None,
+                       'last_used': 0.0} for index in range(size)]
+        self.assignments = {}      # webcast_id -> 槽位下标
+        self.active = set()        # 上一轮需要显示的webcast_id
+        self.hits = 0              # 进入前N名时页面仍在池中且保持加载
+        self.misses = 0            # 需要重新指向URL（或池已耗尽），或页面已关闭需要重新加载
+        self.reloads = 0           # 其中页面仍在池中、但浏览器已关闭的次数
+        self.evictions = 0         # 淘汰其他直播间占用的源
+        self.prewarms = 0          # 为预热分配的源
+
+    @property
+    def source_names(self):
+        return [slot['source_name'] for slot in self.slots]
+
+    def source_for(self, webcast_id):
+        index = self.assignments.get(webcast_id)
+        return self.slots[index]['source_name'] if index is not None else None
+
+    def webcast_id_for(self, source_name):
+        for slot in self.slots:
+            if slot['source_name'] == source_name:
+                return slot['webcast_id']
+        return None
+
+    def url_for(self, source_name):
+        for slot in self.slots:
+            if slot['source_name'] == source_name:
+                return slot['url']
+        return None
+
+    def _loaded(self, slot, now):
+        return self.keep_loaded_seconds is None or now - slot['last_used'] <= self.keep_loaded_seconds
+
+    def loaded_sources(self, now=None):
+        """页面应保持加载的源：占用中，且距上次显示或预热不超过keep_loaded_seconds"""
+        now = self.clock() if now is None else now
+        return {slot['source_name'] for slot in self.slots
+                if slot['webcast_id'] is not None and self._loaded(slot, now)}
+
+    def _pick_slot(self, keep):
+        """优先空闲槽位，其次淘汰最久未用且不在keep中的槽位"""
+        candidates = [index for index, slot in enumerate(self.slots)
+                      if slot['webcast_id'] is None or slot['webcast_id'] not in keep]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda index: (self.slots[index]['webcast_id'] is not None,
+                                                   self.slots[index]['last_used']))
+
+    def _place(self, webcast_id, url, keep, now):
+        """把直播间放入一个槽位，池已耗尽时返回None"""
+        index = self._pick_slot(keep)
+        if index is None:
+            return None
+        slot = self.slots[index]
+        if slot['webcast_id'] is not None:
+            self.evictions += 1
+            self.assignments.pop(slot['webcast_id'], None)
+        slot.update(webcast_id=webcast_id, url=url, last_used=now)
+        self.assignments[webcast_id] = index
+        return slot['source_name']
+
+    def assign(self, rooms, warm_rooms=(), now=None):
+        """为需要显示的直播间分配源，rooms为(webcast_id, url)列表（按优先级）
+
+        warm_rooms为需要预热的直播间，只使用显示所需以外的槽位。
+        返回需要重新指向的槽位列表[(source_name, url)]，调用方负责发送SetInputSettings。
+        """
+        now = self.clock() if now is None else now
+        keep = {webcast_id for webcast_id, url in rooms} | {webcast_id for webcast_id, url in warm_rooms}
+        retargets = []
+
+        for webcast_id, url in rooms:
+            index = self.assignments.get(webcast_id)
+            newly_active = webcast_id not in self.active
+            if index is not None:
+                if newly_active:
+                    if self._loaded(self.slots[index], now):
+                        self.hits += 1
+                    else:
+                        self.misses += 1
+                        self.reloads += 1
+                self.slots[index]['last_used'] = now
+                continue
+
+            self.misses += 1
+            source_name = self._place(webcast_id, url, keep, now)
+            if source_name is not None:
+                retargets.append((source_name, url))
+
+        for webcast_id, url in warm_rooms:
+            if webcast_id in self.assignments:
+                self.slots[self.assignments[webcast_id]]['last_used'] = now
+                continue
+            source_name = self._place(webcast_id, url, keep, now)
+            if source_name is None:
+                break
+            self.prewarms += 1
+            retargets.append((source_name, url))
+
+        self.active = {webcast_id for webcast_id, url in rooms}
+        return retargets
+
+    def unassign(self, source_name):
+        """重新指向失败时释放槽位"""
+        for slot in self.slots:
+            if slot['source_name'] == source_name:
+                self.assignments.pop(slot['webcast_id'], None)
+                slot.update(webcast_id=None, url=None)
+
+    def get_stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': self.size,
+            'in_use': len(self.assignments),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'reloads': self.reloads,
+            'prewarms': self.prewarms,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+        }
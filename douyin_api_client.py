@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抖音直播间API共享客户端
+功能：
+1. 统一的fetch_user_live_videos请求与解析逻辑（控制器和监控工具共用）
+2. 持久连接池（keep-alive），避免每次请求都重新建立TCP连接
+3. 可配置连接池大小与单主机连接数上限
+4. 连接复用统计
+5. 可选记录原始响应（recorder，见api_recorder.py）
+6. 响应体以bytes交给live_decoder解码，只取排名需要的字段
+7. 可选记录每个请求的耗时和失败原因（异步客户端的metrics，见metrics.py）
+8. 启用追踪时记录请求和解析的span，人数突变的样本开始一条关联链（见tracing.py）
+"""
+
+import asyncio
+import time
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+import tracing
+from live_decoder import decode_live_info, error_info, parse_live_info
+
+DEFAULT_API_BASE_URL = "http://localhost:8000/api/douyin/web/fetch_user_live_videos"
+
+
+class ConnectionStats:
+    """连接复用统计"""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections_created = 0
+        self.errors = 0
+
+    @property
+    def connections_reused(self):
+        return max(self.requests - self.connections_created, 0)
+
+    @property
+    def reuse_ratio(self):
+        return self.connections_reused / self.requests if self.requests else 0.0
+
+    def snapshot(self):
+        return {
+            'requests': self.requests,
+            'connections_created': self.connections_created,
+            'connections_reused': self.connections_reused,
+            'reuse_ratio': round(self.reuse_ratio, 4),
+            'errors': self.errors
+        }
+
+
+class DouyinAPIClient:
+    """同步API客户端（requests.Session + urllib3连接池）
+
+    pool_size 为缓存的主机连接池数量，per_host_limit 为每个主机保持的
+    keep-alive连接数上限，应不小于同时发请求的线程数。
+    """
+
+    def __init__(self, api_base_url=DEFAULT_API_BASE_URL, pool_size=10, per_host_limit=10, timeout=5):
+        self.api_base_url = api_base_url
+        self.timeout = timeout
+        self.stats = ConnectionStats()
+        self.recorder = None  # 设置后记录每个原始响应
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=per_host_limit)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get_live_info(self, webcast_id):
+        """获取单个直播间信息"""
+        self.stats.requests += 1
+        try:
+            url = f"{self.api_base_url}?webcast_id={webcast_id}"
+            response = self.session.get(url, timeout=self.timeout)
+            if self.recorder is not None:
+                self.recorder.record(webcast_id, response.status_code, response.text)
+
+            if response.status_code == 200:
+                return decode_live_info(webcast_id, response.content)
+            self.stats.errors += 1
+            return error_info(webcast_id, f'请求失败({response.status_code})')
+        except Exception:
+            self.stats.errors += 1
+            return error_info(webcast_id, '连接失败')
+
+    def _count_connections(self):
+        """统计urllib3连接池中累计新建的连接数（遍历连接池，只在取统计时调用）"""
+        total = 0
+        # http://和https://挂载的是同一个适配器，只统计一次
+        for adapter in set(self.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    total += pool.num_connections
+        return total
+
+    def get_stats(self):
+        self.stats.connections_created = self._count_connections()
+        return self.stats.snapshot()
+
+    def close(self):
+        # 关闭后连接池被清空，先保留累计的连接数
+        self.stats.connections_created = self._count_connections()
+        self.session.close()
+
+
+class AsyncDouyinAPIClient:
+    """异步API客户端（aiohttp TCPConnector连接池）"""
+
+    def __init__(self, api_base_url=DEFAULT_API_BASE_URL, pool_size=100, per_host_limit=20,
+                 timeout=5, keepalive_timeout=60):
+        self.api_base_url = api_base_url
+        self.pool_size = pool_size
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.stats = ConnectionStats()
+        self.recorder = None  # 设置后记录每个原始响应
+        self.metrics = None   # 设置后记录每个请求的耗时和失败原因（ControllerMetrics）
+        self.session = None
+
+    def _get_session(self):
+        if self.session is None or self.session.closed:
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self._on_connection_created)
+            connector = aiohttp.TCPConnector(limit=self.pool_size,
+                                             limit_per_host=self.per_host_limit,
+                                             keepalive_timeout=self.keepalive_timeout)
+            self.session = aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+        return self.session
+
+    async def _on_connection_created(self, session, context, params):
+        self.stats.connections_created += 1
+
+    def _observe(self, webcast_id, started, info, error=None):
+        if self.metrics is not None:
+            self.metrics.upstream_request(webcast_id, time.perf_counter() - started, error)
+        return info
+
+    async def get_live_info(self, webcast_id, timeout=None):
+        """获取单个直播间信息"""
+        with tracing.span('get_live_info', f"上游 {webcast_id}", room=webcast_id) as span:
+            info = await self._fetch_live_info(webcast_id, timeout)
+            if info['success']:
+                span.spike(webcast_id, info['user_count'])
+            else:
+                span.set(error=info['error'])
+        return info
+
+    async def _fetch_live_info(self, webcast_id, timeout):
+        session = self._get_session()
+        self.stats.requests += 1
+        url = f"{self.api_base_url}?webcast_id={webcast_id}"
+        started = time.perf_counter()
+        try:
+            client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+            async with session.get(url, timeout=client_timeout) as response:
+                body = await response.read()
+                if self.recorder is not None:
+                    self.recorder.record(webcast_id, response.status, body.decode('utf-8', 'replace'))
+                if response.status != 200:
+                    self.stats.errors += 1
+                    return self._observe(webcast_id, started, error_info(webcast_id, f'请求失败({response.status})'),
+                                         f'http_{response.status}')
+            with tracing.span('parse', f"上游 {webcast_id}", bytes=len(body)):
+                info = decode_live_info(webcast_id, body)
+            return self._observe(webcast_id, started, info)
+        except asyncio.TimeoutError:
+            self.stats.errors += 1
+            return self._observe(webcast_id, started, error_info(webcast_id, '请求超时'), 'timeout')
+        except Exception:
+            self.stats.errors += 1
+            return self._observe(webcast_id, started, error_info(webcast_id, '连接失败'), 'connection')
+
+    def get_stats(self):
+        return self.stats.snapshot()
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+
+_shared_clients = {}
+
+
+def get_shared_client(api_base_url=DEFAULT_API_BASE_URL, **kwargs):
+    """获取进程内共享的同步客户端（按API地址区分）
+
+    同一地址只创建一次客户端；之后的调用可以不传参数，传入的参数与创建时不同则抛出ValueError。
+    """
+    shared = _shared_clients.get(api_base_url)
+    if shared is None:
+        client = DouyinAPIClient(api_base_url, **kwargs)
+        _shared_clients[api_base_url] = (client, kwargs)
+        return client
+    client, created_with = shared
+    if kwargs and kwargs != created_with:
+        raise ValueError(f"{api_base_url} 的共享客户端已按 {created_with or '默认参数'} 创建，不能再按 {kwargs} 获取")
+    return client
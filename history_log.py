@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+直播间人数历史日志（只追加的二进制文件）
+功能：
+1. 每个样本(时间戳, webcast_id, 人数, 状态)为25字节的定长记录，轮询结果成批追加
+2. 写入在后台线程中进行，定期fsync，不阻塞轮询循环
+3. 按文件大小或日期轮转：history_log/rooms-YYYYMMDD-NNN.bin
+4. 通过内存映射读取，按时间二分查找，快速查询"某直播间最近6小时"等范围
+5. 重启时把最近的历史回放到RoomHistory
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+RECORD_DTYPE = np.dtype([
+    ('timestamp', '<f8'),    # Unix时间戳（秒）
+    ('webcast_id', '<u8'),
+    ('user_count', '<i8'),
+    ('status', '<i1')
+])
+MAGIC = b'DYHLOG01'
+HEADER_SIZE = 16             # 魔数8字节 + 记录长度8字节
+FILE_PATTERN = re.compile(r'^rooms-(\d{8})-(\d{3})\.bin$')
+
+
+def _empty():
+    return np.empty(0, dtype=RECORD_DTYPE)
+
+
+class HistoryLog:
+    """只追加的人数历史日志"""
+
+    def __init__(self, directory='history_log', max_file_bytes=64 * 1024 * 1024,
+                 flush_interval=1.0, fsync_interval=10.0):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.flush_interval = flush_interval    # 后台线程写入间隔（秒）
+        self.fsync_interval = fsync_interval    # fsync间隔（秒），崩溃时最多丢失这段时间的数据
+        self._pending = []
+        self._lock = threading.Lock()         # 保护排队的样本
+        self._io_lock = threading.Lock()      # 保护文件写入（后台线程与flush）
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._file = None
+        self._file_day = None
+        self._file_size = 0
+        self._last_fsync = time.monotonic()
+        self.records_written = 0
+        self.bytes_written = 0
+        self.fsyncs = 0
+        self.rotations = 0
+        self.last_write_ms = 0.0
+        self.current_path = None
+
+    # ---- 写入 ----
+
+    def append(self, live_infos, timestamp=None):
+        """追加本轮成功的轮询结果（只在内存中排队，由后台线程写入）"""
+        timestamp = time.time() if timestamp is None else timestamp
+        rows = [(timestamp, int(info['webcast_id']), info['user_count'], info.get('status') or 0)
+                for info in live_infos if info['success'] and info['webcast_id'].isdigit()]
+        if not rows:
+            return 0
+        records = np.array(rows, dtype=RECORD_DTYPE)
+        with self._lock:
+            self._pending.append(records)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='history-log', daemon=True)
+            self._thread.start()
+        return len(records)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            stopping = self._stopping
+            try:
+                self._write_pending()
+                if stopping or time.monotonic() - self._last_fsync >= self.fsync_interval:
+                    self._fsync()
+            except Exception as e:
+                print(f"❌ 写入历史日志出错: {e}")
+            if stopping:
+                break
+
+    def _write_pending(self):
+        with self._io_lock:
+            self._write_batches()
+
+    def _write_batches(self):
+        with self._lock:
+            batches, self._pending = self._pending, []
+        if not batches:
+            return
+        start = time.perf_counter()
+        records = np.concatenate(batches)
+        day = datetime.fromtimestamp(records['timestamp'][0]).strftime('%Y%m%d')
+        if self._file is None or day != self._file_day or self._file_size + records.nbytes > self.max_file_bytes:
+            self._rotate(day)
+        data = records.tobytes()
+        self._file.write(data)
+        self._file.flush()
+        self._file_size += len(data)
+        self.records_written += len(records)
+        self.bytes_written += len(data)
+        self.last_write_ms = (time.perf_counter() - start) * 1000
+
+    def _fsync(self):
+        with self._io_lock:
+            if self._file is not None:
+                os.fsync(self._file.fileno())
+                self.fsyncs += 1
+            self._last_fsync = time.monotonic()
+
+    def _next_path(self, day):
+        sequences = [int(match.group(2)) for match in map(FILE_PATTERN.match, self._list_files())
+                     if match and match.group(1) == day]
+        sequence = max(sequences) + 1 if sequences else 0
+        return os.path.join(self.directory, f"rooms-{day}-{sequence:03d}.bin")
+
+    def _rotate(self, day):
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self.fsyncs += 1
+            self._file.close()
+            self.rotations += 1
+        os.makedirs(self.directory, exist_ok=True)
+        self.current_path = self._next_path(day)
+        self._file = open(self.current_path, 'ab')
+        self._file.write(MAGIC + RECORD_DTYPE.itemsize.to_bytes(8, 'little'))
+        self._file_size = HEADER_SIZE
+        self._file_day = day
+
+    def flush(self):
+        """立即把排队的样本写入磁盘并fsync（在调用线程中执行）"""
+        self._write_pending()
+        self._fsync()
+
+    def close(self):
+        """写完剩余样本后停止后台线程并关闭文件"""
+        if self._thread is not None:
+            self._stopping = True
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+        else:
+            self._write_pending()
+        if self._file is not None:
+            self._fsync()
+            with self._io_lock:
+                self._file.close()
+                self._file = None
+
+    # ---- 读取 ----
+
+    def _list_files(self):
+        try:
+            return sorted(name for name in os.listdir(self.directory) if FILE_PATTERN.match(name))
+        except FileNotFoundError:
+            return []
+
+    def _map(self, path):
+        """内存映射一个日志文件（忽略末尾未写完的半条记录）"""
+        size = os.path.getsize(path)
+        count = (size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        if count <= 0:
+            return _empty()
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return _empty()
+        return np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+    def query(self, webcast_id=None, since=None, until=None):
+        """查询时间范围内的样本，webcast_id为None时返回所有直播间，结果为结构化数组
+
+        每个文件内的时间戳按追加顺序递增，先按时间二分定位，再按直播间过滤。
+        """
+        since = -np.inf if since is None else since
+        until = np.inf if until is None else until
+        target = None if webcast_id is None else np.uint64(int(webcast_id))
+        parts = []
+        for name in self._list_files():
+            records = self._map(os.path.join(self.directory, name))
+            if not len(records) or records['timestamp'][-1] < since or records['timestamp'][0] > until:
+                continue
+            timestamps = records['timestamp']
+            start = np.searchsorted(timestamps, since, side='left')
+            end = np.searchsorted(timestamps, until, side='right')
+            window = records[start:end]
+            if target is not None:
+                window = window[window['webcast_id'] == target]
+            parts.append(np.array(window))
+        return np.concatenate(parts) if parts else _empty()
+
+    def last(self, webcast_id, hours):
+        """某直播间最近hours小时的样本"""
+        return self.query(webcast_id, since=time.time() - hours * 3600)
+
+    def replay_into(self, history, hours=6.0):
+        """把最近hours小时的样本回放到RoomHistory，返回回放的样本数"""
+        records = self.query(since=time.time() - hours * 3600)
+        if not len(records):
+            return 0
+        # 墙上时间换算为monotonic时间
+        offset = time.monotonic() - time.time()
+        history.load(records['webcast_id'].astype(str), records['timestamp'] + offset, records['user_count'])
+        return len(records)
+
+    def get_stats(self):
+        return {
+            'records_written': self.records_written,
+            'bytes_written': self.bytes_written,
+            'fsyncs': self.fsyncs,
+            'rotations': self.rotations,
+            'last_write_ms': round(self.last_write_ms, 3),
+            'current_file': os.path.basename(self.current_path) if self.current_path else None,
+            'current_file_bytes': self._file_size
+        }
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量布局协调器
+功能：
+1. 根据当前排名计算期望布局（排名 → 网格位置）
+2. 与当前布局比较，只对位置或显示状态变化的源发送请求
+3. 浏览器源按webcast_id命名，排名变化只需移动源，不需重建（避免重新加载页面）
+4. 可选使用浏览器源池：进入前N名的直播间复用池中的源，只修改URL
+5. 预热：提前加载即将进入画面的直播间，但保持隐藏
+"""
+
+from render_budget import LEADER, VISIBLE, WARM, CACHED, OFFSCREEN
+
+
+class LayoutReconciler:
+    """按webcast_id管理浏览器源的网格布局"""
+
+    SOURCE_PREFIX = "直播_"
+
+    def __init__(self, scene_name, settings_factory, max_slots=6, columns=3,
+                 cell_width=1080, cell_height=1920, spacing=20, pool=None):
+        self.scene_name = scene_name
+        self.settings_factory = settings_factory  # url -> 浏览器源inputSettings
+        self.max_slots = max_slots
+        self.columns = columns
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.spacing = spacing
+        self.pool = pool                          # BrowserSourcePool，为None时每个直播间单独建源
+        self.placements = {}  # sourceName -> {'slot': int, 'enabled': bool}
+        self.visible_ids = set()   # 已在画面中显示的webcast_id
+        self.warm_ids = set()      # 预热中的webcast_id
+
+    def source_name(self, webcast_id):
+        """直播间当前对应的浏览器源名称（不含排名）"""
+        if self.pool is not None:
+            return self.pool.source_for(webcast_id)
+        return f"{self.SOURCE_PREFIX}{webcast_id}"
+
+    def webcast_id_for(self, source_name):
+        """从浏览器源名称反查webcast_id，非本协调器管理的源返回None"""
+        if self.pool is not None:
+            return self.pool.webcast_id_for(source_name)
+        suffix = source_name[len(self.SOURCE_PREFIX):]
+        if source_name.startswith(self.SOURCE_PREFIX) and suffix.isdigit():
+            return suffix
+        return None
+
+    def managed_sources(self, scene_graph):
+        """本协调器管理的所有源"""
+        if self.pool is not None:
+            return self.pool.source_names
+        return [source_name for source_name in scene_graph.scenes.get(self.scene_name, {})
+                if self.webcast_id_for(source_name) is not None]
+
+    def grid_position(self, slot):
+        """计算网格位置（slot从0开始），返回(行, 列, x, y)"""
+        col = slot % self.columns
+        row = slot // self.columns
+        x_pos = self.spacing + col * (self.cell_width + self.spacing)
+        y_pos = self.spacing + row * (self.cell_height + self.spacing)
+        return row, col, x_pos, y_pos
+
+    def transform(self, slot):
+        """网格位置，使用边界框缩放，浏览器源分辨率变化时仍然填满格子"""
+        row, col, x_pos, y_pos = self.grid_position(slot)
+        return {
+            "positionX": float(x_pos),
+            "positionY": float(y_pos),
+            "boundsType": "OBS_BOUNDS_SCALE_INNER",
+            "boundsWidth": float(self.cell_width),
+            "boundsHeight": float(self.cell_height)
+        }
+
+    def desired_layout(self, live_infos):
+        """期望布局：排名前max_slots的直播间 → 网格位置"""
+        desired = {}
+        for info in live_infos:
+            if len(desired) >= self.max_slots:
+                break
+            if info['success']:
+                desired[info['webcast_id']] = (len(desired), info)
+        return desired
+
+    def _placement(self, scene_graph, source_name, scene_item_id):
+        """当前布局；首次见到的源位置未知，显示状态取自场景图"""
+        placement = self.placements.get(source_name)
+        if placement is None:
+            enabled = scene_graph.is_item_enabled(self.scene_name, scene_item_id)
+            placement = {'slot': None, 'enabled': bool(enabled)}
+            self.placements[source_name] = placement
+        return placement
+
+    def render_tiers(self, scene_graph, live_infos):
+        """按排名划分渲染等级：第1名 / 其余可见 / 预热 / 保留（源池中仍保持加载） / 画面外，返回{sourceName: 等级}"""
+        tiers = {}
+        loaded = self.pool.loaded_sources() if self.pool is not None else set()
+        for webcast_id, (slot, info) in self.desired_layout(live_infos).items():
+            source_name = self.source_name(webcast_id)
+            if source_name and scene_graph.get_scene_item_id(self.scene_name, source_name) is not None:
+                tiers[source_name] = LEADER if slot == 0 else VISIBLE
+        for source_name in self.managed_sources(scene_graph):
+            if source_name not in tiers and scene_graph.get_scene_item_id(self.scene_name, source_name) is not None:
+                if self.webcast_id_for(source_name) in self.warm_ids:
+                    tiers[source_name] = WARM
+                else:
+                    tiers[source_name] = CACHED if source_name in loaded else OFFSCREEN
+        return tiers
+
+    def resync(self, input_settings):
+        """重连后丢弃本地记录的布局，input_settings为OBS中各源的实际设置{sourceName: inputSettings}
+
+        位置未知的源在下次reconcile时重新设置位置；源池中URL与OBS不一致（或源已不存在）的槽位释放，
+        下次reconcile时重新指向。
+        """
+        self.placements.clear()
+        self.visible_ids = set()
+        if self.pool is not None:
+            for source_name in self.pool.source_names:
+                url = self.pool.url_for(source_name)
+                if url is not None and input_settings.get(source_name, {}).get("url") != url:
+                    self.pool.unassign(source_name)
+
+    def record(self, webcast_id, slot, enabled=True):
+        """记录已生效的布局"""
+        self.placements[self.source_name(webcast_id)] = {'slot': slot, 'enabled': enabled}
+
+    def _creation_requests(self, scene_graph, desired, warm, retarget_urls):
+        """第1批：创建场景和缺少的源，返回(请求列表, 新建的源列表)"""
+        creations = []
+        if not scene_graph.has_scene(self.scene_name):
+            creations.append(("CreateScene", {"sceneName": self.scene_name}))
+
+        if self.pool is not None:
+            # 源池：一次性创建所有槽位，已分配的槽位直接使用目标URL，避免加载两次
+            missing = [(source_name, False) for source_name in self.pool.source_names]
+        else:
+            missing = [(self.source_name(webcast_id), True) for webcast_id in desired]
+            missing += [(self.source_name(webcast_id), False) for webcast_id in warm]
+
+        created = []
+        for source_name, enabled in missing:
+            if scene_graph.get_scene_item_id(self.scene_name, source_name) is not None:
+                continue
+            if not scene_graph.has_input(source_name):
+                if self.pool is not None:
+                    url = retarget_urls.pop(source_name, None) or "about:blank"
+                else:
+                    webcast_id = self.webcast_id_for(source_name)
+                    url = desired[webcast_id][1]['url'] if webcast_id in desired else warm[webcast_id]['url']
+                creations.append(("CreateInput", {
+                    "sceneName": self.scene_name,
+                    "inputName": source_name,
+                    "inputKind": "browser_source",
+                    "inputSettings": self.settings_factory(url),
+                    "sceneItemEnabled": enabled
+                }))
+            else:
+                creations.append(("CreateSceneItem", {
+                    "sceneName": self.scene_name,
+                    "sourceName": source_name,
+                    "sceneItemEnabled": enabled
+                }))
+            creations.append(("GetSceneItemId", {"sceneName": self.scene_name, "sourceName": source_name}))
+            created.append((source_name, enabled))
+        return creations, created
+
+    async def reconcile(self, obs, scene_graph, live_infos, warm_infos=()):
+        """使OBS布局与当前排名一致，warm_infos为需要预热（加载但隐藏）的直播间，返回本次操作统计"""
+        desired = self.desired_layout(live_infos)
+        warm = {info['webcast_id']: info for info in warm_infos if info['webcast_id'] not in desired}
+        self.warm_ids = set(warm)
+        stats = {'created': 0, 'retargeted': 0, 'moved': 0, 'shown': 0, 'hidden': 0, 'failed': 0,
+                 'round_trips': 0}
+
+        retarget_urls = {}
+        if self.pool is not None:
+            retargets = self.pool.assign([(webcast_id, info['url']) for webcast_id, (slot, info) in desired.items()],
+                                         [(webcast_id, info['url']) for webcast_id, info in warm.items()])
+            retarget_urls = dict(retargets)
+
+        # 第1步：创建场景和缺少的源
+        creations, created = self._creation_requests(scene_graph, desired, warm, retarget_urls)
+        if creations:
+            results = await obs.call_batch(creations)
+            stats['round_trips'] += 1
+            if creations[0][0] == "CreateScene" and results[0] and results[0]["requestStatus"]["result"]:
+                scene_graph.scenes.setdefault(self.scene_name, {})
+            id_results = [r for (request_type, _), r in zip(creations, results) if request_type == "GetSceneItemId"]
+            for (source_name, enabled), result in zip(created, id_results):
+                if result and result["requestStatus"]["result"]:
+                    scene_graph.add_input(source_name, "browser_source")
+                    scene_graph.add_item(self.scene_name, source_name, result["responseData"]["sceneItemId"], enabled)
+                    self.placements[source_name] = {'slot': None, 'enabled': enabled}  # 新场景项，位置未知
+                    stats['created'] += 1
+                else:
+                    stats['failed'] += 1
+
+        # 第2步：计算最小变更集（重新指向URL / 移动 / 显示 / 隐藏），一次批量发送；
+        # 重新指向URL的源要等URL修改确认后再显示（第3步），否则命令队列按优先级先发显示，会闪出旧页面
+        changes = []
+        applied = []
+        deferred = []
+        for source_name, url in retarget_urls.items():
+            changes.append(("SetInputSettings", {"inputName": source_name, "inputSettings": {"url": url}}))
+            applied.append((source_name, 'retargeted', None))
+
+        desired_sources = set()
+        for webcast_id, (slot, info) in desired.items():
+            source_name = self.source_name(webcast_id)
+            scene_item_id = scene_graph.get_scene_item_id(self.scene_name, source_name) if source_name else None
+            if scene_item_id is None:
+                continue
+            desired_sources.add(source_name)
+            placement = self._placement(scene_graph, source_name, scene_item_id)
+            if placement['slot'] != slot:
+                changes.append(("SetSceneItemTransform", {
+                    "sceneName": self.scene_name,
+                    "sceneItemId": scene_item_id,
+                    "sceneItemTransform": self.transform(slot)
+                }))
+                applied.append((source_name, 'moved', slot))
+            if not placement['enabled']:
+                show = ("SetSceneItemEnabled", {
+                    "sceneName": self.scene_name,
+                    "sceneItemId": scene_item_id,
+                    "sceneItemEnabled": True
+                })
+                if source_name in retarget_urls:
+                    deferred.append((show, (source_name, 'shown', slot)))
+                else:
+                    changes.append(show)
+                    applied.append((source_name, 'shown', slot))
+
+        # 隐藏跌出前N名的源（包括上次运行遗留在场景中的源）
+        for source_name in self.managed_sources(scene_graph):
+            if source_name in desired_sources:
+                continue
+            scene_item_id = scene_graph.get_scene_item_id(self.scene_name, source_name)
+            if scene_item_id is None:
+                continue
+            placement = self._placement(scene_graph, source_name, scene_item_id)
+            if not placement['enabled']:
+                continue
+            changes.append(("SetSceneItemEnabled", {
+                "sceneName": self.scene_name,
+                "sceneItemId": scene_item_id,
+                "sceneItemEnabled": False
+            }))
+            applied.append((source_name, 'hidden', placement['slot']))
+
+        failed_retargets = set()
+        if changes:
+            results = await obs.call_batch(changes)
+            stats['round_trips'] += 1
+            failed_retargets = self._apply_results(applied, results, stats)
+
+        # 第3步：显示URL修改已确认的源；修改失败的源已还给池子，不显示
+        deferred = [(request, entry) for request, entry in deferred if entry[0] not in failed_retargets]
+        if deferred:
+            results = await obs.call_batch([request for request, _ in deferred])
+            stats['round_trips'] += 1
+            self._apply_results([entry for _, entry in deferred], results, stats)
+
+        self.visible_ids = {webcast_id for webcast_id in desired
+                            if self.placements.get(self.source_name(webcast_id), {}).get('enabled')}
+        return stats
+
+    def _apply_results(self, applied, results, stats):
+        """按OBS的响应更新放置记录和统计，返回URL修改失败的源"""
+        failed_retargets = set()
+        for (source_name, kind, slot), result in zip(applied, results):
+            if result and result["requestStatus"]["result"]:
+                placement = self.placements.get(source_name)
+                if kind == 'moved':
+                    placement['slot'] = slot
+                elif kind in ('shown', 'hidden'):
+                    placement['enabled'] = kind == 'shown'
+                stats[kind] += 1
+            else:
+                if kind == 'retargeted':
+                    self.pool.unassign(source_name)
+                    failed_retargets.add(source_name)
+                stats['failed'] += 1
+        return failed_retargets
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+增量排行榜
+功能：
+1. 有序列表 + 字典索引，每个直播间的结果到达时单独更新（二分查找定位），不再整表排序
+2. 取前K名只读取列表前K项，与直播间总数无关
+3. 请求失败的直播间单独记录，不参与排名
+"""
+
+import bisect
+
+
+class Leaderboard:
+    """按分数降序维护直播间，支持O(log n)定位更新和O(K)取前K名"""
+
+    def __init__(self):
+        self._keys = []       # 有序的(-分数, webcast_id)
+        self._index = {}      # webcast_id -> 当前key
+        self.infos = {}       # webcast_id -> 最近一次结果
+        self._failed = set()  # 最近一次请求失败的webcast_id
+        self.updates = 0
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, webcast_id):
+        return webcast_id in self.infos
+
+    def _discard_key(self, webcast_id):
+        key = self._index.pop(webcast_id, None)
+        if key is not None:
+            position = bisect.bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+
+    def update(self, info, score=None):
+        """更新单个直播间，score默认为在线人数；请求失败的直播间移出排名"""
+        webcast_id = info['webcast_id']
+        self.infos[webcast_id] = info
+        self.updates += 1
+        if not info['success']:
+            self._discard_key(webcast_id)
+            self._failed.add(webcast_id)
+            return
+        self._failed.discard(webcast_id)
+        key = (-(info['user_count'] if score is None else score), webcast_id)
+        if self._index.get(webcast_id) == key:
+            return
+        self._discard_key(webcast_id)
+        bisect.insort(self._keys, key)
+        self._index[webcast_id] = key
+
+    def update_many(self, live_infos, scores=None):
+        """批量更新；更新量超过排行榜的1/4时整体重建有序列表，比逐个插入更快"""
+        if len(live_infos) <= max(len(self._index) // 4, 64):
+            for info in live_infos:
+                self.update(info, None if scores is None else scores.get(info['webcast_id']))
+            return
+
+        for info in live_infos:
+            webcast_id = info['webcast_id']
+            self.infos[webcast_id] = info
+            self.updates += 1
+            if not info['success']:
+                self._index.pop(webcast_id, None)
+                self._failed.add(webcast_id)
+                continue
+            self._failed.discard(webcast_id)
+            score = None if scores is None else scores.get(webcast_id)
+            self._index[webcast_id] = (-(info['user_count'] if score is None else score), webcast_id)
+        self._keys = sorted(self._index.values())
+
+    def remove(self, webcast_id):
+        self._discard_key(webcast_id)
+        self._failed.discard(webcast_id)
+        self.infos.pop(webcast_id, None)
+
+    def rank_of(self, webcast_id):
+        """名次（从0开始），不在排名中返回None"""
+        key = self._index.get(webcast_id)
+        return bisect.bisect_left(self._keys, key) if key is not None else None
+
+    def top(self, k):
+        """前K名的结果"""
+        return [self.infos[webcast_id] for score, webcast_id in self._keys[:k]]
+
+    def failed(self, limit=None):
+        """最近一次请求失败的直播间"""
+        webcast_ids = sorted(self._failed)[:limit]
+        return [self.infos[webcast_id] for webcast_id in webcast_ids]
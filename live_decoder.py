@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+fetch_user_live_videos响应的精简解码
+功能：
+1. 安装了orjson或ujson时用它们解析JSON（直接接收bytes，省去解码成str），否则使用标准库json
+   （先按UTF-8解码成str：json.loads(bytes)要探测编码并使用较慢的surrogatepass解码）
+2. 一次遍历取出排名需要的字段（人数、状态、标题、昵称、id_str），不再逐层isinstance/str/strip
+3. 人数支持整数、浮点数和所有字符串格式："12345"、"1234.0"、"1,234"、"999+"、"1.2万"、"10万+"、"3.5w"、"1亿"，
+   原来int()无法识别的"万"/"亿"格式会被记为0人
+"""
+
+import json
+import math
+
+
+def stdlib_loads(body):
+    """标准库json解析，bytes先按UTF-8解码"""
+    if body.__class__ is bytes:
+        body = body.decode('utf-8')
+    return json.loads(body)
+
+
+try:
+    import orjson
+    JSON_BACKEND = 'orjson'
+    loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        JSON_BACKEND = 'ujson'
+        loads = ujson.loads
+    except ImportError:
+        JSON_BACKEND = 'json'
+        loads = stdlib_loads
+
+COUNT_UNITS = {'万': 10000, 'w': 10000, 'W': 10000, '亿': 100000000, 'k': 1000, 'K': 1000}
+
+
+def error_info(webcast_id, error):
+    """构造失败结果"""
+    return {
+        'success': False,
+        'webcast_id': webcast_id,
+        'url': f"https://live.douyin.com/{webcast_id}",
+        'error': error
+    }
+
+
+def parse_count(value):
+    """解析人数，返回(人数, 显示文本)；无法识别时返回(0, '--')
+
+    精确人数（整数、1234.0这样的浮点数和"1234.0"这样的小数字符串）显示为整数，
+    "1.2万"、"10万+"等近似人数保留原文显示
+    """
+    if value.__class__ is int:
+        return value, str(value)
+    if value is None:
+        return 0, "--"
+    if value.__class__ is float:
+        if not math.isfinite(value):
+            return 0, "--"
+        count = round(value)
+        return count, str(count)
+    text = str(value).strip()
+    digits = text.replace(',', '').replace('+', '')
+    if digits.isdecimal():
+        count = int(digits)
+        return count, str(count)
+    unit = COUNT_UNITS.get(digits[-1:])
+    number, display = (digits[:-1].strip(), text) if unit is not None else (digits, None)
+    try:
+        number = float(number)
+    except ValueError:
+        return 0, "--"
+    if not math.isfinite(number):
+        return 0, "--"
+    count = round(number * (unit or 1))
+    return count, display or str(count)
+
+
+def _count_value(room):
+    """人数数据源优先级：stats.user_count_str → room_view_stats.display_value → user_count_str"""
+    stats = room.get('stats')
+    if stats.__class__ is dict:
+        value = stats.get('user_count_str')
+        if value and (value.__class__ is not str or not value.isspace()):
+            return value
+    view_stats = room.get('room_view_stats')
+    if view_stats.__class__ is dict:
+        value = view_stats.get('display_value')
+        if value is not None:
+            return value
+    return room.get('user_count_str', '0')
+
+
+def parse_live_info(webcast_id, data):
+    """从已解析的响应中取出排名需要的字段"""
+    inner = data['data']['data'] if data.get('code') == 200 else None
+    rooms = inner['data'] if inner else None
+    if not rooms:
+        return error_info(webcast_id, '直播间关闭')
+
+    room = rooms[0]
+    count_value = _count_value(room)
+    user_count, user_count_display = parse_count(count_value)
+    return {
+        'success': True,
+        'webcast_id': webcast_id,
+        'url': f"https://live.douyin.com/{webcast_id}",
+        'nickname': inner['user']['nickname'],
+        'title': room['title'],
+        'user_count': user_count,
+        'user_count_display': user_count_display,
+        'user_count_raw': count_value,     # 接口原始的人数字段（表格监控据此显示"+"）
+        'status': room['status'],
+        'room_id': room['id_str']
+    }
+
+
+def decode_live_info(webcast_id, body):
+    """解析原始响应体（bytes或str）并取出排名字段"""
+    return parse_live_info(webcast_id, loads(body))
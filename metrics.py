@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+控制器指标（Prometheus文本格式）
+功能：
+1. Histogram：固定的对数分桶（0.1ms起每档×2，约52秒封顶），记录一次只需一次二分查找和两次加法
+2. Counter / Gauge：按标签保存数值；CallbackMetric在抓取时才读取已有的统计（排名引擎、命令队列、连接监护），热路径上没有额外开销
+3. 事件循环延迟：后台协程定时sleep，实际醒来时间与预期之差即事件循环被阻塞的时长
+4. 本地HTTP端点（aiohttp）：GET /metrics 输出Prometheus文本格式，现有看板可直接抓取
+5. ControllerMetrics：控制器用到的全部指标（上游请求耗时/错误、轮询耗时、OBS请求往返、事件循环延迟）；
+   同一个本地端点上还可以挂其他控制命令（add_route，如性能分析的/profile）
+"""
+
+import asyncio
+from bisect import bisect_left
+
+from aiohttp import web
+
+# 0.1ms, 0.2ms, 0.4ms … 约52秒
+LATENCY_BUCKETS = tuple(0.0001 * 2 ** index for index in range(20))
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value != value:
+            return "NaN"
+        if value in (float('inf'), float('-inf')):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labelnames, labels, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    TYPE = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, labels=(), amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield self.name, _label_text(self.labelnames, labels), value
+
+
+class Gauge(Counter):
+    TYPE = 'gauge'
+
+    def set(self, value, labels=()):
+        self.values[labels] = value
+
+
+class CallbackMetric:
+    """抓取时调用fn读取数值：fn返回一个数，或{标签元组: 数值}"""
+
+    def __init__(self, name, help_text, fn, metric_type='gauge', labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.TYPE = metric_type
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return
+        if value is None:
+            return
+        if not isinstance(value, dict):
+            value = {(): value}
+        for labels, number in value.items():
+            if number is not None:
+                yield self.name, _label_text(self.labelnames, labels), number
+
+
+class _Series:
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+
+
+class Histogram:
+    TYPE = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, labels=()):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = _Series(len(self.buckets) + 1)
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+
+    def quantile(self, q, labels=()):
+        """按分桶估算分位数（取所在桶的上界），没有样本时返回None"""
+        series = self.series.get(labels)
+        total = sum(series.counts) if series else 0
+        if not total:
+            return None
+        target, seen = q * total, 0
+        for bound, count in zip(self.buckets + (float('inf'),), series.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        bounds = self.buckets + (float('inf'),)
+        for labels, series in list(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(bounds, series.counts):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       _label_text(self.labelnames, labels, f'le="{_format_value(bound)}"'), cumulative)
+            yield f"{self.name}_sum", _label_text(self.labelnames, labels), series.sum
+            yield f"{self.name}_count", _label_text(self.labelnames, labels), cumulative
+
+
+class MetricsRegistry:
+    """指标集合，render()输出Prometheus文本格式"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def callback(self, name, help_text, fn, metric_type='gauge', labelnames=()):
+        return self.register(CallbackMetric(name, help_text, fn, metric_type, labelnames))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class ControllerMetrics:
+    """OBS控制器的指标和/metrics端点"""
+
+    def __init__(self, loop_lag_interval=0.5):
+        self.registry = MetricsRegistry()
+        registry = self.registry
+        # 直方图不按直播间分标签（每个直播间21个序列，数千个直播间时序列数过多）；按直播间的失败次数只在计数器中
+        self.upstream_latency = registry.histogram(
+            'douyin_upstream_request_seconds', '上游API请求耗时')
+        self.upstream_errors = registry.counter(
+            'douyin_upstream_errors_total', '上游API请求失败次数（按直播间和原因）', ('room', 'reason'))
+        self.poll_cycle = registry.histogram(
+            'douyin_poll_cycle_seconds', '一轮并发轮询的耗时')
+        self.control_cycle = registry.histogram(
+            'douyin_control_cycle_seconds', 'auto_switch_logic一轮的耗时（轮询、排名、布局调整、渲染预算、界面刷新）')
+        self.obs_rtt = registry.histogram(
+            'douyin_obs_request_seconds', 'OBS请求往返耗时（按requestType，批量请求为RequestBatch）', ('request_type',))
+        self.obs_failures = registry.counter(
+            'douyin_obs_request_failures_total', 'OBS返回失败状态的请求数', ('request_type',))
+        self.loop_lag = registry.histogram(
+            'douyin_event_loop_lag_seconds', '事件循环延迟（定时器实际醒来时间与预期之差）')
+        self.loop_lag_interval = loop_lag_interval
+        self._lag_task = None
+        self._runner = None
+        self.routes = []            # 启动端点时一并注册的其他路由(method, path, handler)
+
+    # ---- 热路径上的记录 ----
+
+    def upstream_request(self, webcast_id, seconds, error=None):
+        self.upstream_latency.observe(seconds)
+        if error is not None:
+            self.upstream_errors.inc((webcast_id, error))
+
+    def obs_request(self, request_type, seconds, ok=True):
+        self.obs_rtt.observe(seconds, (request_type,))
+        if not ok:
+            self.obs_failures.inc((request_type,))
+
+    def watch(self, name, help_text, fn, metric_type='gauge', labelnames=()):
+        """登记抓取时才读取的指标"""
+        return self.registry.callback(name, help_text, fn, metric_type, labelnames)
+
+    # ---- 事件循环延迟与HTTP端点 ----
+
+    async def _watch_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.loop_lag_interval
+            await asyncio.sleep(self.loop_lag_interval)
+            self.loop_lag.observe(max(loop.time() - expected, 0.0))
+
+    def add_route(self, method, path, handler):
+        """在/metrics所在的本地端点上注册其他路由（须在start之前调用）"""
+        self.routes.append((method, path, handler))
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=self.registry.render(), content_type='text/plain', charset='utf-8')
+
+    async def start(self, host='127.0.0.1', port=9108):
+        """启动事件循环延迟监测；port不为None时同时启动/metrics端点"""
+        if self._lag_task is None:
+            self._lag_task = asyncio.ensure_future(self._watch_loop_lag())
+        if port is None or self._runner is not None:
+            return None
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle_metrics)
+        for method, path, handler in self.routes:
+            app.router.add_route(method, path, handler)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}/metrics"
+
+    async def stop(self):
+        if self._lag_task is not None:
+            self._lag_task.cancel()
+            try:
+                await self._lag_task
+            except asyncio.CancelledError:
+                pass
+            self._lag_task = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
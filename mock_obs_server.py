@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模拟OBS WebSocket v5服务器（进程内asyncio）
+功能：
+1. 握手：Hello(op 0) → Identify(op 1) → Identified(op 2)，支持密码认证和Reidentify(op 3)
+2. 实现控制器用到的请求(op 6 → op 7)和RequestBatch(op 8 → op 9)，维护场景、输入源和场景项
+3. 状态变化时按订阅掩码推送事件(op 5)，与真实OBS的事件名称和字段一致
+4. 可配置延迟、抖动和错误注入（按比例让请求失败，或主动断开所有连接），用于压测OBS相关逻辑
+
+用法：
+    python mock_obs_server.py --port 4455 --latency 0.005 --jitter 0.002
+    然后把控制器的obs_host/obs_port指向本机即可，无需真实OBS
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import secrets
+import time
+from collections import Counter
+
+import websockets
+
+# 事件订阅掩码、认证字符串和RPC版本与客户端共用同一份定义
+from obs_connection import (EVENT_ALL, EVENT_GENERAL, EVENT_INPUTS, EVENT_SCENE_ITEM_TRANSFORM_CHANGED,
+                            EVENT_SCENE_ITEMS, EVENT_SCENES, RPC_VERSION, auth_string)
+
+EVENT_CATEGORIES = {
+    "SceneCreated": EVENT_SCENES,
+    "SceneRemoved": EVENT_SCENES,
+    "SceneNameChanged": EVENT_SCENES,
+    "CurrentProgramSceneChanged": EVENT_SCENES,
+    "SceneListChanged": EVENT_SCENES,
+    "InputCreated": EVENT_INPUTS,
+    "InputRemoved": EVENT_INPUTS,
+    "InputSettingsChanged": EVENT_INPUTS,
+    "SceneItemCreated": EVENT_SCENE_ITEMS,
+    "SceneItemRemoved": EVENT_SCENE_ITEMS,
+    "SceneItemEnableStateChanged": EVENT_SCENE_ITEMS,
+    "SceneItemTransformChanged": EVENT_SCENE_ITEM_TRANSFORM_CHANGED,
+}
+
+# RequestStatus
+STATUS_SUCCESS = 100
+STATUS_UNKNOWN_REQUEST_TYPE = 204
+STATUS_MISSING_REQUEST_FIELD = 300
+STATUS_RESOURCE_NOT_FOUND = 600
+STATUS_RESOURCE_ALREADY_EXISTS = 601
+STATUS_REQUEST_PROCESSING_FAILED = 702
+
+# WebSocketCloseCode
+CLOSE_NOT_IDENTIFIED = 4007
+CLOSE_ALREADY_IDENTIFIED = 4008
+CLOSE_AUTHENTICATION_FAILED = 4009
+CLOSE_UNSUPPORTED_RPC_VERSION = 4010
+
+
+class RequestError(Exception):
+    """请求失败，code为RequestStatus"""
+
+    def __init__(self, code, comment):
+        super().__init__(comment)
+        self.code = code
+        self.comment = comment
+
+
+class _Session:
+    """一个客户端连接"""
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.identified = False
+        self.event_subscriptions = EVENT_ALL
+        self.authentication = None    # {'challenge': str, 'salt': str}，无密码时为None
+
+
+class MockOBSServer:
+    """模拟OBS WebSocket v5服务器
+
+    请求在收到时按顺序立即修改状态，响应和由此产生的事件在延迟（latency ± jitter秒）后发送，
+    因此并发请求可以流水线执行，状态变化顺序与发送顺序一致。
+    error_rate为请求失败的概率（error_requests可限定只对某些requestType注入），失败的请求不修改状态。
+    """
+
+    def __init__(self, password=None, latency=0.0, jitter=0.0, error_rate=0.0, error_requests=None, seed=None):
+        self.password = password or None
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_requests = set(error_requests) if error_requests else None
+        self.rng = random.Random(seed)
+        self.sessions = set()
+        self._server = None
+        self._tasks = set()
+        self._item_ids = itertools.count(1)
+        self.scenes = {}              # sceneName -> {sceneItemId: 场景项}
+        self.inputs = {}              # inputName -> {'inputKind': str, 'inputSettings': dict}
+        self.program_scene = None
+        self.request_counts = Counter()
+        self.messages = 0
+        self.batches = 0
+        self.injected_errors = 0
+        self.events_sent = 0
+        self.connections = 0
+        self.url = None
+
+    # ---- 服务器 ----
+
+    async def start(self, host='127.0.0.1', port=4455):
+        """启动服务器，port为0时自动分配端口，返回实际端口"""
+        self._server = await websockets.serve(self.handler, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        self.url = f"ws://{host}:{port}"
+        return port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def drop_connections(self, code=1011, reason='mock disconnect'):
+        """主动断开所有客户端（模拟OBS崩溃或网络中断）"""
+        sessions = list(self.sessions)
+        await asyncio.gather(*(session.websocket.close(code, reason) for session in sessions),
+                             return_exceptions=True)
+        return len(sessions)
+
+    def reset(self):
+        """清空场景、输入源和计数"""
+        self.scenes.clear()
+        self.inputs.clear()
+        self.program_scene = None
+        self.request_counts.clear()
+        self.messages = self.batches = self.injected_errors = self.events_sent = 0
+
+    @property
+    def total_requests(self):
+        return sum(self.request_counts.values())
+
+    def get_stats(self):
+        return {
+            'connections': self.connections,
+            'clients': len(self.sessions),
+            'messages': self.messages,
+            'requests': self.total_requests,
+            'batches': self.batches,
+            'injected_errors': self.injected_errors,
+            'events_sent': self.events_sent,
+            'scenes': len(self.scenes),
+            'inputs': len(self.inputs)
+        }
+
+    # ---- 连接处理 ----
+
+    def _delay(self):
+        return max(self.latency + self.rng.uniform(-self.jitter, self.jitter), 0.0)
+
+    def _hello(self, session):
+        hello = {"obsWebSocketVersion": "5.5.0", "rpcVersion": RPC_VERSION}
+        if self.password:
+            session.authentication = {"challenge": secrets.token_urlsafe(24), "salt": secrets.token_urlsafe(24)}
+            hello["authentication"] = session.authentication
+        return hello
+
+    async def handler(self, websocket):
+        session = _Session(websocket)
+        self.connections += 1
+        try:
+            await websocket.send(json.dumps({"op": 0, "d": self._hello(session)}))
+            async for raw in websocket:
+                self.messages += 1
+                try:
+                    message = json.loads(raw)
+                    op, payload = message["op"], message.get("d") or {}
+                except (ValueError, KeyError, TypeError):
+                    await websocket.close(4002, "message decode error")
+                    return
+                if op == 1:
+                    if session.identified:
+                        await websocket.close(CLOSE_ALREADY_IDENTIFIED, "already identified")
+                        return
+                    if not await self._identify(session, payload):
+                        return
+                elif not session.identified:
+                    await websocket.close(CLOSE_NOT_IDENTIFIED, "not identified")
+                    return
+                elif op == 3:
+                    session.event_subscriptions = payload.get("eventSubscriptions", session.event_subscriptions)
+                    await websocket.send(json.dumps({"op": 2, "d": {"negotiatedRpcVersion": RPC_VERSION}}))
+                elif op == 6:
+                    response, events = self._process(payload)
+                    self._respond(session, {"op": 7, "d": response}, events)
+                elif op == 8:
+                    self.batches += 1
+                    results, events, sleep_ms = self._process_batch(payload)
+                    self._respond(session, {"op": 9, "d": {"requestBatchId": payload.get("requestBatchId"),
+                                                           "results": results}}, events, sleep_ms / 1000)
+                else:
+                    await websocket.close(4006, f"unknown op {op}")
+                    return
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.sessions.discard(session)
+
+    async def _identify(self, session, payload):
+        websocket = session.websocket
+        if payload.get("rpcVersion") != RPC_VERSION:
+            await websocket.close(CLOSE_UNSUPPORTED_RPC_VERSION, "unsupported rpc version")
+            return False
+        if self.password:
+            authentication = session.authentication
+            expected = auth_string(self.password, authentication["salt"], authentication["challenge"])
+            if payload.get("authentication") != expected:
+                await websocket.close(CLOSE_AUTHENTICATION_FAILED, "authentication failed")
+                return False
+        session.identified = True
+        session.event_subscriptions = payload.get("eventSubscriptions", EVENT_ALL)
+        self.sessions.add(session)
+        await websocket.send(json.dumps({"op": 2, "d": {"negotiatedRpcVersion": RPC_VERSION}}))
+        return True
+
+    def _respond(self, session, message, events, extra_delay=0.0):
+        """延迟后发送响应，随后推送请求产生的事件"""
+        task = asyncio.ensure_future(self._send_later(session, message, events, self._delay() + extra_delay))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send_later(self, session, message, events, delay):
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await session.websocket.send(json.dumps(message))
+        except websockets.ConnectionClosed:
+            return
+        for event_type, event_data in events:
+            await self._broadcast(event_type, event_data)
+
+    async def _broadcast(self, event_type, event_data):
+        category = EVENT_CATEGORIES.get(event_type, EVENT_GENERAL)
+        message = json.dumps({"op": 5, "d": {"eventType": event_type, "eventIntent": category,
+                                             "eventData": event_data}})
+        for session in list(self.sessions):
+            if session.event_subscriptions & category:
+                try:
+                    await session.websocket.send(message)
+                    self.events_sent += 1
+                except websockets.ConnectionClosed:
+                    continue
+
+    async def emit(self, event_type, event_data):
+        """立即向订阅的客户端推送事件（测试时模拟在OBS界面中的操作）"""
+        await self._broadcast(event_type, event_data)
+
+    # ---- 请求处理 ----
+
+    def _process(self, request):
+        """执行单个请求，返回(响应, 事件列表)"""
+        request_type = request.get("requestType")
+        response = {"requestType": request_type, "requestId": request.get("requestId")}
+        events = []
+        self.request_counts[request_type] += 1
+        try:
+            if self.error_rate and (self.error_requests is None or request_type in self.error_requests) \
+                    and self.rng.random() < self.error_rate:
+                self.injected_errors += 1
+                raise RequestError(STATUS_REQUEST_PROCESSING_FAILED, "injected error")
+            handler = getattr(self, f"_req_{request_type}", None)
+            if handler is None:
+                raise RequestError(STATUS_UNKNOWN_REQUEST_TYPE, f"unknown request type: {request_type}")
+            data = handler(request.get("requestData") or {}, events)
+            response["requestStatus"] = {"result": True, "code": STATUS_SUCCESS}
+            if data is not None:
+                response["responseData"] = data
+        except RequestError as e:
+            events = []
+            response["requestStatus"] = {"result": False, "code": e.code, "comment": e.comment}
+        return response, events
+
+    def _process_batch(self, batch):
+        results, events = [], []
+        sleep_ms = 0
+        for request in batch.get("requests", []):
+            if request.get("requestType") == "Sleep":
+                sleep_ms += (request.get("requestData") or {}).get("sleepMillis", 0)
+            response, request_events = self._process(request)
+            results.append(response)
+            events.extend(request_events)
+            if batch.get("haltOnFailure") and not response["requestStatus"]["result"]:
+                break
+        return results, events, sleep_ms
+
+    @staticmethod
+    def _require(data, *fields):
+        for field in fields:
+            if field not in data:
+                raise RequestError(STATUS_MISSING_REQUEST_FIELD, f"missing field: {field}")
+        return [data[field] for field in fields]
+
+    def _scene(self, scene_name):
+        scene = self.scenes.get(scene_name)
+        if scene is None:
+            raise RequestError(STATUS_RESOURCE_NOT_FOUND, f"scene not found: {scene_name}")
+        return scene
+
+    def _item(self, data):
+        scene_name, scene_item_id = self._require(data, "sceneName", "sceneItemId")
+        item = self._scene(scene_name).get(scene_item_id)
+        if item is None:
+            raise RequestError(STATUS_RESOURCE_NOT_FOUND, f"scene item not found: {scene_item_id}")
+        return scene_name, scene_item_id, item
+
+    def _add_item(self, scene_name, source_name, enabled, events):
+        scene = self.scenes[scene_name]
+        scene_item_id = next(self._item_ids)
+        scene[scene_item_id] = {"sourceName": source_name, "sceneItemEnabled": enabled,
+                                "sceneItemIndex": len(scene), "sceneItemTransform": {}}
+        events.append(("SceneItemCreated", {"sceneName": scene_name, "sourceName": source_name,
+                                            "sceneItemId": scene_item_id, "sceneItemIndex": len(scene) - 1}))
+        return scene_item_id
+
+    def _req_Sleep(self, data, events):
+        return None
+
+    def _req_GetVersion(self, data, events):
+        return {"obsVersion": "30.0.0", "obsWebSocketVersion": "5.5.0", "rpcVersion": RPC_VERSION,
+                "availableRequests": sorted(name[5:] for name in dir(self) if name.startswith("_req_"))}
+
+    def _req_GetSceneList(self, data, events):
+        count = len(self.scenes)
+        return {"currentProgramSceneName": self.program_scene, "currentPreviewSceneName": None,
+                "scenes": [{"sceneName": name, "sceneIndex": count - index - 1}
+                           for index, name in enumerate(self.scenes)]}
+
+    def _req_GetCurrentProgramScene(self, data, events):
+        return {"currentProgramSceneName": self.program_scene, "sceneName": self.program_scene}
+
+    def _req_SetCurrentProgramScene(self, data, events):
+        scene_name, = self._require(data, "sceneName")
+        self._scene(scene_name)
+        self.program_scene = scene_name
+        events.append(("CurrentProgramSceneChanged", {"sceneName": scene_name}))
+
+    def _req_CreateScene(self, data, events):
+        scene_name, = self._require(data, "sceneName")
+        if scene_name in self.scenes or scene_name in self.inputs:
+            raise RequestError(STATUS_RESOURCE_ALREADY_EXISTS, f"source already exists: {scene_name}")
+        self.scenes[scene_name] = {}
+        if self.program_scene is None:
+            self.program_scene = scene_name
+        events.append(("SceneCreated", {"sceneName": scene_name, "isGroup": False}))
+        return {"sceneUuid": secrets.token_hex(8)}
+
+    def _req_RemoveScene(self, data, events):
+        scene_name, = self._require(data, "sceneName")
+        self._scene(scene_name)
+        del self.scenes[scene_name]
+        if self.program_scene == scene_name:
+            self.program_scene = next(iter(self.scenes), None)
+        events.append(("SceneRemoved", {"sceneName": scene_name, "isGroup": False}))
+
+    def _req_GetInputList(self, data, events):
+        kind = data.get("inputKind")
+        return {"inputs": [{"inputName": name, "inputKind": item["inputKind"],
+                            "unversionedInputKind": item["inputKind"]}
+                           for name, item in self.inputs.items() if kind is None or item["inputKind"] == kind]}
+
+    def _req_CreateInput(self, data, events):
+        scene_name, input_name, input_kind = self._require(data, "sceneName", "inputName", "inputKind")
+        self._scene(scene_name)
+        if input_name in self.inputs or input_name in self.scenes:
+            raise RequestError(STATUS_RESOURCE_ALREADY_EXISTS, f"source already exists: {input_name}")
+        settings = dict(data.get("inputSettings") or {})
+        self.inputs[input_name] = {"inputKind": input_kind, "inputSettings": settings}
+        events.append(("InputCreated", {"inputName": input_name, "inputKind": input_kind,
+                                        "unversionedInputKind": input_kind, "inputSettings": settings,
+                                        "defaultInputSettings": {}}))
+        scene_item_id = self._add_item(scene_name, input_name, data.get("sceneItemEnabled", True), events)
+        return {"inputUuid": secrets.token_hex(8), "sceneItemId": scene_item_id}
+
+    def _req_RemoveInput(self, data, events):
+        input_name, = self._require(data, "inputName")
+        if self.inputs.pop(input_name, None) is None:
+            raise RequestError(STATUS_RESOURCE_NOT_FOUND, f"input not found: {input_name}")
+        for scene_name, scene in self.scenes.items():
+            for scene_item_id in [key for key, item in scene.items() if item["sourceName"] == input_name]:
+                del scene[scene_item_id]
+                events.append(("SceneItemRemoved", {"sceneName": scene_name, "sourceName": input_name,
+                                                    "sceneItemId": scene_item_id}))
+        events.append(("InputRemoved", {"inputName": input_name}))
+
+    def _req_GetInputSettings(self, data, events):
+        input_name, = self._require(data, "inputName")
+        item = self.inputs.get(input_name)
+        if item is None:
+            raise RequestError(STATUS_RESOURCE_NOT_FOUND, f"input not found: {input_name}")
+        return {"inputKind": item["inputKind"], "inputSettings": dict(item["inputSettings"])}
+
+    def _req_SetInputSettings(self, data, events):
+        input_name, settings = self._require(data, "inputName", "inputSettings")
+        item = self.inputs.get(input_name)
+        if item is None:
+            raise RequestError(STATUS_RESOURCE_NOT_FOUND, f"input not found: {input_name}")
+        if data.get("overlay", True):
+            item["inputSettings"].update(settings)
+        else:
+            item["inputSettings"] = dict(settings)
+        events.append(("InputSettingsChanged", {"inputName": input_name, "inputSettings": dict(item["inputSettings"])}))
+
+    def _req_CreateSceneItem(self, data, events):
+        scene_name, source_name = self._require(data, "sceneName", "sourceName")
+        self._scene(scene_name)
+        if source_name not in self.inputs and source_name not in self.scenes:
+            raise RequestError(STATUS_RESOURCE_NOT_FOUND, f"source not found: {source_name}")
+        return {"sceneItemId": self._add_item(scene_name, source_name, data.get("sceneItemEnabled", True), events)}
+
+    def _req_RemoveSceneItem(self, data, events):
+        scene_name, scene_item_id, item = self._item(data)
+        del self.scenes[scene_name][scene_item_id]
+        events.append(("SceneItemRemoved", {"sceneName": scene_name, "sourceName": item["sourceName"],
+                                            "sceneItemId": scene_item_id}))
+
+    def _req_GetSceneItemId(self, data, events):
+        scene_name, source_name = self._require(data, "sceneName", "sourceName")
+        for scene_item_id, item in self._scene(scene_name).items():
+            if item["sourceName"] == source_name:
+                return {"sceneItemId": scene_item_id}
+        raise RequestError(STATUS_RESOURCE_NOT_FOUND, f"source not in scene: {source_name}")
+
+    def _req_GetSceneItemList(self, data, events):
+        scene_name, = self._require(data, "sceneName")
+        return {"sceneItems": [dict(item, sceneItemId=scene_item_id, sceneItemTransform=dict(item["sceneItemTransform"]))
+                               for scene_item_id, item in self._scene(scene_name).items()]}
+
+    def _req_GetSceneItemEnabled(self, data, events):
+        scene_name, scene_item_id, item = self._item(data)
+        return {"sceneItemEnabled": item["sceneItemEnabled"]}
+
+    def _req_SetSceneItemEnabled(self, data, events):
+        scene_name, scene_item_id, item = self._item(data)
+        enabled, = self._require(data, "sceneItemEnabled")
+        item["sceneItemEnabled"] = enabled
+        events.append(("SceneItemEnableStateChanged", {"sceneName": scene_name, "sceneItemId": scene_item_id,
+                                                       "sceneItemEnabled": enabled}))
+
+    def _req_GetSceneItemTransform(self, data, events):
+        scene_name, scene_item_id, item = self._item(data)
+        return {"sceneItemTransform": dict(item["sceneItemTransform"])}
+
+    def _req_SetSceneItemTransform(self, data, events):
+        scene_name, scene_item_id, item = self._item(data)
+        transform, = self._require(data, "sceneItemTransform")
+        item["sceneItemTransform"].update(transform)
+        events.append(("SceneItemTransformChanged", {"sceneName": scene_name, "sceneItemId": scene_item_id,
+                                                     "sceneItemTransform": dict(item["sceneItemTransform"])}))
+
+
+async def serve_forever(args):
+    server = MockOBSServer(password=args.password, latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, seed=args.seed)
+    port = await server.start(args.host, args.port)
+    print(f"🎭 模拟OBS WebSocket服务器已启动: ws://{args.host}:{port}"
+          f"（延迟{args.latency * 1000:g}±{args.jitter * 1000:g}ms，错误率{args.error_rate:.1%}）")
+    started = time.monotonic()
+    try:
+        while True:
+            await asyncio.sleep(10)
+            stats = server.get_stats()
+            print(f"📊 {time.monotonic() - started:.0f}s: 客户端{stats['clients']} 请求{stats['requests']} "
+                  f"批量{stats['batches']} 事件{stats['events_sent']} 注入错误{stats['injected_errors']}")
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟OBS WebSocket v5服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4455)
+    parser.add_argument('--password', help='WebSocket密码（不设置则不认证）')
+    parser.add_argument('--latency', type=float, default=0.0, help='每条响应的延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延迟抖动（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='请求失败的概率')
+    parser.add_argument('--seed', type=int, help='随机种子')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve_forever(args))
+    except KeyboardInterrupt:
+        print("\n👋 已停止")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OBS命令队列（按优先级、合并、限速）
+功能：
+1. 所有发往OBS的命令先入队，按优先级发送：切换节目场景 > 显示/隐藏 > 位置/设置 > 创建
+2. 尚未发送的命令按目标合并：同一场景项的多次SetSceneItemTransform合并为一条（字段按顺序覆盖），
+   同一输入源的SetInputSettings合并，显示状态和节目场景只保留最新的一条
+3. 令牌桶限制每秒命令数，避免大规模重排时压垮OBS（切换节目场景和只读的Get请求不消耗令牌）
+4. 切换节目场景走单独的通道：立即单独发送，不排在在途的批次后面；
+   其余命令每次最多发送max_batch条（一个RequestBatch），同时只有一个批次在途
+5. 与OBSConnection相同的call/call_batch接口，LayoutReconciler等可直接使用
+6. 命令记录入队时的追踪关联ID（合并时取并集），发送时带到OBS请求的span上（见tracing.py）
+"""
+
+import asyncio
+import time
+from collections import deque
+
+import tracing
+
+PRIORITY_SWITCH = 0
+PRIORITY_VISIBILITY = 1
+PRIORITY_TRANSFORM = 2
+PRIORITY_CREATE = 3
+
+PRIORITY_NAMES = {PRIORITY_SWITCH: '切换', PRIORITY_VISIBILITY: '显示', PRIORITY_TRANSFORM: '位置', PRIORITY_CREATE: '创建'}
+
+REQUEST_PRIORITIES = {
+    "SetCurrentProgramScene": PRIORITY_SWITCH,
+    "SetSceneItemEnabled": PRIORITY_VISIBILITY,
+    "SetSceneItemTransform": PRIORITY_TRANSFORM,
+    "SetInputSettings": PRIORITY_TRANSFORM,
+    "CreateScene": PRIORITY_CREATE,
+    "CreateInput": PRIORITY_CREATE,
+    "CreateSceneItem": PRIORITY_CREATE,
+    "GetSceneItemId": PRIORITY_CREATE,   # 紧跟在创建请求之后，须与其保持顺序
+}
+
+# 可合并的请求中需要按字段覆盖的部分（其余请求只保留最新的一条）
+MERGE_FIELDS = {
+    "SetSceneItemTransform": "sceneItemTransform",
+    "SetInputSettings": "inputSettings",
+}
+
+
+def coalesce_key(request_type, request_data):
+    """合并键，同一键的未发送命令合并为一条，None表示不合并"""
+    request_data = request_data or {}
+    if request_type == "SetCurrentProgramScene":
+        return (request_type,)
+    if request_type in ("SetSceneItemEnabled", "SetSceneItemTransform"):
+        return (request_type, request_data.get("sceneName"), request_data.get("sceneItemId"))
+    if request_type == "SetInputSettings" and request_data.get("overlay", True):
+        return (request_type, request_data.get("inputName"))
+    return None
+
+
+class _Command:
+    __slots__ = ('request_type', 'request_data', 'priority', 'key', 'futures', 'enqueued_at', 'cids')
+
+    def __init__(self, request_type, request_data, priority, key, enqueued_at, cids=()):
+        self.request_type = request_type
+        self.request_data = request_data
+        self.priority = priority
+        self.key = key
+        self.futures = []
+        self.enqueued_at = enqueued_at
+        self.cids = cids            # 入队时的追踪关联ID
+
+    def merge(self, request_data):
+        """用更新的命令覆盖本命令（在原位置发送）"""
+        field = MERGE_FIELDS.get(self.request_type)
+        if field is None:
+            self.request_data = request_data
+            return
+        merged = dict(self.request_data)
+        merged.update(request_data)
+        merged[field] = dict(self.request_data.get(field) or {}, **(request_data.get(field) or {}))
+        self.request_data = merged
+
+
+class OBSCommandQueue:
+    """OBSConnection前的优先级命令队列"""
+
+    def __init__(self, obs=None, max_rps=2000.0, burst=500, max_batch=50, clock=time.monotonic):
+        self.obs = obs                  # 当前的OBSConnection，重连后由控制器替换
+        self.max_rps = max_rps
+        self.burst = burst
+        self.max_batch = max_batch      # 非切换命令每批的上限
+        self.clock = clock
+        self.queues = {priority: deque() for priority in PRIORITY_NAMES}
+        self.pending = {}               # 合并键 -> 未发送的_Command
+        self.tokens = float(burst)
+        self._refilled_at = None
+        self._lanes = {}                # 通道 -> (唤醒事件, 发送任务)
+        self.enqueued = 0
+        self.merged = 0
+        self.sent = 0
+        self.batches = 0
+        self.max_depth = 0
+        self.latencies = {priority: deque(maxlen=200) for priority in PRIORITY_NAMES}   # 入队到收到响应（秒）
+
+    @property
+    def connected(self):
+        return self.obs is not None and self.obs.connected
+
+    @property
+    def depth(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    # ---- 入队 ----
+
+    @staticmethod
+    def _lane(priority):
+        """切换命令单独一个通道，其余命令共用批量通道"""
+        return 'switch' if priority == PRIORITY_SWITCH else 'bulk'
+
+    def _wake(self, lane):
+        wakeup, task = self._lanes.get(lane, (None, None))
+        if task is None or task.done():
+            wakeup = asyncio.Event()
+            priorities = [PRIORITY_SWITCH] if lane == 'switch' else \
+                sorted(priority for priority in PRIORITY_NAMES if priority != PRIORITY_SWITCH)
+            task = asyncio.ensure_future(self._drain(wakeup, priorities))
+            self._lanes[lane] = (wakeup, task)
+        wakeup.set()
+
+    def _enqueue(self, request_type, request_data, priority=None):
+        future = asyncio.get_running_loop().create_future()
+        key = coalesce_key(request_type, request_data)
+        self.enqueued += 1
+        cids = tracing.correlation()
+        command = self.pending.get(key) if key is not None else None
+        if command is not None:
+            command.merge(request_data)
+            if cids:
+                command.cids = tuple(dict.fromkeys(command.cids + cids))
+            self.merged += 1
+        else:
+            if priority is None:
+                priority = REQUEST_PRIORITIES.get(request_type, PRIORITY_TRANSFORM)
+            command = _Command(request_type, request_data, priority, key, self.clock(), cids)
+            self.queues[priority].append(command)
+            if key is not None:
+                self.pending[key] = command
+            self.max_depth = max(self.max_depth, self.depth)
+        command.futures.append(future)
+        self._wake(self._lane(command.priority))
+        return future
+
+    async def call(self, request_type, request_data=None, timeout=None, priority=None):
+        """入队并等待响应，返回响应的d字段（被合并的命令返回合并后命令的响应）
+
+        timeout从入队开始计算（包括排队时间），超时抛出asyncio.TimeoutError；已入队的命令仍可能被发送。
+        """
+        future = self._enqueue(request_type, request_data, priority)
+        if timeout is None:
+            return await future
+        return await asyncio.wait_for(future, timeout)
+
+    async def call_batch(self, requests, halt_on_failure=False, execution_type=None, timeout=None):
+        """逐条入队并按顺序返回结果；需要haltOnFailure时不经过队列直接发送"""
+        if halt_on_failure:
+            return await self.obs.call_batch(requests, halt_on_failure=True, timeout=timeout)
+        futures = [self._enqueue(request_type, request_data) for request_type, request_data in requests]
+        gathered = asyncio.gather(*futures)
+        if timeout is None:
+            return list(await gathered)
+        return list(await asyncio.wait_for(gathered, timeout))
+
+    # ---- 发送 ----
+
+    def _refill(self):
+        now = self.clock()
+        if self._refilled_at is not None:
+            self.tokens = min(self.tokens + (now - self._refilled_at) * self.max_rps, self.burst)
+        self._refilled_at = now
+
+    def _take(self, priorities):
+        """按优先级从指定队列取出一批命令；切换命令每次一条且不受令牌限制，只读请求不消耗令牌"""
+        self._refill()
+        batch = []
+        for priority in priorities:
+            queue = self.queues[priority]
+            limit = 1 if priority == PRIORITY_SWITCH else self.max_batch
+            while queue and len(batch) < limit:
+                command = queue[0]
+                free = priority == PRIORITY_SWITCH or command.request_type.startswith("Get")
+                if not free and self.tokens < 1:
+                    break
+                queue.popleft()
+                if command.key is not None:
+                    self.pending.pop(command.key, None)
+                if not free:
+                    self.tokens -= 1
+                batch.append(command)
+        return batch
+
+    async def _drain(self, wakeup, priorities):
+        """一个通道的发送循环：同一通道同时只有一个请求/批次在途"""
+        while True:
+            if not any(self.queues[priority] for priority in priorities):
+                wakeup.clear()
+                await wakeup.wait()
+                continue
+            batch = self._take(priorities)
+            if not batch:
+                await asyncio.sleep((1 - self.tokens) / self.max_rps)
+                continue
+            await self._send(batch)
+
+    async def _send(self, batch):
+        requests = [(command.request_type, command.request_data) for command in batch]
+        if tracing.active() is not None:
+            # 发送任务独立于控制循环，按本批命令的关联ID设置上下文
+            tracing.set_correlation(dict.fromkeys(cid for command in batch for cid in command.cids))
+        try:
+            if self.obs is None:
+                raise ConnectionError("OBS WebSocket未连接")
+            if len(requests) == 1:
+                results = [await self.obs.call(*requests[0])]
+            else:
+                results = await self.obs.call_batch(requests)
+        except Exception as e:
+            for command in batch:
+                for future in command.futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        now = self.clock()
+        self.sent += len(batch)
+        self.batches += 1
+        for command, result in zip(batch, results):
+            self.latencies[command.priority].append(now - command.enqueued_at)
+            for future in command.futures:
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self):
+        """停止发送，未发送的命令以ConnectionError结束"""
+        for wakeup, task in self._lanes.values():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._lanes = {}
+        error = ConnectionError("OBS命令队列已关闭")
+        for queue in self.queues.values():
+            while queue:
+                for future in queue.popleft().futures:
+                    if not future.done():
+                        future.set_exception(error)
+        self.pending.clear()
+
+    def get_stats(self):
+        def p95(values):
+            ordered = sorted(values)
+            return round(ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)] * 1000, 2) if ordered else None
+
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'merged': self.merged,
+            'sent': self.sent,
+            'batches': self.batches,
+            'tokens': round(self.tokens, 1),
+            'latency_ms_p95': {PRIORITY_NAMES[priority]: p95(values) for priority, values in self.latencies.items()}
+        }
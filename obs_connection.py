@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OBS WebSocket v5 连接多路复用器
+功能：
+1. 由单个分发协程独占recv()，按requestId将响应(op 7)匹配到等待中的请求
+2. 事件消息(op 5)分发给订阅者，不再与请求响应混淆
+3. 支持多个OBS请求同时在途
+4. 支持RequestBatch(op 8)批量请求，一次往返执行多个请求
+5. v5握手：Hello(op 0) → Identify(op 1，含SHA256认证和事件订阅掩码) → Identified(op 2)，
+   运行中可通过Reidentify(op 3)修改事件订阅掩码
+6. 可选记录每个请求的往返耗时（metrics，按requestType，见metrics.py）
+7. 启用追踪时每个请求从发送到收到响应记为一个span，带上当前的关联ID（见tracing.py）
+"""
+
+import asyncio
+import base64
+import hashlib
+import inspect
+import itertools
+import json
+import time
+
+import tracing
+
+# RequestBatch执行方式
+BATCH_SERIAL_REALTIME = 0
+BATCH_SERIAL_FRAME = 1
+BATCH_PARALLEL = 2
+
+RPC_VERSION = 1
+
+# 事件订阅掩码（EventSubscription），Identify/Reidentify时按位或组合
+EVENT_GENERAL = 1 << 0
+EVENT_CONFIG = 1 << 1
+EVENT_SCENES = 1 << 2
+EVENT_INPUTS = 1 << 3
+EVENT_TRANSITIONS = 1 << 4
+EVENT_FILTERS = 1 << 5
+EVENT_OUTPUTS = 1 << 6
+EVENT_SCENE_ITEMS = 1 << 7
+EVENT_MEDIA_INPUTS = 1 << 8
+EVENT_VENDORS = 1 << 9
+EVENT_UI = 1 << 10
+EVENT_ALL = 0x7FF             # 所有低频事件（OBS默认订阅）
+# 高频事件不包含在EVENT_ALL中，需单独订阅
+EVENT_INPUT_VOLUME_METERS = 1 << 16
+EVENT_INPUT_ACTIVE_STATE_CHANGED = 1 << 17
+EVENT_INPUT_SHOW_STATE_CHANGED = 1 << 18
+EVENT_SCENE_ITEM_TRANSFORM_CHANGED = 1 << 19
+EVENT_NONE = 0
+
+
+def auth_string(password, salt, challenge):
+    """OBS WebSocket v5认证字符串：base64(sha256(base64(sha256(密码 + salt)) + challenge))"""
+    secret = base64.b64encode(hashlib.sha256((password + salt).encode('utf-8')).digest()).decode('utf-8')
+    return base64.b64encode(hashlib.sha256((secret + challenge).encode('utf-8')).digest()).decode('utf-8')
+
+
+class OBSConnection:
+    """OBS WebSocket v5 请求/响应多路复用器"""
+
+    def __init__(self, websocket, request_timeout=10.0):
+        self.websocket = websocket
+        self.request_timeout = request_timeout
+        self.pending = {}          # requestId / requestBatchId -> Future
+        self.subscribers = {}      # eventType -> [callback]，"*" 表示所有事件
+        self.dispatcher_task = None
+        self.handler_tasks = set()  # 异步事件回调的任务（保留引用直到完成）
+        self._request_ids = itertools.count(1)
+        self.hello = None                   # 服务器Hello(op 0)的d字段
+        self.negotiated_rpc_version = None
+        self.event_subscriptions = None     # 当前生效的事件订阅掩码
+        self.events_received = 0
+        self.send_failures = 0
+        self._identified = None             # 等待Reidentify确认的Future
+        self.metrics = None                 # 设置后记录每个请求的往返耗时（ControllerMetrics）
+
+    @property
+    def connected(self):
+        return self.dispatcher_task is not None and not self.dispatcher_task.done()
+
+    async def identify(self, password=None, event_subscriptions=EVENT_ALL, timeout=10.0):
+        """完成v5握手（须在start之前调用）：接收Hello，发送Identify，等待Identified
+
+        服务器要求认证而未提供密码、认证失败或RPC版本不支持时，服务器会关闭连接，这里抛出ConnectionError。
+        """
+        async def receive(expected_op):
+            try:
+                message = json.loads(await asyncio.wait_for(self.websocket.recv(), timeout))
+            except asyncio.TimeoutError:
+                raise ConnectionError(f"等待OBS握手消息(op {expected_op})超时")
+            except Exception as e:
+                reason = getattr(getattr(e, 'rcvd', None), 'reason', '') or e
+                raise ConnectionError(f"OBS握手失败: {reason}")
+            if message.get("op") != expected_op:
+                raise ConnectionError(f"OBS握手失败: 期望op {expected_op}，收到op {message.get('op')}")
+            return message.get("d", {})
+
+        self.hello = await receive(0)
+        identify = {"rpcVersion": RPC_VERSION, "eventSubscriptions": event_subscriptions}
+        authentication = self.hello.get("authentication")
+        if authentication:
+            if not password:
+                raise ConnectionError("OBS WebSocket需要密码，请设置obs_password")
+            identify["authentication"] = auth_string(password, authentication["salt"], authentication["challenge"])
+
+        await self.websocket.send(json.dumps({"op": 1, "d": identify}))
+        identified = await receive(2)
+        self.negotiated_rpc_version = identified.get("negotiatedRpcVersion")
+        self.event_subscriptions = event_subscriptions
+        return identified
+
+    async def reidentify(self, event_subscriptions, timeout=None):
+        """运行中修改事件订阅掩码（Reidentify），等待服务器确认"""
+        if not self.connected:
+            raise ConnectionError("OBS WebSocket未连接")
+        self._identified = asyncio.get_running_loop().create_future()
+        try:
+            await self._send({"op": 3, "d": {"eventSubscriptions": event_subscriptions}})
+            await asyncio.wait_for(self._identified, timeout or self.request_timeout)
+        finally:
+            self._identified = None
+        self.event_subscriptions = event_subscriptions
+
+    def start(self):
+        """启动分发协程"""
+        if not self.connected:
+            self.dispatcher_task = asyncio.ensure_future(self._dispatch_loop())
+
+    async def _dispatch_loop(self):
+        """持续接收消息并分发"""
+        error = None
+        try:
+            async for message in self.websocket:
+                try:
+                    self._handle_message(json.loads(message))
+                except Exception as e:
+                    print(f"❌ 处理OBS消息出错: {e}")
+        except Exception as e:
+            error = e
+        finally:
+            self._fail_pending(error or ConnectionError("OBS WebSocket连接已关闭"))
+
+    def _handle_message(self, message):
+        op = message.get("op")
+        payload = message.get("d", {})
+
+        if op == 7:  # RequestResponse
+            future = self.pending.pop(payload.get("requestId"), None)
+            if future is not None and not future.done():
+                future.set_result(payload)
+        elif op == 9:  # RequestBatchResponse
+            future = self.pending.pop(payload.get("requestBatchId"), None)
+            if future is not None and not future.done():
+                future.set_result(payload.get("results", []))
+        elif op == 5:  # Event
+            self.events_received += 1
+            self._emit(payload.get("eventType"), payload.get("eventData", {}))
+        elif op == 2:  # Identified（Reidentify的确认）
+            if self._identified is not None and not self._identified.done():
+                self._identified.set_result(payload)
+
+    def _emit(self, event_type, event_data):
+        callbacks = self.subscribers.get(event_type, []) + self.subscribers.get("*", [])
+        for callback in callbacks:
+            try:
+                result = callback(event_type, event_data)
+                if inspect.isawaitable(result):
+                    task = asyncio.ensure_future(result)
+                    self.handler_tasks.add(task)
+                    task.add_done_callback(lambda task: self._handler_done(event_type, task))
+            except Exception as e:
+                print(f"❌ OBS事件回调出错({event_type}): {e}")
+
+    def _handler_done(self, event_type, task):
+        self.handler_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ OBS事件回调出错({event_type}): {task.exception()}")
+
+    def _fail_pending(self, error):
+        if self._identified is not None and not self._identified.done():
+            self._identified.set_exception(error)
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    async def _send(self, message):
+        """发送消息；发送失败说明连接已断开，关闭websocket使分发协程退出（由OBSSupervisor重连）"""
+        try:
+            await self.websocket.send(json.dumps(message))
+        except Exception as e:
+            self.send_failures += 1
+            asyncio.ensure_future(self.websocket.close())
+            raise ConnectionError(f"发送OBS请求失败: {e}") from e
+
+    def next_request_id(self, request_type):
+        return f"{request_type}_{next(self._request_ids)}"
+
+    async def call(self, request_type, request_data=None, timeout=None):
+        """发送请求并等待对应的响应，返回响应的d字段"""
+        if not self.connected:
+            raise ConnectionError("OBS WebSocket未连接")
+
+        request_id = self.next_request_id(request_type)
+        request = {
+            "op": 6,
+            "d": {
+                "requestType": request_type,
+                "requestId": request_id
+            }
+        }
+        if request_data is not None:
+            request["d"]["requestData"] = request_data
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        started = time.perf_counter()
+        try:
+            with tracing.span(request_type, "OBS", request_id=request_id) as span:
+                await self._send(request)
+                response = await asyncio.wait_for(future, timeout or self.request_timeout)
+                span.set(result=response.get("requestStatus", {}).get("result", False))
+        finally:
+            self.pending.pop(request_id, None)
+        if self.metrics is not None:
+            self.metrics.obs_request(request_type, time.perf_counter() - started,
+                                     response.get("requestStatus", {}).get("result", False))
+        return response
+
+    async def call_batch(self, requests, halt_on_failure=False,
+                         execution_type=BATCH_SERIAL_REALTIME, timeout=None):
+        """批量发送请求，requests为(requestType, requestData)列表，按顺序返回每个请求的结果"""
+        if not self.connected:
+            raise ConnectionError("OBS WebSocket未连接")
+        if not requests:
+            return []
+
+        batch_id = self.next_request_id("RequestBatch")
+        batch = []
+        for index, (request_type, request_data) in enumerate(requests):
+            item = {"requestType": request_type, "requestId": str(index)}
+            if request_data is not None:
+                item["requestData"] = request_data
+            batch.append(item)
+
+        message = {
+            "op": 8,
+            "d": {
+                "requestBatchId": batch_id,
+                "haltOnFailure": halt_on_failure,
+                "executionType": execution_type,
+                "requests": batch
+            }
+        }
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[batch_id] = future
+        started = time.perf_counter()
+        try:
+            with tracing.span("RequestBatch", "OBS", request_id=batch_id, requests=len(batch)):
+                await self._send(message)
+                results = await asyncio.wait_for(future, timeout or self.request_timeout)
+        finally:
+            self.pending.pop(batch_id, None)
+        if self.metrics is not None:
+            self.metrics.obs_request("RequestBatch", time.perf_counter() - started,
+                                     all(result.get("requestStatus", {}).get("result", False) for result in results))
+
+        # 按请求顺序对齐结果，haltOnFailure时未执行的请求为None
+        ordered = [None] * len(requests)
+        for result in results:
+            try:
+                ordered[int(result.get("requestId"))] = result
+            except (TypeError, ValueError, IndexError):
+                continue
+        return ordered
+
+    def subscribe(self, event_type, callback):
+        """订阅OBS事件，callback(event_type, event_data)可以是普通函数或协程函数"""
+        self.subscribers.setdefault(event_type, []).append(callback)
+
+    def unsubscribe(self, event_type, callback):
+        callbacks = self.subscribers.get(event_type, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+
+    async def close(self):
+        """关闭连接并停止分发协程"""
+        await self.websocket.close()
+        if self.dispatcher_task is not None:
+            try:
+                await asyncio.wait_for(self.dispatcher_task, 2.0)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self.dispatcher_task.cancel()
+        self.dispatcher_task = None
+        handler_tasks = list(self.handler_tasks)
+        for task in handler_tasks:
+            task.cancel()
+        if handler_tasks:
+            await asyncio.gather(*handler_tasks, return_exceptions=True)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OBS场景图本地镜像
+功能：
+1. 连接时一次性加载场景、输入源和场景项
+2. 通过OBS事件保持同步，名称→ID查询为O(1)且不访问WebSocket
+3. 记录真实的当前节目场景
+"""
+
+
+class OBSSceneGraph:
+    """OBS场景、输入源和场景项的内存模型"""
+
+    def __init__(self):
+        self.scenes = {}                 # sceneName -> {sourceName: sceneItemId}
+        self.item_sources = {}           # (sceneName, sceneItemId) -> sourceName
+        self.item_enabled = {}           # (sceneName, sceneItemId) -> bool
+        self.inputs = {}                 # inputName -> inputKind
+        self.current_program_scene = None
+        self.loaded = False
+
+    async def load(self, obs):
+        """从OBS加载完整场景图（场景列表、输入列表、每个场景的场景项）"""
+        scene_list, input_list = await obs.call_batch([
+            ("GetSceneList", None),
+            ("GetInputList", None)
+        ])
+
+        self.scenes.clear()
+        self.item_sources.clear()
+        self.item_enabled.clear()
+        self.inputs.clear()
+
+        if scene_list and scene_list["requestStatus"]["result"]:
+            data = scene_list["responseData"]
+            self.current_program_scene = data.get("currentProgramSceneName")
+            for scene in data.get("scenes", []):
+                self.scenes[scene["sceneName"]] = {}
+
+        if input_list and input_list["requestStatus"]["result"]:
+            for item in input_list["responseData"].get("inputs", []):
+                self.inputs[item["inputName"]] = item.get("inputKind")
+
+        scene_names = list(self.scenes)
+        results = await obs.call_batch([
+            ("GetSceneItemList", {"sceneName": scene_name}) for scene_name in scene_names
+        ])
+        for scene_name, result in zip(scene_names, results):
+            if result and result["requestStatus"]["result"]:
+                for item in result["responseData"].get("sceneItems", []):
+                    self.add_item(scene_name, item["sourceName"], item["sceneItemId"],
+                                  item.get("sceneItemEnabled", True))
+
+        self.loaded = True
+
+    def attach(self, obs):
+        """订阅保持同步所需的OBS事件"""
+        handlers = {
+            "SceneCreated": self._on_scene_created,
+            "SceneRemoved": self._on_scene_removed,
+            "SceneNameChanged": self._on_scene_name_changed,
+            "InputCreated": self._on_input_created,
+            "InputRemoved": self._on_input_removed,
+            "InputNameChanged": self._on_input_name_changed,
+            "SceneItemCreated": self._on_scene_item_created,
+            "SceneItemRemoved": self._on_scene_item_removed,
+            "SceneItemEnableStateChanged": self._on_scene_item_enable_state_changed,
+            "CurrentProgramSceneChanged": self._on_current_program_scene_changed,
+        }
+        for event_type, handler in handlers.items():
+            obs.subscribe(event_type, handler)
+
+    def get_scene_item_id(self, scene_name, source_name):
+        return self.scenes.get(scene_name, {}).get(source_name)
+
+    def get_source_name(self, scene_name, scene_item_id):
+        return self.item_sources.get((scene_name, scene_item_id))
+
+    def is_item_enabled(self, scene_name, scene_item_id):
+        return self.item_enabled.get((scene_name, scene_item_id))
+
+    def has_scene(self, scene_name):
+        return scene_name in self.scenes
+
+    def has_input(self, input_name):
+        return input_name in self.inputs
+
+    def add_input(self, input_name, input_kind):
+        self.inputs[input_name] = input_kind
+
+    def add_item(self, scene_name, source_name, scene_item_id, enabled=True):
+        """记录场景项（也用于根据请求响应提前更新，事件到达时幂等）"""
+        self.scenes.setdefault(scene_name, {})[source_name] = scene_item_id
+        self.item_sources[(scene_name, scene_item_id)] = source_name
+        self.item_enabled.setdefault((scene_name, scene_item_id), enabled)
+
+    def remove_item(self, scene_name, scene_item_id):
+        source_name = self.item_sources.pop((scene_name, scene_item_id), None)
+        self.item_enabled.pop((scene_name, scene_item_id), None)
+        items = self.scenes.get(scene_name, {})
+        if source_name is not None and items.get(source_name) == scene_item_id:
+            del items[source_name]
+
+    # ---- 事件处理 ----
+
+    def _on_scene_created(self, event_type, data):
+        self.scenes.setdefault(data["sceneName"], {})
+
+    def _on_scene_removed(self, event_type, data):
+        scene_name = data["sceneName"]
+        for scene_item_id in list(self.scenes.pop(scene_name, {}).values()):
+            self.item_sources.pop((scene_name, scene_item_id), None)
+            self.item_enabled.pop((scene_name, scene_item_id), None)
+
+    def _on_scene_name_changed(self, event_type, data):
+        old_name, new_name = data["oldSceneName"], data["sceneName"]
+        items = self.scenes.pop(old_name, {})
+        self.scenes[new_name] = items
+        for source_name, scene_item_id in items.items():
+            self.item_sources[(new_name, scene_item_id)] = self.item_sources.pop((old_name, scene_item_id), source_name)
+            self.item_enabled[(new_name, scene_item_id)] = self.item_enabled.pop((old_name, scene_item_id), True)
+        if self.current_program_scene == old_name:
+            self.current_program_scene = new_name
+
+    def _on_input_created(self, event_type, data):
+        self.inputs[data["inputName"]] = data.get("inputKind")
+
+    def _on_input_removed(self, event_type, data):
+        self.inputs.pop(data["inputName"], None)
+
+    def _on_input_name_changed(self, event_type, data):
+        old_name, new_name = data["oldInputName"], data["inputName"]
+        if old_name in self.inputs:
+            self.inputs[new_name] = self.inputs.pop(old_name)
+        for scene_name, items in self.scenes.items():
+            if old_name in items:
+                scene_item_id = items.pop(old_name)
+                items[new_name] = scene_item_id
+                self.item_sources[(scene_name, scene_item_id)] = new_name
+
+    def _on_scene_item_created(self, event_type, data):
+        self.add_item(data["sceneName"], data["sourceName"], data["sceneItemId"])
+
+    def _on_scene_item_removed(self, event_type, data):
+        self.remove_item(data["sceneName"], data["sceneItemId"])
+
+    def _on_scene_item_enable_state_changed(self, event_type, data):
+        self.item_enabled[(data["sceneName"], data["sceneItemId"])] = data["sceneItemEnabled"]
+
+    def _on_current_program_scene_changed(self, event_type, data):
+        self.current_program_scene = data["sceneName"]
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+OBS连接监护
+功能：
+1. 监视OBSConnection的分发协程：ping超时（websockets的ping/pong）或发送失败都会使连接关闭，随即开始重连
+2. 按指数退避 + 随机抖动重连，每次重连重新握手（Identify）并重新加载场景图
+3. 重连成功后调用resync，按本地期望状态校正OBS，而不是重新执行整个setup_obs_scenes
+4. 断线期间的命令按key合并，重连后只执行每个key最新的一条
+5. 记录断线次数、重连次数和恢复耗时（断线到完成校正）
+"""
+
+import asyncio
+import random
+import time
+from collections import deque
+
+CONNECTED = 'connected'
+RECONNECTING = 'reconnecting'
+STOPPED = 'stopped'
+
+STATE_NAMES = {CONNECTED: '已连接', RECONNECTING: '重连中', STOPPED: '已停止'}
+
+
+class OBSSupervisor:
+    """OBS连接断线检测与自动重连
+
+    connect: 协程函数，建立新连接（握手、加载场景图），成功返回OBSConnection，失败返回None
+    resync: 协程函数，重连后按期望状态校正OBS
+    """
+
+    def __init__(self, connect, resync=None, initial_backoff=0.5, max_backoff=30.0, jitter=0.3,
+                 clock=time.monotonic):
+        self.connect = connect
+        self.resync = resync
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter            # 退避时间在±jitter比例内随机，避免多个客户端同时重连
+        self.clock = clock
+        self.connection = None
+        self.state = STOPPED
+        self.deferred = {}              # key -> 协程函数，断线期间只保留每个key最新的命令
+        self.disconnected_at = None
+        self.disconnects = 0
+        self.reconnect_attempts = 0
+        self.merged_commands = 0        # 被后来的命令覆盖而未执行的命令数
+        self.recoveries = deque(maxlen=100)   # 每次恢复耗时（秒）
+        self._task = None
+        self._stop = None
+
+    @property
+    def connected(self):
+        return self.state == CONNECTED and self.connection is not None and self.connection.connected
+
+    def start(self, connection):
+        """以已建立的连接开始监护"""
+        self.connection = connection
+        self.state = CONNECTED
+        self._stop = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._stop.set()
+            try:
+                await asyncio.wait_for(self._task, 2.0)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self._task.cancel()
+            self._task = None
+        self.state = STOPPED
+
+    def defer(self, key, command):
+        """连接断开时登记命令（协程函数），同一key只保留最新的一条，重连并校正后执行"""
+        if key in self.deferred:
+            self.merged_commands += 1
+        self.deferred.pop(key, None)
+        self.deferred[key] = command
+
+    def backoff(self, attempt):
+        delay = min(self.initial_backoff * 2 ** attempt, self.max_backoff)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def _wait_disconnected(self):
+        stop = asyncio.ensure_future(self._stop.wait())
+        try:
+            await asyncio.wait([self.connection.dispatcher_task, stop], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stop.cancel()
+
+    async def _run(self):
+        while not self._stop.is_set():
+            if self.connection is not None and self.connection.connected:
+                await self._wait_disconnected()
+                if self._stop.is_set():
+                    break
+            self.state = RECONNECTING
+            self.disconnects += 1
+            self.disconnected_at = self.clock()
+            print("⚠️ OBS连接已断开，开始自动重连...")
+            await self._reconnect()
+
+    async def _reconnect(self):
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.backoff(attempt))
+                return
+            except asyncio.TimeoutError:
+                pass
+            attempt += 1
+            self.reconnect_attempts += 1
+            try:
+                connection = await self.connect()
+            except Exception as e:
+                print(f"❌ 重连OBS出错: {e}")
+                connection = None
+            if connection is None:
+                print(f"🔁 第{attempt}次重连失败，稍后重试")
+                continue
+
+            self.connection = connection
+            self.state = CONNECTED
+            try:
+                if self.resync is not None:
+                    await self.resync()
+                await self._run_deferred()
+            except Exception as e:
+                print(f"❌ 重连后校正OBS状态出错: {e}")
+                if not connection.connected:
+                    self.state = RECONNECTING
+                    continue
+
+            recovered = self.clock() - self.disconnected_at
+            self.recoveries.append(recovered)
+            print(f"✅ OBS连接已恢复，用时{recovered:.1f}秒（尝试{attempt}次）")
+            return
+
+    async def _run_deferred(self):
+        deferred, self.deferred = self.deferred, {}
+        for command in deferred.values():
+            await command()
+
+    def get_stats(self):
+        recoveries = sorted(self.recoveries)
+        return {
+            'state': self.state,
+            'disconnects': self.disconnects,
+            'reconnect_attempts': self.reconnect_attempts,
+            'deferred': len(self.deferred),
+            'merged_commands': self.merged_commands,
+            'recoveries': len(self.recoveries),
+            'last_recovery_seconds': round(self.recoveries[-1], 3) if self.recoveries else None,
+            'recovery_p50_seconds': round(recoveries[len(recoveries) // 2], 3) if recoveries else None,
+            'recovery_max_seconds': round(recoveries[-1], 3) if recoveries else None
+        }
@@ -9,27 +9,191 @@
 4. 实时监控并动态调整
 """
 
+import argparse
 import asyncio
 import websockets
 import json
-import requests
-import time
 import os
+import time
 from datetime import datetime
 import re
 
+from api_recorder import APIRecorder
+from douyin_api_client import AsyncDouyinAPIClient, get_shared_client
+from browser_source_pool import BrowserSourcePool
+from history_log import HistoryLog
+from layout_reconciler import LayoutReconciler
+from leaderboard import Leaderboard
+from metrics import ControllerMetrics
+from obs_command_queue import OBSCommandQueue, PRIORITY_NAMES, PRIORITY_SWITCH
+from obs_connection import OBSConnection, EVENT_GENERAL, EVENT_SCENES, EVENT_INPUTS, EVENT_SCENE_ITEMS
+from obs_scene_graph import OBSSceneGraph
+from obs_supervisor import OBSSupervisor, STATE_NAMES, STOPPED
+from poll_scheduler import PollScheduler
+from prewarm import PrewarmPlanner
+from profiler import CycleProfiler
+from ranking_engine import RankingEngine
+from ranking_subscriber import DEFAULT_SERVICE_URL, RankingSubscriber
+from render_budget import RenderBudgetPolicy
+from room_history import RoomHistory
+from room_poller import AsyncRoomPoller
+from sharded_poller import ShardedRoomPoller
+from terminal_renderer import TerminalRenderer, fit
+import tracing
+
 class DouyinOBSWebSocketController:
     def __init__(self):
         self.api_base_url = "http://localhost:8000/api/douyin/web/fetch_user_live_videos"
         self.obs_host = "192.168.1.102"  # 远程OBS服务器IP
         self.obs_port = 4455               # WebSocket端口
         self.obs_password = ""  # OBS WebSocket密码，如果有的话
+        # 只订阅场景图同步需要的事件，音量表等高频事件不推送，减少带宽和控制循环的解析开销
+        self.obs_event_subscriptions = EVENT_GENERAL | EVENT_SCENES | EVENT_INPUTS | EVENT_SCENE_ITEMS
+        self.obs_ping_interval = 5.0       # WebSocket ping间隔（秒），ping超时即判定断线
+        self.obs_ping_timeout = 5.0
         self.websocket = None
+        self.obs = None  # OBSConnection多路复用器，连接成功后创建
+        # 命令队列：切换 > 显示/隐藏 > 位置 > 创建，未发送的命令按目标合并，每秒最多2000条命令
+        self.obs_queue = OBSCommandQueue(max_rps=2000.0, burst=500, max_batch=50)
+        # 连接监护：断线后指数退避重连，重连后按期望状态校正布局，断线期间的命令合并后执行
+        self.obs_supervisor = OBSSupervisor(self.reconnect_obs, self.resync_obs,
+                                            initial_backoff=0.5, max_backoff=30.0, jitter=0.3)
+        self.desired_layout_state = None  # 最新的期望布局(live_infos, warm_infos)，重连后据此校正
+        # 布局锁：重连后的校正（丢弃本地布局记录再重新应用）完成之前，控制循环的布局调整不能并发执行，
+        # 否则两边都按“源不存在/位置未知”发送命令，重复创建源
+        self.layout_lock = asyncio.Lock()
+        self.clock = time.monotonic  # 排名/调度/预热使用的时钟，回放测试时替换为虚拟时钟
         self.live_urls = []
-        self.current_scene = None
+        self.webcast_ids = None
+        self.scene_graph = OBSSceneGraph()  # OBS场景图本地镜像，由事件保持同步
         self.scene_mapping = {}  # 直播间ID到OBS场景名的映射
+        self.batch_setup = True  # 使用RequestBatch一次性创建场景布局
+        self.master_scene_name = "直播间综合监控"
+        # 浏览器源池：固定数量的浏览器源，进入前N名的直播间只修改URL
+        self.use_source_pool = True
+        self.source_pool_size = 8  # 6个显示位 + 2个备用
+        # 离开画面120秒内的源保持加载（渲染预算不关闭），其间重新进入才算命中；
+        # 时钟每次调用时读取self.clock，回放测试替换时钟后保持加载和淘汰也按虚拟时间判断
+        self.source_pool = BrowserSourcePool(self.source_pool_size, keep_loaded_seconds=120.0,
+                                             clock=lambda: self.clock()) if self.use_source_pool else None
+        # 增量布局协调器：排名变化只移动源，不重建
+        self.layout = LayoutReconciler(self.master_scene_name, self.browser_source_settings,
+                                       max_slots=6, pool=self.source_pool)
+        # 人数历史：每个直播间固定180个样本的环形缓冲区，用于增速、峰值、领先时长和预热趋势
+        self.history = RoomHistory(capacity=180)
+        # 历史日志：每个样本追加写入history_log目录（后台线程批量写入、定期fsync），重启时回放最近6小时
+        self.history_log = HistoryLog('history_log', max_file_bytes=64 * 1024 * 1024,
+                                      flush_interval=1.0, fsync_interval=10.0)
+        self.history_replay_hours = 6.0
+        # 预热：提前加载（隐藏）人数趋势接近进入画面的直播间，使用源池的备用槽位
+        self.prewarm = PrewarmPlanner(max_warm=max(self.source_pool_size - 6, 0) if self.source_pool else 2,
+                                      horizon=30.0, margin=0.1, trend_window=60.0, page_load_seconds=3.0,
+                                      history=self.history)
+        # 渲染预算：第1名满配置，其余可见源降分辨率/帧率，画面外的源关闭
+        self.render_budget = RenderBudgetPolicy(full_width=1080, full_height=1920, full_fps=30,
+                                                reduced_scale=0.5, reduced_fps=15, offscreen_shutdown=True)
+        # 平滑排名：EWMA平滑人数，第1名更换需领先5%并持续20秒，同一直播间60秒内不重复上位
+        self.ranking = RankingEngine(alpha=0.3, margin=0.05, min_dwell=20.0, switch_cooldown=60.0)
+        # 并发轮询配置
+        self.poll_concurrency = 8     # 同时请求的直播间数量上限
+        self.room_timeout = 5.0       # 单个直播间请求超时（秒）
+        self.cycle_timeout = 8.0      # 整轮轮询超时（秒），超时返回部分结果
+        self.http_pool_size = 100     # HTTP连接池总连接数上限
+        self.http_per_host_limit = 20 # 单主机keep-alive连接数上限
+        # 分片默认关闭：8000是按单进程每个请求的CPU开销估算的，尚未在多核机器上实测，开启前请先运行benchmark_leaderboard.py
+        self.poll_workers = 1         # 大于1时按直播间ID分片到多个工作进程轮询（数千个直播间时使用）
+        self.shard_min_rooms = 8000   # 分片的最少直播间数，少于此数（或只有一个CPU核心）时仍在本进程轮询
+        self.api_client = AsyncDouyinAPIClient(self.api_base_url,
+                                               pool_size=self.http_pool_size,
+                                               per_host_limit=self.http_per_host_limit,
+                                               timeout=self.room_timeout)
+        # 设置为文件路径（如"recording.jsonl.gz"，或命令行 --record）时录制上游原始响应，用于离线回放；
+        # 只录制本进程的请求（订阅排名服务期间和分片的工作进程不录制）
+        self.api_recording = None
+        if self.poll_workers > 1:
+            self.poller = ShardedRoomPoller(self.api_base_url, workers=self.poll_workers,
+                                            max_concurrency=self.poll_concurrency,
+                                            room_timeout=self.room_timeout,
+                                            cycle_timeout=self.cycle_timeout,
+                                            pool_size=self.http_pool_size,
+                                            per_host_limit=self.http_per_host_limit,
+                                            min_rooms=self.shard_min_rooms,
+                                            local_client=self.api_client)
+        else:
+            self.poller = AsyncRoomPoller(self.api_client,
+                                          max_concurrency=self.poll_concurrency,
+                                          room_timeout=self.room_timeout,
+                                          cycle_timeout=self.cycle_timeout)
+        # 增量排行榜：结果到达时逐个更新，只对前K名做平滑排名，不再整表排序
+        self.leaderboard = Leaderboard()
+        self.leaderboard_candidates = 50
+        # 自适应轮询：前6名竞争激烈的直播间3秒一次，稳定的10秒，靠后的30秒，未开播/失败的指数退避
+        # 上游每秒请求数上限：默认5次/秒；直播间很多时按每个直播间每30秒一次增加（1000个直播间约33次/秒）
+        self.poll_max_rps = 5.0
+        self.poll_rps_per_room = 1 / 30.0
+        self.scheduler = PollScheduler(fast_interval=3.0, normal_interval=10.0, slow_interval=30.0,
+                                       max_backoff=300.0, top_n=6, contested_margin=0.1,
+                                       max_rps=self.poll_max_rps, rps_per_room=self.poll_rps_per_room)
+        self.min_cycle_interval = 1.0  # 两轮之间最短间隔（秒）
+        # 排名服务（ranking_service.py）运行时只订阅它的推送，不再自己轮询上游API；设置为None时总是自己轮询
+        self.ranking_service_url = DEFAULT_SERVICE_URL
+        self.ranking_subscriber = None
+        self.ranking_subscribed = False   # True时排名来自服务推送，False时本进程轮询（服务未运行或已停止推送）
+        # 连续N轮（每轮最多等cycle_timeout秒）没有收到快照时回到本进程轮询；订阅端在后台重连，服务恢复后自动改回订阅
+        self.ranking_max_missed = 3
+        self.ranking_missed = 0
+        self.ranking_fallbacks = 0
+        # 状态界面差量渲染：只重写变化的行，不再每次清屏
+        self.renderer = TerminalRenderer()
+        # 指标：上游请求耗时/错误、轮询耗时、OBS请求往返、事件循环延迟、第1名更换/抑制，
+        # 以Prometheus文本格式在 http://127.0.0.1:9108/metrics 提供；metrics_port设置为None时不开端口
+        self.metrics = ControllerMetrics()
+        self.metrics_host = "127.0.0.1"
+        self.metrics_port = 9108
+        self.api_client.metrics = self.metrics
+        self.register_metrics()
+        # 分段追踪：设置为目录（如"traces"）时把每轮的上游请求、排名、OBS命令和响应写成Chrome trace JSON，
+        # 人数突变的直播间用关联ID串起整条链路（见tracing.py）
+        self.trace_dir = None
+        self.cycles = 0
+        # 按需性能分析：kill -USR1 <pid> 或 curl -X POST http://127.0.0.1:9108/profile?cycles=10，
+        # 对接下来N轮做cProfile和asyncio任务采样，结果写入profiles目录；未开启时没有开销
+        self.profiler = CycleProfiler('profiles', default_cycles=10, max_seconds=120.0)
+        self.metrics.add_route('GET', '/profile', self.profiler.handle_status)
+        self.metrics.add_route('POST', '/profile', self.profiler.handle_start)
+        self.metrics.add_route('POST', '/profile/stop', self.profiler.handle_stop)
         self.load_live_urls()
     
+    def register_metrics(self):
+        """登记抓取时才读取的指标（直接读取已有统计，控制循环中没有额外开销）"""
+        def ranking_stats():
+            service_stats = self.ranking_subscriber.stats if self.ranking_subscribed else {}
+            return service_stats.get('ranking') or self.ranking.get_stats()
+        
+        self.metrics.watch('douyin_leader_switches_total', '第1名更换次数（made为实际更换，skipped为被滞回抑制）',
+                           lambda: {('made',): ranking_stats()['switches'], ('skipped',): ranking_stats()['suppressed']},
+                           'counter', ('result',))
+        self.metrics.watch('douyin_obs_connected', 'OBS是否已连接（1/0）', lambda: int(self.obs_connected))
+        self.metrics.watch('douyin_obs_disconnects_total', 'OBS断线次数',
+                           lambda: self.obs_supervisor.disconnects, 'counter')
+        self.metrics.watch('douyin_obs_reconnect_attempts_total', 'OBS重连尝试次数',
+                           lambda: self.obs_supervisor.reconnect_attempts, 'counter')
+        self.metrics.watch('douyin_obs_last_recovery_seconds', '最近一次断线到恢复的耗时',
+                           lambda: self.obs_supervisor.get_stats()['last_recovery_seconds'])
+        self.metrics.watch('douyin_obs_queue_depth', 'OBS命令队列中待发送的命令数', lambda: self.obs_queue.depth)
+        self.metrics.watch('douyin_obs_commands_total', 'OBS命令数（sent为已发送，merged为发送前被合并）',
+                           lambda: {('sent',): self.obs_queue.sent, ('merged',): self.obs_queue.merged},
+                           'counter', ('result',))
+    
+    @property
+    def current_scene(self):
+        """当前节目场景（来自OBS场景图镜像）"""
+        return self.scene_graph.current_program_scene
+    
+    @current_scene.setter
+    def current_scene(self, scene_name):
+        self.scene_graph.current_program_scene = scene_name
+    
     def load_live_urls(self):
         """从文件中加载直播间URL"""
         try:
@@ -52,148 +216,117 @@ class DouyinOBSWebSocketController:
     
     def get_live_info(self, webcast_id):
         """获取单个直播间信息（使用最准确的数据源）"""
-        try:
-            url = f"{self.api_base_url}?webcast_id={webcast_id}"
-            response = requests.get(url, timeout=5)
-            
-            if response.status_code == 200:
-                data = response.json()
-                
-                if data['code'] == 200 and data['data']['data']['data']:
-                    live_data = data['data']['data']['data'][0]
-                    user_info = data['data']['data']['user']
-                    
-                    # 获取最精确的在线人数（数据源优先级：stats → room_view_stats → user_count_str）
-                    accurate_count_str = None
-                    
-                    # 1. 优先检查stats对象中的精确人数
-                    if 'stats' in live_data and isinstance(live_data['stats'], dict):
-                        stats_count = live_data['stats'].get('user_count_str')
-                        if stats_count and str(stats_count).strip():
-                            accurate_count_str = str(stats_count).strip()
-                    
-                    # 2. 如果stats中没有，检查room_view_stats
-                    if not accurate_count_str:
-                        if 'room_view_stats' in live_data and isinstance(live_data['room_view_stats'], dict):
-                            room_stats = live_data['room_view_stats']
-                            display_value = room_stats.get('display_value')
-                            if display_value is not None:
-                                accurate_count_str = str(display_value)
-                    
-                    # 3. 最后才使用主字段（可能不准确）
-                    if not accurate_count_str:
-                        accurate_count_str = live_data.get('user_count_str', '0')
-                    
-                    try:
-                        # 处理所有格式的人数字符串，精确到个位显示
-                        if '+' in accurate_count_str:
-                            clean_str = accurate_count_str.replace('+', '')
-                            user_count = int(clean_str)
-                        else:
-                            user_count = int(accurate_count_str)
-                        
-                        user_count_display = f"{user_count}"
-                        
-                    except ValueError:
-                        user_count = 0
-                        user_count_display = "--"
-                    
-                    return {
-                        'success': True,
-                        'webcast_id': webcast_id,
-                        'url': f"https://live.douyin.com/{webcast_id}",
-                        'nickname': user_info['nickname'],
-                        'title': live_data['title'],
-                        'user_count': user_count,
-                        'user_count_display': user_count_display,
-                        'status': live_data['status'],
-                        'room_id': live_data['id_str']
-                    }
-                else:
-                    return {
-                        'success': False,
-                        'webcast_id': webcast_id,
-                        'url': f"https://live.douyin.com/{webcast_id}",
-                        'error': '直播间关闭'
-                    }
-            else:
-                return {
-                    'success': False,
-                    'webcast_id': webcast_id,
-                    'url': f"https://live.douyin.com/{webcast_id}",
-                    'error': f'请求失败({response.status_code})'
-                }
-        except Exception as e:
-            return {
-                'success': False,
-                'webcast_id': webcast_id,
-                'url': f"https://live.douyin.com/{webcast_id}",
-                'error': '连接失败'
-            }
-    
-    async def connect_obs(self):
+        return get_shared_client(self.api_base_url).get_live_info(webcast_id)
+    
+    @property
+    def obs_connected(self):
+        """OBS是否可用（监护启动前直接看连接本身）"""
+        if self.obs_supervisor.state == STOPPED:
+            return self.obs is not None and self.obs.connected
+        return self.obs_supervisor.connected
+    
+    async def connect_obs(self, verbose=True):
         """连接到OBS WebSocket服务器"""
         try:
             uri = f"ws://{self.obs_host}:{self.obs_port}"
             print(f"🔗 正在连接OBS WebSocket: {uri}")
             
-            self.websocket = await websockets.connect(uri)
+            self.websocket = await websockets.connect(uri, ping_interval=self.obs_ping_interval,
+                                                      ping_timeout=self.obs_ping_timeout)
             print("✅ OBS WebSocket连接成功！")
             
-            # 发送认证消息（如果需要）
-            await self.authenticate()
+            # 握手：Hello → Identify（认证、事件订阅掩码）→ Identified
+            self.obs = OBSConnection(self.websocket)
+            self.obs.metrics = self.metrics
+            self.obs_queue.obs = self.obs
+            if not await self.authenticate():
+                print("💡 请检查obs_password是否与OBS中 工具 → WebSocket服务器设置 的密码一致")
+                await self.websocket.close()
+                self.obs = None
+                return False
+            
+            # 启动消息分发协程，之后所有请求都经由它收发
+            self.scene_graph.attach(self.obs)
+            self.obs.start()
+            
+            # 加载场景图镜像，之后名称→ID查询不再访问WebSocket
+            await self.scene_graph.load(self.obs)
+            print(f"📋 已同步OBS场景图: {len(self.scene_graph.scenes)}个场景, {len(self.scene_graph.inputs)}个输入源")
             
             return True
         except Exception as e:
             print(f"❌ OBS WebSocket连接失败: {e}")
+            if not verbose:
+                return False
             print("💡 请确保：")
             print("   1. OBS已启动")
             print("   2. 工具 → WebSocket服务器设置 → 启用WebSocket服务器")
             print("   3. 端口设置为4455（默认）")
             return False
     
+    async def reconnect_obs(self):
+        """断线后重新连接（由OBSSupervisor调用），成功返回新的OBSConnection"""
+        if self.obs is not None:
+            try:
+                await self.obs.close()
+            except Exception:
+                pass
+            self.obs = None
+        return self.obs if await self.connect_obs(verbose=False) else None
+    
+    async def resync_obs(self):
+        """重连后校正：读取各源的实际设置，丢弃过期的本地布局记录，再应用最新的期望布局（持有布局锁）"""
+        async with self.layout_lock:
+            await self._resync_layout()
+
+    async def _resync_layout(self):
+        sources = [source_name for source_name in self.layout.managed_sources(self.scene_graph)
+                   if self.scene_graph.has_input(source_name)]
+        results = await self.obs_queue.call_batch([("GetInputSettings", {"inputName": source_name})
+                                             for source_name in sources])
+        input_settings = {source_name: result["responseData"].get("inputSettings", {})
+                          for source_name, result in zip(sources, results)
+                          if result and result["requestStatus"]["result"]}
+        self.layout.resync(input_settings)
+        self.render_budget.resync(input_settings)
+        if self.desired_layout_state is None:
+            return
+        
+        live_infos, warm_infos = self.desired_layout_state
+        stats = await self.layout.reconcile(self.obs_queue, self.scene_graph, live_infos, warm_infos)
+        self.renderer.note(f"🧩 重连后校正布局: 新建{stats['created']} 换源{stats['retargeted']} 移动{stats['moved']} 显示{stats['shown']} 隐藏{stats['hidden']} 失败{stats['failed']}")
+        await self.apply_render_budget(live_infos)
+    
     async def authenticate(self):
-        """WebSocket认证处理"""
+        """WebSocket握手和认证（OBS WebSocket v5 Identify）"""
         try:
-            # 发送Hello消息
-            hello_request = {
-                "op": 1,
-                "d": {
-                    "rpcVersion": 1
-                }
-            }
-            
-            await self.websocket.send(json.dumps(hello_request))
-            response = await self.websocket.recv()
-            hello_data = json.loads(response)
-            
-            if hello_data.get("op") == 0:  # Hello message received
-                print("✅ WebSocket握手成功")
-                return True
-            else:
-                print(f"❌ WebSocket握手失败: {hello_data}")
-                return False
+            await self.obs.identify(self.obs_password, self.obs_event_subscriptions)
+            auth = "，已通过密码认证" if self.obs.hello.get("authentication") else ""
+            print(f"✅ WebSocket握手成功（RPC版本{self.obs.negotiated_rpc_version}{auth}，"
+                  f"事件订阅掩码0x{self.obs_event_subscriptions:X}）")
+            return True
         except Exception as e:
             print(f"❌ WebSocket认证出错: {e}")
             return False
     
+    async def set_event_subscriptions(self, event_subscriptions):
+        """运行中修改OBS事件订阅掩码（Reidentify）"""
+        try:
+            await self.obs.reidentify(event_subscriptions)
+            self.obs_event_subscriptions = event_subscriptions
+            print(f"✅ 已更新OBS事件订阅掩码: 0x{event_subscriptions:X}")
+            return True
+        except Exception as e:
+            print(f"❌ 更新事件订阅出错: {e}")
+            return False
+    
     async def get_scene_list(self):
         """获取OBS场景列表"""
         try:
-            request = {
-                "op": 6,
-                "d": {
-                    "requestType": "GetSceneList",
-                    "requestId": "get_scenes"
-                }
-            }
-            
-            await self.websocket.send(json.dumps(request))
-            response = await self.websocket.recv()
-            data = json.loads(response)
+            data = await self.obs_queue.call("GetSceneList")
             
-            if data.get("op") == 7 and data["d"]["requestStatus"]["result"]:
-                scenes = data["d"]["responseData"]["scenes"]
+            if data["requestStatus"]["result"]:
+                scenes = data["responseData"]["scenes"]
                 scene_names = [scene["sceneName"] for scene in scenes]
                 print(f"📋 检测到OBS场景: {', '.join(scene_names)}")
                 return scene_names
@@ -206,23 +339,16 @@ class DouyinOBSWebSocketController:
     
     async def switch_scene(self, scene_name):
         """切换到指定场景"""
+        if not self.obs_connected:
+            # 断线期间只保留最后一次切换，重连后执行
+            if 'program_scene' not in self.obs_supervisor.deferred:
+                print(f"⏸️ OBS未连接，重连后切换到场景: {scene_name}")
+            self.obs_supervisor.defer('program_scene', lambda: self.switch_scene(scene_name))
+            return False
         try:
-            request = {
-                "op": 6,
-                "d": {
-                    "requestType": "SetCurrentProgramScene",
-                    "requestId": f"switch_to_{scene_name}",
-                    "requestData": {
-                        "sceneName": scene_name
-                    }
-                }
-            }
-            
-            await self.websocket.send(json.dumps(request))
-            response = await self.websocket.recv()
-            data = json.loads(response)
+            data = await self.obs_queue.call("SetCurrentProgramScene", {"sceneName": scene_name})
             
-            if data.get("op") == 7 and data["d"]["requestStatus"]["result"]:
+            if data["requestStatus"]["result"]:
                 print(f"✅ 已切换到场景: {scene_name}")
                 self.current_scene = scene_name
                 return True
@@ -236,22 +362,9 @@ class DouyinOBSWebSocketController:
     async def create_scene(self, scene_name):
         """创建新场景"""
         try:
-            request = {
-                "op": 6,
-                "d": {
-                    "requestType": "CreateScene",
-                    "requestId": f"create_scene_{int(time.time())}",
-                    "requestData": {
-                        "sceneName": scene_name
-                    }
-                }
-            }
-            
-            await self.websocket.send(json.dumps(request))
-            response = await self.websocket.recv()
-            data = json.loads(response)
+            data = await self.obs_queue.call("CreateScene", {"sceneName": scene_name})
             
-            if data.get("op") == 7 and data["d"]["requestStatus"]["result"]:
+            if data["requestStatus"]["result"]:
                 print(f"✅ 已创建场景: {scene_name}")
                 return True
             else:
@@ -262,39 +375,32 @@ class DouyinOBSWebSocketController:
             print(f"❌ 创建场景出错: {e}")
             return False
     
+    def browser_source_settings(self, url):
+        """浏览器源默认设置"""
+        return {
+            "url": url,
+            "width": 1080,   # 调整宽度为1080
+            "height": 1920,  # 调整高度为1920
+            "fps": 30,
+            "shutdown": False,
+            "restart_when_active": False
+        }
+    
     async def create_browser_source(self, scene_name, source_name, url):
         """在指定场景中创建浏览器源"""
         try:
-            request = {
-                "op": 6,
-                "d": {
-                    "requestType": "CreateInput",
-                    "requestId": f"create_source_{int(time.time())}",
-                    "requestData": {
-                        "sceneName": scene_name,
-                        "inputName": source_name,
-                        "inputKind": "browser_source",
-                        "inputSettings": {
-                            "url": url,
-                            "width": 1080,   # 调整宽度为1080
-                            "height": 1920,  # 调整高度为1920
-                            "fps": 30,
-                            "shutdown": False,
-                            "restart_when_active": False
-                        }
-                    }
-                }
-            }
+            data = await self.obs_queue.call("CreateInput", {
+                "sceneName": scene_name,
+                "inputName": source_name,
+                "inputKind": "browser_source",
+                "inputSettings": self.browser_source_settings(url)
+            })
             
-            await self.websocket.send(json.dumps(request))
-            response = await self.websocket.recv()
-            data = json.loads(response)
-            
-            if data.get("op") == 7 and data["d"]["requestStatus"]["result"]:
+            if data["requestStatus"]["result"]:
                 print(f"✅ 已在场景'{scene_name}'中创建浏览器源: {source_name}")
                 return True
             else:
-                error_msg = data["d"]["requestStatus"].get("comment", "未知错误")
+                error_msg = data["requestStatus"].get("comment", "未知错误")
                 print(f"📝 浏览器源已存在或创建失败: {source_name} - {error_msg}")
                 return False
         except Exception as e:
@@ -310,29 +416,18 @@ class DouyinOBSWebSocketController:
                 print(f"❌ 未找到源: {source_name}")
                 return False
             
-            request = {
-                "op": 6,
-                "d": {
-                    "requestType": "SetSceneItemTransform",
-                    "requestId": f"transform_{int(time.time())}",
-                    "requestData": {
-                        "sceneName": scene_name,
-                        "sceneItemId": scene_item_id,
-                        "sceneItemTransform": {
-                            "positionX": float(x_pos),
-                            "positionY": float(y_pos),
-                            "scaleX": 1.0,
-                            "scaleY": 1.0
-                        }
-                    }
+            data = await self.obs_queue.call("SetSceneItemTransform", {
+                "sceneName": scene_name,
+                "sceneItemId": scene_item_id,
+                "sceneItemTransform": {
+                    "positionX": float(x_pos),
+                    "positionY": float(y_pos),
+                    "scaleX": 1.0,
+                    "scaleY": 1.0
                 }
-            }
-            
-            await self.websocket.send(json.dumps(request))
-            response = await self.websocket.recv()
-            data = json.loads(response)
+            })
             
-            if data.get("op") == 7 and data["d"]["requestStatus"]["result"]:
+            if data["requestStatus"]["result"]:
                 print(f"✅ 已设置源位置: {source_name} -> ({x_pos}, {y_pos})")
                 return True
             else:
@@ -343,89 +438,301 @@ class DouyinOBSWebSocketController:
             return False
     
     async def get_scene_item_id(self, scene_name, source_name):
-        """获取场景项ID"""
+        """获取场景项ID（优先查本地场景图，未命中时才请求OBS）"""
+        scene_item_id = self.scene_graph.get_scene_item_id(scene_name, source_name)
+        if scene_item_id is not None:
+            return scene_item_id
+        
         try:
-            request = {
-                "op": 6,
-                "d": {
-                    "requestType": "GetSceneItemList",
-                    "requestId": f"get_items_{int(time.time())}",
-                    "requestData": {
-                        "sceneName": scene_name
-                    }
-                }
-            }
-            
-            await self.websocket.send(json.dumps(request))
-            response = await self.websocket.recv()
-            data = json.loads(response)
+            data = await self.obs_queue.call("GetSceneItemId", {"sceneName": scene_name, "sourceName": source_name})
             
-            if data.get("op") == 7 and data["d"]["requestStatus"]["result"]:
-                scene_items = data["d"]["responseData"]["sceneItems"]
-                for item in scene_items:
-                    if item["sourceName"] == source_name:
-                        return item["sceneItemId"]
+            if data["requestStatus"]["result"]:
+                scene_item_id = data["responseData"]["sceneItemId"]
+                self.scene_graph.add_item(scene_name, source_name, scene_item_id)
+                return scene_item_id
             return None
         except Exception as e:
             print(f"❌ 获取场景项ID出错: {e}")
             return None
     
-    def get_all_rooms_sorted(self):
-        """获取所有直播间信息并按在线人数降序排序"""
-        live_infos = []
-        
-        for url in self.live_urls:
-            webcast_id = self.extract_webcast_id(url)
-            if webcast_id:
-                info = self.get_live_info(webcast_id)
-                live_infos.append(info)
-        
-        # 按在线人数降序排序
-        live_infos.sort(key=lambda x: x.get('user_count', 0) if x['success'] else -1, reverse=True)
+    def get_webcast_ids(self):
+        """从直播间URL列表中提取webcast_id（结果缓存，直播间列表在启动时加载）"""
+        if self.webcast_ids is None:
+            self.webcast_ids = []
+            for url in self.live_urls:
+                webcast_id = self.extract_webcast_id(url)
+                if webcast_id:
+                    self.webcast_ids.append(webcast_id)
+        return self.webcast_ids
+    
+    async def poll_rooms(self, webcast_ids):
+        """并发轮询指定直播间，合并到缓存后按平滑人数排序（带滞回，避免第1名来回切换）"""
+        tracing.set_correlation(())
+        with tracing.span('poll', '控制循环', rooms=len(webcast_ids)):
+            results = await self.poller.poll(webcast_ids)
+        self.metrics.poll_cycle.observe(self.poller.last_cycle_duration)
+        if self.poller.last_timed_out:
+            self.renderer.note(f"⏱️ 本轮有 {self.poller.last_timed_out} 个直播间超时，使用部分结果")
         
+        with tracing.span('rank', '控制循环') as span:
+            now = self.clock()
+            self.scheduler.record(results, now)
+            self.history.record(results, now)
+            self.history_log.append(results)
+            self.ranking.observe(results)
+            self.leaderboard.update_many(results, self.ranking.smoothed)
+            candidates = self.leaderboard.top(self.leaderboard_candidates)
+            live_infos = self.ranking.rank(candidates + self.leaderboard.failed(self.leaderboard_candidates), now)
+            self.history.note_leader(self.ranking.leader, now)
+            self.scheduler.reschedule(webcast_ids, live_infos, now)
+            # 画面内直播间的人数突变跟随本轮之后的布局调整和OBS命令
+            tracing.set_correlation(tracing.take_spikes(info['webcast_id'] for info in live_infos[:self.layout.max_slots]))
+            span.set(leader=self.ranking.leader)
+        return live_infos
+    
+    async def subscribe_ranking(self):
+        """尝试订阅排名服务，成功后排名来自服务推送；服务未运行时返回False（由本进程轮询，订阅端在后台重连）"""
+        if not self.ranking_service_url:
+            return False
+        self.ranking_subscriber = RankingSubscriber(self.ranking_service_url, self.get_webcast_ids(),
+                                                    reconnect_delay=5.0, clock=self.clock)
+        self.ranking_subscribed = await self.ranking_subscriber.start(timeout=3.0, keep_trying=True)
+        if not self.ranking_subscribed:
+            print(f"⚠️ 排名服务未运行（{self.ranking_service_url}），由本进程直接轮询上游API，服务启动后自动订阅")
+            return False
+        print(f"📡 已订阅排名服务: {self.ranking_service_url}（本进程不再请求上游API）")
+        return True
+    
+    async def next_snapshot(self):
+        """订阅模式下等待下一份快照；连续ranking_max_missed轮没有快照时改为本进程轮询，返回None"""
+        snapshot = await self.ranking_subscriber.next(timeout=self.cycle_timeout)
+        if snapshot is not None:
+            self.ranking_missed = 0
+            return snapshot
+        self.ranking_missed += 1
+        if self.ranking_missed >= self.ranking_max_missed:
+            self.renderer.note(f"⚠️ 连续{self.ranking_missed}轮没有收到排名服务的快照，改由本进程直接轮询上游API")
+            self.ranking_subscribed = False
+            self.ranking_missed = 0
+            self.ranking_fallbacks += 1
+        return None
+    
+    def apply_snapshot(self, snapshot):
+        """使用排名服务的快照：只保留本控制器的直播间，记录人数历史（历史日志由服务写入）"""
+        webcast_ids = set(self.get_webcast_ids())
+        live_infos = [info for info in snapshot['rooms'] if info['webcast_id'] in webcast_ids]
+        with tracing.span('apply_snapshot', '控制循环', seq=snapshot['seq']) as span:
+            # 上游请求在排名服务中，人数突变从收到快照开始追踪
+            for info in live_infos[:self.layout.max_slots]:
+                if info['success']:
+                    span.spike(info['webcast_id'], info['user_count'])
+            now = self.clock()
+            self.history.record(live_infos, now)
+            # 快照的第1名可能不是本控制器的直播间，第1名取本控制器直播间中排名最前的成功结果
+            leader = next((info['webcast_id'] for info in live_infos if info['success']), None)
+            self.history.note_leader(leader, now)
+        tracing.set_correlation(tracing.take_spikes(info['webcast_id'] for info in live_infos[:self.layout.max_slots]))
         return live_infos
     
+    def cycle_wait(self):
+        """距离下一轮的等待时间：订阅模式下由推送驱动，只保留最短间隔"""
+        if self.ranking_subscribed:
+            return self.min_cycle_interval
+        return max(self.scheduler.wait_time(self.clock()), self.min_cycle_interval)
+    
+    async def get_all_rooms_sorted(self):
+        """并发获取所有直播间信息并排序（启动时使用，同时把直播间列表同步到调度器）"""
+        if self.ranking_subscribed:
+            return self.apply_snapshot(await self.ranking_subscriber.next())
+        webcast_ids = self.get_webcast_ids()
+        self.scheduler.sync(webcast_ids, self.clock())
+        return await self.poll_rooms(webcast_ids)
+    
+    async def get_due_rooms_sorted(self):
+        """只轮询调度器中已到期的直播间，其余直播间使用缓存结果；没有到期直播间时返回None"""
+        if self.ranking_subscribed:
+            snapshot = await self.next_snapshot()
+            if snapshot is not None:
+                return self.apply_snapshot(snapshot)
+            if self.ranking_subscribed:
+                return None
+            # 刚回到本进程轮询：调度器在订阅期间没有直播间，先全量轮询一次
+            return await self.get_all_rooms_sorted()
+        if self.ranking_subscriber is not None and self.ranking_subscriber.connected and self.ranking_subscriber.fresh:
+            self.renderer.note("📡 排名服务已恢复，重新订阅推送（本进程不再请求上游API）")
+            self.ranking_subscribed = True
+            return self.apply_snapshot(await self.ranking_subscriber.next())
+        webcast_ids = self.scheduler.due(self.clock())
+        if not webcast_ids:
+            return None
+        return await self.poll_rooms(webcast_ids)
+    
     def clear_screen(self):
         """清屏"""
-        os.system('cls' if os.name == 'nt' else 'clear')
+        self.renderer.clear()
     
     def display_status(self, live_infos, target_scene):
-        """显示当前状态"""
-        self.clear_screen()
-        
-        print("=" * 80)
-        print("🎬 抖音直播间WebSocket自动OBS控制器")
-        print("=" * 80)
-        print(f"📅 更新时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"🔗 OBS连接状态: {'✅ 已连接' if self.websocket else '❌ 未连接'}")
-        print(f"🎯 当前场景: {self.current_scene or '未知'}")
-        print(f"🏆 目标场景: {target_scene or '无'}")
-        print("=" * 80)
+        """显示当前状态（差量渲染，只重写变化的行）"""
+        lines = []
+        lines.append("=" * 80)
+        lines.append("🎬 抖音直播间WebSocket自动OBS控制器")
+        lines.append("=" * 80)
+        lines.append(f"📅 更新时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        supervisor_stats = self.obs_supervisor.get_stats()
+        recovery = f" / 最近恢复{supervisor_stats['last_recovery_seconds']:.1f}s" if supervisor_stats['recoveries'] else ""
+        lines.append(f"🔗 OBS连接状态: {'✅ 已连接' if self.obs_connected else '❌ ' + STATE_NAMES[supervisor_stats['state']]}"
+                     f" / 断线{supervisor_stats['disconnects']}次 / 重连尝试{supervisor_stats['reconnect_attempts']}次{recovery}")
+        lines.append(f"🎯 当前场景: {self.current_scene or '未知'}")
+        lines.append(f"🏆 目标场景: {target_scene or '无'}")
+        queue_stats = self.obs_queue.get_stats()
+        switch_p95 = queue_stats['latency_ms_p95'][PRIORITY_NAMES[PRIORITY_SWITCH]]
+        lines.append(f"📮 OBS命令队列: 待发送{queue_stats['depth']} / 已发送{queue_stats['sent']}条{queue_stats['batches']}批 / 合并{queue_stats['merged']}条"
+                     f"{f' / 切换P95 {switch_p95}ms' if switch_p95 is not None else ''}")
+        service_stats = self.ranking_subscriber.stats if self.ranking_subscribed else {}
+        if self.ranking_subscribed:
+            lines.append(f"📡 排名服务: {'✅ 已订阅' if self.ranking_subscriber.connected else '❌ 重连中'} {self.ranking_service_url}"
+                         f" / 快照#{self.ranking_subscriber.latest['seq']} / 订阅者{service_stats.get('subscribers', 0)}个 / 重连{self.ranking_subscriber.reconnects}次")
+        elif self.ranking_subscriber is not None:
+            lines.append(f"📡 排名服务: ⚠️ 不可用，本进程轮询中（服务恢复后自动订阅） {self.ranking_service_url} / 回退{self.ranking_fallbacks}次")
+        api_stats = service_stats.get('api') or self.poller.get_stats()
+        lines.append(f"🔌 API连接: 请求{api_stats['requests']}次 / 新建连接{api_stats['connections_created']}个 / 复用率{api_stats['reuse_ratio']:.0%}")
+        load = self.render_budget.last_load
+        if load:
+            tiers = load['tiers']
+            lines.append(f"🖥️ 渲染负载: 约{load['mpix_per_sec']}MP/s / 全量{load['baseline_mpix_per_sec']}MP/s（满配{tiers['leader']} 降配{tiers['visible']} 预热{tiers['warm']} 保留{tiers['cached']} 画面外{tiers['offscreen']}）")
+        ranking_stats = service_stats.get('ranking') or self.ranking.get_stats()
+        lines.append(f"🧮 排名引擎: 更换第1名{ranking_stats['switches']}次 / 抑制{ranking_stats['suppressed']}次（原始排序会更换{ranking_stats['raw_switches']}次）")
+        lines.append(f"📈 人数历史: {len(self.history.ids)}个直播间 × {self.history.capacity}个样本 / {self.history.nbytes / 1024:.0f}KB")
+        log_stats = self.history_log.get_stats()
+        lines.append(f"💾 历史日志: 已写入{log_stats['records_written']}条 / {log_stats['current_file'] or '无'} {log_stats['current_file_bytes'] / 1024 / 1024:.1f}MB / 写入耗时{log_stats['last_write_ms']}ms")
+        poll_stats = service_stats.get('scheduler') or self.scheduler.get_stats()
+        lines.append(f"⏲️ 轮询调度: {poll_stats['rooms']}个直播间 / 快速{poll_stats['fast']} 慢速{poll_stats['slow']} 退避{poll_stats['backoff']} / {poll_stats['rps']}次/秒（上限{poll_stats['max_rps']}）")
+        prewarm_stats = self.prewarm.get_stats()
+        lines.append(f"🔥 预热: {prewarm_stats['warm']}个 / 预热切换{prewarm_stats['warm_switches']}次 / 冷切换{prewarm_stats['cold_switches']}次 / 显示确认P50 {prewarm_stats['show_ack_p50']}s P95 {prewarm_stats['show_ack_p95']}s / 估算首帧P50 {prewarm_stats['estimated_first_frame_p50']}s P95 {prewarm_stats['estimated_first_frame_p95']}s")
+        if self.source_pool is not None:
+            pool_stats = self.source_pool.get_stats()
+            lines.append(f"♻️ 浏览器源池: 使用{pool_stats['in_use']}/{pool_stats['size']} / 命中{pool_stats['hits']} / 未命中{pool_stats['misses']}（重新加载{pool_stats['reloads']}） / 淘汰{pool_stats['evictions']}")
+        lines.append("=" * 80)
         
-        print("📊 直播间排序（按在线人数降序）:")
-        print("-" * 80)
+        lines.append("📊 直播间排序（按在线人数降序）:")
+        lines.append("-" * 80)
         
+        self.history.compute(window=60.0, now=self.clock())
         for rank, info in enumerate(live_infos[:10], 1):  # 只显示前10个
             if info['success']:
                 status_icon = "🔴" if info['status'] == 2 else "⚪"
-                print(f"  {rank:2d}. {status_icon} {info['nickname'][:20]:20} - {info['user_count_display']:>6}人")
+                trend = self.history.room_stats(info['webcast_id'])
+                trend_text = ""
+                if trend:
+                    lead_minutes = int(trend['lead_seconds'] // 60)
+                    trend_text = f"  {trend['rate_per_min']:+7.0f}/分  峰值{trend['peak']:>7}  领先{lead_minutes:>4}分钟"
+                lines.append(f"  {rank:2d}. {status_icon} {fit(info['nickname'], 30)} - {info['user_count_display']:>6}人{trend_text}")
             else:
-                print(f"  {rank:2d}. ❌ {info['webcast_id'][:20]:20} - 错误")
+                lines.append(f"  {rank:2d}. ❌ {fit(info['webcast_id'], 30)} - 错误")
         
-        print("-" * 80)
-        print("💡 自动控制说明:")
-        print("   • 每10秒检查一次排序")
-        print("   • 自动切换到人气最高的直播间")
-        print("   • 人数变化时自动调整场景")
-        print("   • 按Ctrl+C停止自动控制")
-        print("=" * 80)
+        lines.append("-" * 80)
+        lines.append("💡 自动控制说明:")
+        lines.append("   • 按竞争程度自适应轮询（3秒/10秒/30秒，未开播退避）")
+        lines.append("   • 自动切换到人气最高的直播间")
+        lines.append("   • 人数变化时自动调整场景")
+        lines.append("   • 按Ctrl+C停止自动控制")
+        lines.append("=" * 80)
+        self.renderer.render(lines)
+    
+    def get_grid_position(self, rank):
+        """计算源的位置（3列网格，每个1080x1920像素，间距20像素）"""
+        return self.layout.grid_position(rank - 1)
     
     async def setup_obs_scenes(self, live_infos):
         """设置OBS场景和浏览器源（在一个场景中创建多个浏览器源）"""
+        start = time.perf_counter()
+        if self.batch_setup or self.source_pool is not None:
+            round_trips = await self.setup_obs_scenes_batch(live_infos)
+            mode = f"批量模式，{round_trips}次往返"
+        else:
+            await self.setup_obs_scenes_sequential(live_infos)
+            mode = "逐个请求模式"
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"⏱️ 场景布局耗时: {elapsed_ms:.1f}ms（{mode}）")
+    
+    async def setup_obs_scenes_batch(self, live_infos):
+        """使用RequestBatch创建场景、浏览器源并设置位置，返回OBS往返次数"""
+        print("🛠️ 正在批量创建统一直播间场景和多个浏览器源...")
+        
+        # 从空布局开始协调：第1批创建场景和缺少的源，第2批设置位置和显示状态
+        self.desired_layout_state = (live_infos, [])
+        try:
+            async with self.layout_lock:
+                stats = await self.layout.reconcile(self.obs_queue, self.scene_graph, live_infos)
+        except Exception as e:
+            print(f"❌ 批量创建浏览器源出错: {e}")
+            return 0
+        
+        for rank, info in enumerate(live_infos[:self.layout.max_slots], 1):
+            if info['success']:
+                row, col, x_pos, y_pos = self.get_grid_position(rank)
+                print(f"   ✅ 源'{self.layout.source_name(info['webcast_id'])}'({info['nickname']}): 第{row+1}行第{col+1}列 {info['url']}")
+                self.scene_mapping[info['webcast_id']] = self.master_scene_name
+        
+        print(f"✅ 统一直播间场景设置完成，新建: {stats['created']}个浏览器源，移动: {stats['moved']}个，失败: {stats['failed']}个")
+        if self.source_pool is not None:
+            print(f"♻️ 浏览器源池: {self.source_pool.size}个源，OBS中Chromium实例数量固定")
+        print(f"📺 主场景: {self.master_scene_name}")
+        print(f"📏 排列方式: 3列网格布局，每个源高度1920x宽度1080像素")
+        
+        return stats['round_trips']
+    
+    async def apply_render_budget(self, live_infos):
+        """按排名调整各浏览器源的分辨率/帧率，并报告估算渲染负载"""
+        if not self.obs_connected:
+            return None
+        try:
+            tiers = self.layout.render_tiers(self.scene_graph, live_infos)
+            load = await self.render_budget.apply(self.obs_queue, tiers)
+        except Exception as e:
+            self.renderer.note(f"❌ 调整渲染预算出错: {e}")
+            return None
+        
+        self.renderer.note(f"🖥️ 渲染负载: 约{load['mpix_per_sec']}MP/s（全量{load['baseline_mpix_per_sec']}MP/s，节省{load['saved_ratio']:.0%}）")
+        return load
+    
+    async def reconcile_layout(self, live_infos):
+        """按最新排名增量调整布局（含预热），只发送变化的部分"""
+        now = self.clock()
+        self.prewarm.observe(live_infos, now)
+        if not self.obs_connected:
+            # 断线期间只更新期望布局，重连后由resync_obs一次性应用最新的一份
+            self.desired_layout_state = (live_infos, [])
+            return None
+        desired_ids = set(self.layout.desired_layout(live_infos))
+        
+        # 本轮新进入画面的直播间即为切换决策（需在重新选择预热对象之前记录）
+        entering = desired_ids - self.layout.visible_ids
+        self.prewarm.note_decisions(entering, now)
+        warm_infos = self.prewarm.candidates(live_infos, desired_ids, now)
+        self.desired_layout_state = (live_infos, warm_infos)
+        
+        try:
+            async with self.layout_lock:
+                stats = await self.layout.reconcile(self.obs_queue, self.scene_graph, live_infos, warm_infos)
+        except Exception as e:
+            self.renderer.note(f"❌ 调整布局出错: {e}")
+            return None
+        
+        self.prewarm.note_visible(entering & self.layout.visible_ids, self.clock())
+        if warm_infos:
+            self.renderer.note(f"🔥 预热中: {', '.join(info['nickname'] for info in warm_infos)}")
+        
+        if stats['round_trips']:
+            self.renderer.note(f"🧩 布局调整: 新建{stats['created']} 换源{stats['retargeted']} 移动{stats['moved']} 显示{stats['shown']} 隐藏{stats['hidden']} 失败{stats['failed']}")
+        return stats
+    
+    async def setup_obs_scenes_sequential(self, live_infos):
+        """逐个请求设置OBS场景和浏览器源（兼容模式）"""
         print("🛠️ 正在创建统一直播间场景和多个浏览器源...")
         
         # 创建一个统一的场景来包含所有直播间
-        master_scene_name = "直播间综合监控"
+        master_scene_name = self.master_scene_name
         print(f"   📺 正在创建主场景: {master_scene_name}")
         
         # 先创建主场景
@@ -436,7 +743,7 @@ class DouyinOBSWebSocketController:
         # 在一个场景中为每个直播间创建浏览器源
         for rank, info in enumerate(live_infos[:6], 1):  # 最多6个直播间
             if info['success']:
-                source_name = f"直播{rank}_{info['nickname']}"
+                source_name = self.layout.source_name(info['webcast_id'])
                 url = info['url']
                 
                 print(f"   🌐 正在添加浏览器源: {source_name}")
@@ -449,12 +756,7 @@ class DouyinOBSWebSocketController:
                     await asyncio.sleep(1.0)
                     
                     # 计算源的位置（按网格排列）
-                    # 3列排列，每个1080x1920像素，间距20像素
-                    col = (rank - 1) % 3  # 列索引 (0, 1, 2)
-                    row = (rank - 1) // 3  # 行索引 (0, 1, 2, ...)
-                    
-                    x_pos = 20 + col * (1080 + 20)  # X位置：20, 1120, 2220
-                    y_pos = 20 + row * (1920 + 20)  # Y位置：20, 1960, 3900
+                    row, col, x_pos, y_pos = self.get_grid_position(rank)
                     
                     print(f"   📏 设置位置: 第{row+1}行第{col+1}列 -> ({x_pos}, {y_pos})")
                     
@@ -462,6 +764,7 @@ class DouyinOBSWebSocketController:
                     position_set = await self.set_source_transform(master_scene_name, source_name, x_pos, y_pos)
                     
                     if position_set:
+                        self.layout.record(info['webcast_id'], rank - 1)
                         created_count += 1
                         print(f"   ✅ 源'{source_name}'配置完成: {url}")
                         # 记录映射关系
@@ -479,24 +782,26 @@ class DouyinOBSWebSocketController:
         print(f"✅ 统一直播间场景设置完成，成功创建: {created_count}个浏览器源")
         print(f"📺 主场景: {master_scene_name}")
         print(f"📏 排列方式: 3列网格布局，每个源高度1920x宽度1080像素")
-        
-        # 设置默认圼景为主场景
-        self.current_scene = master_scene_name
     
     async def auto_switch_logic(self):
         """自动切换逻辑（优化为统一场景模式）"""
         while True:
             try:
-                # 获取排序后的直播间信息
-                live_infos = self.get_all_rooms_sorted()
+                # 只轮询到期的直播间，排名基于全部直播间的最新结果
+                cycle_started = time.perf_counter()
+                live_infos = await self.get_due_rooms_sorted()
+                if live_infos is None:
+                    await asyncio.sleep(self.cycle_wait())
+                    continue
                 
                 # 在统一场景模式下，我们不需要切换场景
                 # 只需要确保当前场景是主场景
-                master_scene_name = "直播间综合监控"
+                master_scene_name = self.master_scene_name
                 
                 if self.current_scene != master_scene_name:
-                    print(f"🔄 切换到主监控场景: {master_scene_name}")
-                    await self.switch_scene(master_scene_name)
+                    self.renderer.note(f"🔄 切换到主监控场景: {master_scene_name}")
+                    with tracing.span('switch_scene', '控制循环', scene=master_scene_name):
+                        await self.switch_scene(master_scene_name)
                 else:
                     # 找到人气最高的直播间
                     top_room = None
@@ -506,15 +811,30 @@ class DouyinOBSWebSocketController:
                             break
                     
                     if top_room:
-                        print(f"🏆 当前最高人气: {top_room['nickname']} ({top_room['user_count_display']}人)")
+                        self.renderer.note(f"🏆 当前最高人气: {top_room['nickname']} ({top_room['user_count_display']}人)")
                     else:
-                        print(f"⚠️ 未找到正在直播的房间")
+                        self.renderer.note(f"⚠️ 未找到正在直播的房间")
+                
+                # 按最新排名增量调整网格布局（只移动排名变化的源）
+                with tracing.span('reconcile_layout', '控制循环'):
+                    await self.reconcile_layout(live_infos)
+                
+                # 按排名分配渲染预算
+                with tracing.span('render_budget', '控制循环'):
+                    await self.apply_render_budget(live_infos)
                 
                 # 显示状态
-                self.display_status(live_infos, master_scene_name)
+                with tracing.span('display_status', '控制循环'):
+                    self.display_status(live_infos, master_scene_name)
+                self.cycles += 1
+                self.metrics.control_cycle.observe(time.perf_counter() - cycle_started)
+                tracing.record('control_cycle', '控制循环', cycle_started, cycle=self.cycles)
+                tracing.flush()
+                if self.profiler.active:
+                    self.profiler.cycle_done()
                 
-                # 等待10秒后再次检查
-                await asyncio.sleep(10)
+                # 等待下一个直播间到期
+                await asyncio.sleep(self.cycle_wait())
                 
             except Exception as e:
                 print(f"❌ 自动切换逻辑出错: {e}")
@@ -533,32 +853,86 @@ class DouyinOBSWebSocketController:
         print("   • 自动切换到最高人气场景")
         print("   • 实时监控动态调整")
         
+        # 从历史日志恢复最近的人数历史
+        try:
+            restored = self.history_log.replay_into(self.history, self.history_replay_hours)
+            if restored:
+                print(f"📼 已从历史日志恢复 {restored} 个样本（最近{self.history_replay_hours:g}小时）")
+        except Exception as e:
+            print(f"⚠️ 恢复历史日志失败: {e}")
+        
+        # 排名服务运行时只订阅推送
+        await self.subscribe_ranking()
+        
+        # 录制上游原始响应
+        if self.api_recording and self.api_client.recorder is None:
+            self.api_client.recorder = APIRecorder(self.api_recording)
+            print(f"⏺️ 正在录制上游API响应: {self.api_recording}（可用 api_recorder.py replay 回放）")
+        
+        # 分段追踪
+        if self.trace_dir:
+            tracing.install(tracing.Tracer(self.trace_dir))
+            print(f"🧵 分段追踪已启用: {self.trace_dir}/trace-*.json（可用 https://ui.perfetto.dev 打开）")
+        
+        # 指标端点
+        try:
+            metrics_url = await self.metrics.start(self.metrics_host, self.metrics_port)
+            if metrics_url:
+                print(f"📊 指标端点: {metrics_url}（性能分析: POST /profile?cycles=N）")
+        except OSError as e:
+            print(f"⚠️ 指标端点启动失败: {e}")
+        if self.profiler.install_signal():
+            print(f"🔬 性能分析: kill -USR1 {os.getpid()} 开始/结束")
+        
         # 连接OBS
         if not await self.connect_obs():
             return
         
         try:
             # 获取初始排序
-            live_infos = self.get_all_rooms_sorted()
+            live_infos = await self.get_all_rooms_sorted()
             
             # 设置OBS场景
             await self.setup_obs_scenes(live_infos)
             
-            # 启动自动切换逻辑
-            await self.auto_switch_logic()
+            # 之后断线自动重连
+            self.obs_supervisor.start(self.obs)
+            
+            # 启动自动切换逻辑（每轮的状态消息显示在画面下方，其他输出会让下一帧整屏覆盖）
+            with self.renderer.watch_stdout():
+                await self.auto_switch_logic()
             
         except KeyboardInterrupt:
             print(f"\n\n👋 WebSocket自动控制已停止，感谢使用！")
         except Exception as e:
             print(f"\n❌ 程序运行出错: {e}")
         finally:
-            if self.websocket:
+            await self.obs_supervisor.stop()
+            await self.obs_queue.close()
+            if self.ranking_subscriber is not None:
+                await self.ranking_subscriber.close()
+            await self.poller.close()
+            await self.metrics.stop()
+            self.profiler.stop()
+            await self.profiler.flush()
+            self.profiler.remove_signal()
+            if tracing.active() is not None:
+                tracing.uninstall()
+            self.history_log.close()
+            if self.api_client.recorder is not None:
+                self.api_client.recorder.close()
+            if self.obs:
+                await self.obs.close()
+                print("🔗 OBS WebSocket连接已关闭")
+            elif self.websocket:
                 await self.websocket.close()
                 print("🔗 OBS WebSocket连接已关闭")
 
-async def main():
+async def main(args):
     """主函数"""
     controller = DouyinOBSWebSocketController()
+    if args.record:
+        controller.api_recording = args.record
     await controller.run()
 
 if __name__ == "__main__":
@@ -570,4 +944,7 @@ if __name__ == "__main__":
         print("📦 请运行: pip install websockets")
         exit(1)
     
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='抖音直播间WebSocket自动OBS控制器')
+    parser.add_argument('--record', metavar='PATH',
+                        help='运行时把上游API原始响应录制到gzip压缩的JSONL文件（用于api_recorder.py replay和benchmark_control_loop.py）')
+    asyncio.run(main(parser.parse_args()))
\ No newline at end of file
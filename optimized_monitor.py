@@ -5,105 +5,85 @@
 专门优化表格显示效果，确保所有内容完美对齐
 """
 
-import requests
 import time
-import os
 from datetime import datetime
 
+import requests
+
+from douyin_api_client import get_shared_client
+from poll_scheduler import PollScheduler
+from ranking_subscriber import DEFAULT_SERVICE_URL, iter_snapshots
+from terminal_renderer import TerminalRenderer, fit
+
 class OptimizedDouyinMonitor:
     def __init__(self):
         self.api_base_url = "http://localhost:8000/api/douyin/web/fetch_user_live_videos"
         self.webcast_ids = ['27356915698', '847308587035', '858106419879']
+        self.api_client = get_shared_client(self.api_base_url, per_host_limit=4)
+        # 排名服务（ranking_service.py）运行时只订阅推送，不再请求上游API；设置为None时总是自己轮询
+        self.ranking_service_url = DEFAULT_SERVICE_URL
+        # 竞争激烈的直播间快速刷新，未开播/失败的直播间指数退避
+        self.scheduler = PollScheduler(fast_interval=2.0, normal_interval=5.0, slow_interval=30.0, max_rps=4.0)
+        # 差量渲染：只重写变化的行，不再每次清屏
+        self.renderer = TerminalRenderer()
     
     def clear_screen(self):
-        os.system('cls' if os.name == 'nt' else 'clear')
+        self.renderer.clear()
     
     def get_live_info(self, webcast_id):
-        try:
-            url = f"{self.api_base_url}?webcast_id={webcast_id}"
-            response = requests.get(url, timeout=5)
+        return self.api_client.get_live_info(webcast_id)
+    
+    def render(self, live_infos):
+        """刷新表格（只重写变化的行，昵称按显示宽度对齐）"""
+        lines = [
+            "🎬 抖音直播间优化监控 - 完美对齐版",
+            f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            "-" * 80
+        ]
+        
+        for i, info in enumerate(live_infos, 1):
+            if info['success']:
+                status_map = {2: "🔴直播中", 4: "🟡回放", 0: "⚪未播"}
+                status = status_map.get(info['status'], "❓未知")
+                lines.append(f"{i:2d}. {fit(status, 8)} {fit(info['nickname'], 30)} - {info['user_count_display']:>6}人")
+            else:
+                lines.append(f"{i:2d}. {fit('❌错误', 8)} {fit(info['webcast_id'], 30)} - --")
+        self.renderer.render(lines)
+    
+    def run_subscribed(self):
+        """订阅排名服务的推送，只显示本工具的直播间；服务未运行时抛出requests.RequestException"""
+        wanted = set(self.webcast_ids)
+        for snapshot in iter_snapshots(self.ranking_service_url, self.webcast_ids):
+            self.render([info for info in snapshot['rooms'] if info['webcast_id'] in wanted])
+    
+    def run_local(self):
+        """本进程直接轮询上游API"""
+        while True:
+            self.scheduler.sync(self.webcast_ids)
+            due_ids = self.scheduler.due()
+            if not due_ids:
+                time.sleep(max(self.scheduler.wait_time(), 0.5))
+                continue
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                if data['code'] == 200 and data['data']['data']['data']:
-                    live_data = data['data']['data']['data'][0]
-                    user_info = data['data']['data']['user']
-                    
-                    # 获取最精确的在线人数
-                    accurate_count_str = None
-                    
-                    # stats字段优先
-                    if 'stats' in live_data and isinstance(live_data['stats'], dict):
-                        stats_count = live_data['stats'].get('user_count_str')
-                        if stats_count and stats_count.strip():
-                            accurate_count_str = str(stats_count).strip()
-                    
-                    # room_view_stats备用
-                    if not accurate_count_str and 'room_view_stats' in live_data:
-                        if isinstance(live_data['room_view_stats'], dict):
-                            display_value = live_data['room_view_stats'].get('display_value')
-                            if display_value is not None:
-                                accurate_count_str = str(display_value)
-                    
-                    # 主字段最后
-                    if not accurate_count_str:
-                        accurate_count_str = live_data.get('user_count_str', '0')
-                    
-                    try:
-                        if '+' in accurate_count_str:
-                            clean_str = accurate_count_str.replace('+', '')
-                            user_count = int(clean_str)
-                            user_count_display = f"{user_count}"
-                        else:
-                            user_count = int(accurate_count_str)
-                            user_count_display = f"{user_count}"
-                    except ValueError:
-                        user_count = 0
-                        user_count_display = "--"
-                    
-                    return {
-                        'success': True,
-                        'webcast_id': webcast_id,
-                        'nickname': user_info['nickname'],
-                        'title': live_data['title'],
-                        'user_count': user_count,
-                        'user_count_display': user_count_display,
-                        'status': live_data['status']
-                    }
+            self.scheduler.record([self.get_live_info(webcast_id) for webcast_id in due_ids])
+            live_infos = self.scheduler.snapshot()
+            live_infos.sort(key=lambda x: x.get('user_count', 0) if x['success'] else -1, reverse=True)
+            self.scheduler.reschedule(due_ids, live_infos)
             
-            return {'success': False, 'webcast_id': webcast_id, 'error': '直播间关闭'}
-        except Exception as e:
-            return {'success': False, 'webcast_id': webcast_id, 'error': '连接失败'}
+            self.render(live_infos)
+            time.sleep(max(self.scheduler.wait_time(), 0.5))
     
     def run(self):
         print("🚀 启动抖音直播间优化监控...")
         
         try:
-            while True:
-                live_infos = []
-                
-                for webcast_id in self.webcast_ids:
-                    info = self.get_live_info(webcast_id)
-                    live_infos.append(info)
-                
-                live_infos.sort(key=lambda x: x.get('user_count', 0) if x['success'] else -1, reverse=True)
-                
-                self.clear_screen()
-                print("🎬 抖音直播间优化监控 - 完美对齐版")
-                print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-                print("-" * 80)
-                
-                for i, info in enumerate(live_infos, 1):
-                    if info['success']:
-                        status_map = {2: "🔴直播中", 4: "🟡回放", 0: "⚪未播"}
-                        status = status_map.get(info['status'], "❓未知")
-                        print(f"{i:2d}. {status} {info['nickname'][:15]:15} - {info['user_count_display']:>6}人")
-                    else:
-                        print(f"{i:2d}. ❌错误 {info['webcast_id'][:15]:15} - --")
-                
-                time.sleep(5)
-                
+            if self.ranking_service_url:
+                try:
+                    self.run_subscribed()
+                except requests.RequestException as e:
+                    print(f"⚠️ 排名服务不可用（{e.__class__.__name__}），由本进程直接轮询上游API")
+            self.run_local()
+            
         except KeyboardInterrupt:
             print("\n👋 监控已停止")
 
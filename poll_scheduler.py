@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自适应直播间轮询调度
+功能：
+1. 按每个直播间的下次到期时间维护优先队列（最小堆），每次只轮询到期的直播间
+2. 前N名中人数接近、名次可能变化的直播间快速轮询，稳定或排名靠后的直播间慢速轮询
+3. 未开播、直播间关闭或请求失败的直播间按指数退避降低轮询频率
+4. 全局令牌桶限制每秒请求数，同样的上游限额下可以监控更多直播间；
+   设置rps_per_room时上限随直播间数增加，直播间很多时每个直播间仍能按slow_interval左右的间隔刷新
+5. 缓存每个直播间最近一次结果，排名基于缓存进行
+"""
+
+import heapq
+import random
+import time
+
+
+class PollScheduler:
+    """按热度为每个直播间安排下次轮询时间"""
+
+    def __init__(self, fast_interval=3.0, normal_interval=10.0, slow_interval=30.0, max_backoff=300.0,
+                 top_n=6, contested_margin=0.1, max_rps=5.0, burst=None, jitter=0.1, rps_per_room=0.0):
+        self.fast_interval = fast_interval        # 前N名中竞争激烈的直播间
+        self.normal_interval = normal_interval    # 前N名中稳定的直播间、或接近进入前N名的直播间
+        self.slow_interval = slow_interval        # 排名靠后的直播间，也是退避的起点
+        self.max_backoff = max_backoff            # 未开播/失败直播间的最长轮询间隔
+        self.top_n = top_n
+        self.contested_margin = contested_margin  # 与相邻名次人数相差不超过该比例视为竞争激烈
+        self.max_rps = max_rps                    # 全局每秒请求数上限（直播间少时）
+        self.rps_per_room = rps_per_room          # 每个直播间增加的每秒请求数，上限取max(max_rps, 直播间数 × 该值)
+        self._burst = burst                       # None时等于当前上限
+        self.jitter = jitter                      # 间隔随机抖动比例，避免所有直播间同时到期
+        self.latest = {}      # webcast_id -> 最近一次结果
+        self.due_at = {}      # webcast_id -> 下次到期时间
+        self.intervals = {}   # webcast_id -> 当前轮询间隔
+        self.failures = {}    # webcast_id -> 连续未开播/失败次数
+        self._heap = []       # (到期时间, 序号, webcast_id)，过期条目惰性删除
+        self._seq = 0
+        self.tokens = self.burst
+        self._refilled_at = None  # 首次取到期直播间时按调用方的时钟初始化
+        self._started_at = time.monotonic()
+        self.polls = 0
+        self.throttled = 0    # 有到期直播间但令牌不足而推迟的次数
+
+    @property
+    def rate(self):
+        """当前的每秒请求数上限"""
+        return max(self.max_rps, self.rps_per_room * len(self.due_at))
+
+    @property
+    def burst(self):
+        return self._burst if self._burst is not None else max(self.rate, 1.0)
+
+    def _push(self, webcast_id, due):
+        self.due_at[webcast_id] = due
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, webcast_id))
+
+    def _peek(self):
+        """丢弃过期条目，返回堆顶的有效条目"""
+        while self._heap:
+            due, seq, webcast_id = self._heap[0]
+            if self.due_at.get(webcast_id) == due:
+                return self._heap[0]
+            heapq.heappop(self._heap)
+        return None
+
+    def _refill(self, now):
+        if self._refilled_at is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def sync(self, webcast_ids, now=None):
+        """同步需要监控的直播间：新直播间立即到期，移除的直播间丢弃状态"""
+        now = time.monotonic() if now is None else now
+        wanted = set(webcast_ids)
+        for webcast_id in webcast_ids:
+            if webcast_id not in self.due_at:
+                self._push(webcast_id, now)
+        for webcast_id in list(self.due_at):
+            if webcast_id not in wanted:
+                for state in (self.due_at, self.latest, self.intervals, self.failures):
+                    state.pop(webcast_id, None)
+
+    def due(self, now=None):
+        """取出已到期且令牌允许的直播间（按到期先后）"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        webcast_ids = []
+        while True:
+            entry = self._peek()
+            if entry is None or entry[0] > now:
+                break
+            if self.tokens < 1:
+                self.throttled += 1
+                break
+            heapq.heappop(self._heap)
+            self.tokens -= 1
+            webcast_ids.append(entry[2])
+            # 请求失败或未回报时按普通间隔兜底，reschedule会覆盖
+            self._push(entry[2], now + self.normal_interval)
+        self.polls += len(webcast_ids)
+        return webcast_ids
+
+    def wait_time(self, now=None):
+        """距离下一个直播间可轮询的秒数"""
+        now = time.monotonic() if now is None else now
+        entry = self._peek()
+        if entry is None:
+            return self.normal_interval
+        wait = max(entry[0] - now, 0.0)
+        if self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def record(self, live_infos, now=None):
+        """缓存本次轮询结果，并标记轮询时间"""
+        now = time.monotonic() if now is None else now
+        for info in live_infos:
+            if info['webcast_id'] in self.due_at:
+                info['polled_at'] = now
+                self.latest[info['webcast_id']] = info
+
+    def snapshot(self):
+        """所有直播间最近一次的结果（尚未轮询过的直播间不包含在内）"""
+        return list(self.latest.values())
+
+    def _count(self, info):
+        return info.get('smoothed_count', info['user_count'])
+
+    def _close(self, a, b):
+        high = max(a, b)
+        return high > 0 and abs(a - b) / high <= self.contested_margin
+
+    def interval_for(self, webcast_id, live_ranked, rank_index):
+        """根据最近结果和排名计算轮询间隔，live_ranked为按排名排列的直播中结果"""
+        info = self.latest.get(webcast_id)
+        if info is None or not info['success'] or info.get('status') != 2:
+            failures = self.failures.get(webcast_id, 0) + 1
+            self.failures[webcast_id] = failures
+            return min(self.slow_interval * 2 ** (failures - 1), self.max_backoff)
+
+        self.failures.pop(webcast_id, None)
+        rank = rank_index.get(webcast_id)
+        if rank is None:
+            # 不在排名候选中（只对前K名排名时）视为排名靠后
+            return self.slow_interval
+        count = self._count(live_ranked[rank])
+        neighbours = [live_ranked[index] for index in (rank - 1, rank + 1) if 0 <= index < len(live_ranked)]
+        contested = any(self._close(count, self._count(item)) for item in neighbours)
+        if rank < self.top_n:
+            return self.fast_interval if contested else self.normal_interval
+        # 前N名之外：与第N名接近时普通间隔，否则慢速
+        if len(live_ranked) >= self.top_n and self._close(count, self._count(live_ranked[self.top_n - 1])):
+            return self.normal_interval
+        return self.slow_interval
+
+    def reschedule(self, webcast_ids, ranked, now=None):
+        """为刚轮询过的直播间安排下次到期时间，ranked为排名后的全部结果"""
+        now = time.monotonic() if now is None else now
+        live_ranked = [info for info in ranked if info['success'] and info.get('status') == 2]
+        rank_index = {info['webcast_id']: index for index, info in enumerate(live_ranked)}
+        for webcast_id in webcast_ids:
+            if webcast_id not in self.due_at:
+                continue
+            interval = self.interval_for(webcast_id, live_ranked, rank_index)
+            self.intervals[webcast_id] = interval
+            self._push(webcast_id, now + interval * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def get_stats(self):
+        elapsed = time.monotonic() - self._started_at
+        healthy = [interval for webcast_id, interval in self.intervals.items() if webcast_id not in self.failures]
+        return {
+            'rooms': len(self.due_at),
+            'fast': sum(1 for interval in healthy if interval <= self.fast_interval),
+            'slow': sum(1 for interval in healthy if interval >= self.slow_interval),
+            'backoff': len(self.failures),
+            'polls': self.polls,
+            'throttled': self.throttled,
+            'rps': round(self.polls / elapsed, 2) if elapsed > 0 else 0.0,
+            'max_rps': round(self.rate, 2)
+        }
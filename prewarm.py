@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预热即将进入画面的直播间
+功能：
+1. 根据人数历史（RoomHistory）中最近的趋势，预测画面外直播间在horizon秒后的人数
+2. 预测人数接近进入画面（以及第1名）的直播间，提前加载浏览器源但保持隐藏
+3. 统计从切换决策到OBS确认显示的时间（实测），以及到首帧可见的估算时间
+
+首帧时间是估算值，不是测量值：OBS不会通知浏览器页面何时加载完成，因此按
+估算首帧 = max(OBS确认显示的时间, 开始加载页面的时间 + page_load_seconds) 计算。
+预热过的直播间开始加载时间为预热时间，未预热的为切换决策时间。
+"""
+
+import time
+from collections import deque
+
+from room_history import RoomHistory
+
+
+class PrewarmPlanner:
+    """选择需要预热的直播间，并记录切换到显示确认的耗时和估算的首帧耗时"""
+
+    def __init__(self, max_warm=2, horizon=30.0, margin=0.1, trend_window=60.0, page_load_seconds=3.0,
+                 history=None):
+        self.max_warm = max_warm
+        self.horizon = horizon                      # 预测多少秒之后的人数
+        self.margin = margin                        # 预测人数达到门槛的(1 - margin)即预热
+        self.trend_window = trend_window            # 用最近多少秒的样本计算趋势
+        self.page_load_seconds = page_load_seconds  # 浏览器源加载页面的估计耗时
+        self.history = history if history is not None else RoomHistory()  # 可与控制器共享
+        self.warm_since = {}    # webcast_id -> 开始预热的时间
+        self.pending = {}       # webcast_id -> (决策时间, 开始加载时间)
+        self.show_latencies = deque(maxlen=200)      # 决策到OBS确认显示（实测）
+        self.estimated_latencies = deque(maxlen=200)  # 决策到首帧可见（估算）
+        self.warm_switches = 0
+        self.cold_switches = 0
+
+    def observe(self, live_infos, now=None):
+        """记录本轮人数（与共享的历史重复记录时会自动跳过）"""
+        self.history.record(live_infos, now)
+
+    def predict(self, webcast_id, horizon=None, now=None):
+        """按最近趋势预测horizon秒后的人数"""
+        predicted = self.history.predict_all(self.horizon if horizon is None else horizon,
+                                             self.trend_window, now)
+        return predicted.get(webcast_id, 0.0)
+
+    def candidates(self, live_infos, visible_ids, now=None):
+        """选出需要预热的画面外直播间（按预测人数与第1名的差距排序）"""
+        now = time.monotonic() if now is None else now
+        live = [info for info in live_infos if info['success']]
+        visible = [info for info in live if info['webcast_id'] in visible_ids]
+        if not visible:
+            return []
+
+        leader_count = visible[0]['user_count']
+        entry_count = min(info['user_count'] for info in visible)
+        threshold = entry_count * (1 - self.margin)
+
+        predictions = self.history.predict_all(self.horizon, self.trend_window, now)
+        scored = []
+        for info in live:
+            if info['webcast_id'] in visible_ids or info.get('status') != 2:
+                continue
+            predicted = predictions.get(info['webcast_id'], 0.0)
+            if predicted >= threshold:
+                scored.append((leader_count - predicted, info))
+
+        scored.sort(key=lambda item: item[0])
+        warm = [info for gap, info in scored[:self.max_warm]]
+
+        warm_ids = {info['webcast_id'] for info in warm}
+        for webcast_id in list(self.warm_since):
+            if webcast_id not in warm_ids:
+                del self.warm_since[webcast_id]
+        for webcast_id in warm_ids:
+            self.warm_since.setdefault(webcast_id, now)
+        return warm
+
+    def note_decisions(self, entering_ids, now=None):
+        """记录切换决策：这些直播间本轮进入画面"""
+        now = time.monotonic() if now is None else now
+        for webcast_id in entering_ids:
+            warm_started = self.warm_since.pop(webcast_id, None)
+            if warm_started is not None:
+                self.warm_switches += 1
+                self.pending[webcast_id] = (now, warm_started)
+            else:
+                self.cold_switches += 1
+                self.pending[webcast_id] = (now, now)
+
+    def note_visible(self, webcast_ids, now=None):
+        """OBS确认显示后，记录决策到显示确认的时间，并估算决策到首帧可见的时间"""
+        now = time.monotonic() if now is None else now
+        for webcast_id in webcast_ids:
+            pending = self.pending.pop(webcast_id, None)
+            if pending is None:
+                continue
+            decided_at, load_started = pending
+            self.show_latencies.append(now - decided_at)
+            estimated_first_frame = max(now, load_started + self.page_load_seconds)
+            self.estimated_latencies.append(estimated_first_frame - decided_at)
+
+    @staticmethod
+    def _percentile(latencies, p):
+        if not latencies:
+            return 0.0
+        return round(latencies[min(int(p * len(latencies)), len(latencies) - 1)], 3)
+
+    def get_stats(self):
+        shown = sorted(self.show_latencies)
+        estimated = sorted(self.estimated_latencies)
+        return {
+            'warm': len(self.warm_since),
+            'warm_switches': self.warm_switches,
+            'cold_switches': self.cold_switches,
+            'show_ack_p50': self._percentile(shown, 0.5),
+            'show_ack_p95': self._percentile(shown, 0.95),
+            'estimated_first_frame_p50': self._percentile(estimated, 0.5),
+            'estimated_first_frame_p95': self._percentile(estimated, 0.95),
+            'estimated_first_frame_max': round(estimated[-1], 3) if estimated else 0.0
+        }
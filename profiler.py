@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行中控制器的按需性能分析
+功能：
+1. 收到SIGUSR1或本地HTTP命令（POST /profile?cycles=N）后，对接下来N轮控制循环开启cProfile，
+   不需要停掉控制器再用profiler重新运行（那样会丢失要分析的现场状态）
+2. 分析期间定时采样asyncio任务：每个任务停在哪个await、等待的是什么、在同一位置已经等了多久
+3. 结束后写入带时间戳的文件：profiles/profile-YYYYmmdd-HHMMSS-mmm.txt（任务快照 + 按累计/自身耗时排序的统计），
+   以及同名.prof（pstats格式，可用snakeviz等工具打开）；同一毫秒内的报告加序号，不会互相覆盖；
+   统计排序和写文件在线程池中进行，不阻塞事件循环
+4. 再次发送SIGUSR1或POST /profile/stop提前结束；控制循环卡住不再结束时，超过max_seconds自动结束
+5. 未开启时不安装任何钩子，控制循环每轮只多一次属性判断
+"""
+
+import asyncio
+import cProfile
+import io
+import os
+import pstats
+import signal
+import time
+from datetime import datetime
+
+from aiohttp import web
+
+
+def _await_chain(coro):
+    """沿cr_await从外到内取出协程调用链，返回(各层函数名, 最内层的帧)"""
+    names, frame = [], None
+    while coro is not None:
+        inner = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+        if inner is None:
+            break
+        frame = inner
+        names.append(frame.f_code.co_name)
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+    return names, frame
+
+
+class CycleProfiler:
+    """对接下来N轮控制循环做cProfile和asyncio任务采样"""
+
+    def __init__(self, directory='profiles', default_cycles=10, max_seconds=120.0, sample_interval=0.1):
+        self.directory = directory
+        self.default_cycles = default_cycles
+        self.max_seconds = max_seconds          # 控制循环卡住时最长分析时间
+        self.sample_interval = sample_interval  # 任务采样间隔（秒）
+        self.active = False
+        self.remaining = 0
+        self.cycles = 0
+        self.started_at = None
+        self.profile = None
+        self.first_seen = {}        # (任务, 调用链, 位置) -> 首次采样到的时间
+        self.initial_tasks = None
+        self._sampler = None
+        self.last_report = None
+        self.reports = 0
+        self._names = set()         # 本进程已使用的报告文件名（不含扩展名）
+        self._writing = set()       # 线程池中进行中的报告写入
+
+    # ---- 开始与结束 ----
+
+    def start(self, cycles=None):
+        """开始分析接下来cycles轮，已在分析时返回False"""
+        if self.active:
+            return False
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:   # 已有其他profiler在运行
+            print(f"⚠️ 无法开启性能分析: {e}")
+            return False
+        self.profile = profile
+        self.active = True
+        self.remaining = cycles or self.default_cycles
+        self.cycles = 0
+        self.started_at = time.monotonic()
+        self.first_seen = {}
+        self.initial_tasks = self.dump_tasks()
+        self._sampler = asyncio.ensure_future(self._sample())
+        print(f"🔬 开始性能分析：接下来{self.remaining}轮控制循环（最长{self.max_seconds:g}秒）")
+        return True
+
+    def cycle_done(self):
+        """每轮控制循环结束时调用（只在active时）"""
+        self.cycles += 1
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.stop()
+
+    def stop(self):
+        """结束分析，返回报告路径
+
+        报告在线程池中写入（没有运行中的事件循环时直接写入），需要等写完时await flush()。
+        """
+        if not self.active:
+            return None
+        self.profile.disable()
+        self.active = False
+        if self._sampler is not None:
+            self._sampler.cancel()
+            self._sampler = None
+        report = self._collect_report()
+        self.profile = None
+        self.first_seen = {}
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is None:
+            return self._finish_report(report, self._run_write(report))
+        writing = asyncio.ensure_future(loop.run_in_executor(None, self._run_write, report))
+        self._writing.add(writing)
+        writing.add_done_callback(self._writing.discard)
+        writing.add_done_callback(lambda future: self._finish_report(report, future.result()))
+        return report['base'] + ".txt"
+
+    def _run_write(self, report):
+        """写入报告，返回None或写入时的异常"""
+        try:
+            self.write_report(report)
+        except Exception as e:
+            return e
+        return None
+
+    def _finish_report(self, report, error):
+        if error is not None:
+            print(f"❌ 写入性能分析报告失败: {error}")
+            return None
+        path = report['base'] + ".txt"
+        self.last_report = path
+        self.reports += 1
+        print(f"🔬 性能分析完成（{report['cycles']}轮）: {path}")
+        return path
+
+    async def flush(self):
+        """等待进行中的报告写入完成"""
+        if self._writing:
+            await asyncio.gather(*self._writing)
+
+    def toggle(self):
+        """SIGUSR1：未在分析时开始，正在分析时提前结束"""
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+
+    # ---- asyncio任务采样 ----
+
+    async def _sample(self):
+        current = asyncio.current_task()
+        while self.active:
+            self.dump_tasks(exclude=current)
+            if time.monotonic() - self.started_at >= self.max_seconds:
+                print(f"⏱️ 性能分析超过{self.max_seconds:g}秒（控制循环只完成了{self.cycles}轮），提前结束")
+                self._sampler = None
+                self.stop()
+                return
+            await asyncio.sleep(self.sample_interval)
+
+    def dump_tasks(self, exclude=None):
+        """当前所有未完成的任务：[(已等待秒数, 任务名, 调用链, 位置, 等待的任务)]，按已等待时间降序"""
+        now = time.monotonic()
+        rows = []
+        for task in asyncio.all_tasks():
+            if task is exclude or task.done():
+                continue
+            names, frame = _await_chain(task.get_coro())
+            location = f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno}" if frame else "?"
+            chain = " > ".join(names)
+            seen = self.first_seen.setdefault((task, chain, location), now)
+            waiter = getattr(task, '_fut_waiter', None)   # 任务当前挂起等待的Future，是另一个任务时记录其名称
+            rows.append((now - seen, task.get_name(), chain, location,
+                         waiter.get_name() if isinstance(waiter, asyncio.Task) else ""))
+        rows.sort(key=lambda row: row[0], reverse=True)
+        return rows
+
+    # ---- 报告 ----
+
+    @staticmethod
+    def _format_tasks(rows):
+        lines = []
+        for waited, name, chain, location, waiter in rows:
+            lines.append(f"{waited:>8.2f}s  {name:<12} {location:<28} {chain}")
+            if waiter:
+                lines.append(f"{'':>10}  等待任务: {waiter}")
+        return lines
+
+    def _report_base(self, now):
+        """精确到毫秒的报告文件名，同一毫秒内（或文件已存在时）加序号"""
+        name = f"profile-{now.strftime('%Y%m%d-%H%M%S')}-{now.microsecond // 1000:03d}"
+        base, seq = os.path.join(self.directory, name), 1
+        while base in self._names or os.path.exists(base + ".txt"):
+            seq += 1
+            base = os.path.join(self.directory, f"{name}-{seq}")
+        self._names.add(base)
+        return base
+
+    def _collect_report(self):
+        """在事件循环中取报告需要的任务快照，统计排序和写文件由write_report完成"""
+        now = datetime.now()
+        elapsed = time.monotonic() - self.started_at
+        try:
+            asyncio.get_running_loop()
+            running = True
+        except RuntimeError:
+            running = False
+        lines = [f"# 控制器性能分析 {now.strftime('%Y-%m-%d %H:%M:%S')}",
+                 f"控制循环{self.cycles}轮 / 耗时{elapsed:.2f}s"
+                 f"{f' / 平均每轮{elapsed / self.cycles:.3f}s' if self.cycles else ''}",
+                 "",
+                 "## asyncio任务（开始时）"]
+        lines += self._format_tasks(self.initial_tasks)
+        lines += ["", "## asyncio任务（结束时，已等待 = 分析期间停在同一位置的时长）"]
+        lines += self._format_tasks(self.dump_tasks(exclude=asyncio.current_task()) if running else [])
+        return {'base': self._report_base(now), 'profile': self.profile, 'cycles': self.cycles, 'lines': lines}
+
+    @staticmethod
+    def write_report(report):
+        """写入.prof和.txt报告（可在线程池中调用），返回.txt路径"""
+        directory = os.path.dirname(report['base'])
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        report['profile'].dump_stats(report['base'] + ".prof")
+
+        lines = list(report['lines'])
+        for sort_key, title in (('cumulative', '累计耗时'), ('tottime', '自身耗时')):
+            stream = io.StringIO()
+            pstats.Stats(report['profile'], stream=stream).sort_stats(sort_key).print_stats(40)
+            lines += ["", f"## cProfile（按{title}前40）", stream.getvalue()]
+
+        path = report['base'] + ".txt"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+    # ---- 触发方式 ----
+
+    def install_signal(self, sig=getattr(signal, 'SIGUSR1', None)):
+        """注册信号处理（Windows没有SIGUSR1，返回False）"""
+        if sig is None:
+            return False
+        try:
+            asyncio.get_running_loop().add_signal_handler(sig, self.toggle)
+        except (NotImplementedError, RuntimeError):
+            return False
+        return True
+
+    def remove_signal(self, sig=getattr(signal, 'SIGUSR1', None)):
+        if sig is None:
+            return
+        try:
+            asyncio.get_running_loop().remove_signal_handler(sig)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+    def get_stats(self):
+        return {
+            'active': self.active,
+            'cycles': self.cycles,
+            'remaining': self.remaining if self.active else 0,
+            'reports': self.reports,
+            'last_report': self.last_report
+        }
+
+    async def handle_start(self, request):
+        """POST /profile?cycles=N"""
+        try:
+            cycles = int(request.query.get('cycles', self.default_cycles))
+        except ValueError:
+            return web.json_response({'error': 'cycles必须是整数'}, status=400)
+        started = self.start(max(cycles, 1))
+        return web.json_response(dict(self.get_stats(), started=started), status=202 if started else 409)
+
+    async def handle_stop(self, request):
+        """POST /profile/stop（报告写完后再响应）"""
+        report = self.stop()
+        await self.flush()
+        if report is not None and self.last_report != report:
+            report = None   # 写入失败
+        return web.json_response(dict(self.get_stats(), report=report))
+
+    async def handle_status(self, request):
+        """GET /profile"""
+        return web.json_response(self.get_stats())
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+平滑排名引擎
+功能：
+1. 每个直播间的人数做EWMA平滑，单次采样的抖动不会改变排名
+2. 第1名更换需要同时满足：领先幅度超过margin、持续领先min_dwell秒、该直播间不在切换冷却期内
+3. 其余名次带滞回：只有平滑人数超过前一名margin以上才交换位置
+4. 统计实际切换次数与被抑制的切换次数
+"""
+
+import time
+
+
+class RankingEngine:
+    """带平滑和滞回的直播间排名"""
+
+    def __init__(self, alpha=0.3, margin=0.05, min_dwell=20.0, switch_cooldown=60.0):
+        self.alpha = alpha                      # EWMA系数，越大越跟随最新采样
+        self.margin = margin                    # 挑战者需领先的比例
+        self.min_dwell = min_dwell              # 挑战者需持续领先的秒数
+        self.switch_cooldown = switch_cooldown  # 同一直播间两次成为第1名的最小间隔
+        self.smoothed = {}       # webcast_id -> 平滑人数
+        self._sampled_at = {}    # webcast_id -> 已计入平滑的采样时间
+        self.order = []          # 上一轮的排序（webcast_id）
+        self.leader = None
+        self.leader_since = 0.0
+        self.challenger = None   # (webcast_id, 开始领先的时间)
+        self.last_promoted = {}  # webcast_id -> 上次成为第1名的时间
+        self.switches = 0        # 实际更换第1名的次数
+        self.suppressed = 0      # 原始排序会更换第1名、但被引擎抑制的次数
+        self.raw_switches = 0    # 原始排序下第1名会更换的次数
+        self._raw_leader = None
+
+    def observe(self, live_infos):
+        """把新结果计入EWMA（同一次轮询的结果只计入一次）"""
+        for info in live_infos:
+            if not info['success']:
+                continue
+            webcast_id = info['webcast_id']
+            # 轮询调度返回的缓存结果不重复计入平滑
+            polled_at = info.get('polled_at')
+            if polled_at is not None:
+                if self._sampled_at.get(webcast_id) == polled_at:
+                    continue
+                self._sampled_at[webcast_id] = polled_at
+            previous = self.smoothed.get(webcast_id)
+            count = info['user_count']
+            self.smoothed[webcast_id] = float(count) if previous is None else \
+                self.alpha * count + (1 - self.alpha) * previous
+
+    def _sticky_order(self, candidates):
+        """从上一轮顺序出发做插入排序：只有超过前一名margin以上才上移"""
+        previous_index = {webcast_id: index for index, webcast_id in enumerate(self.order)}
+        start = sorted(candidates, key=lambda w: (previous_index.get(w, len(previous_index)), -self.smoothed[w]))
+        ordered = []
+        for webcast_id in start:
+            value = self.smoothed[webcast_id]
+            position = len(ordered)
+            while position > 0 and value > self.smoothed[ordered[position - 1]] * (1 + self.margin):
+                position -= 1
+            ordered.insert(position, webcast_id)
+        return ordered
+
+    def _is_live(self, info):
+        return info is not None and info['success'] and info.get('status') == 2
+
+    def _choose_leader(self, by_id, ordered, now):
+        """决定本轮第1名，并统计原始排序会产生但被抑制的切换"""
+        live = [webcast_id for webcast_id in ordered if self._is_live(by_id[webcast_id])]
+        if not live:
+            return self.leader if self.leader in by_id else None
+
+        raw_top = max(live, key=lambda w: by_id[w]['user_count'])
+        raw_switched = self._raw_leader is not None and raw_top != self._raw_leader
+        self._raw_leader = raw_top
+        leader = self._decide(live, by_id, now)
+        if raw_switched:
+            self.raw_switches += 1
+            if leader != raw_top:
+                self.suppressed += 1
+        return leader
+
+    def _decide(self, live, by_id, now):
+        """按平滑人数、领先幅度、持续时间和冷却期决定是否更换第1名"""
+        candidate = max(live, key=lambda w: self.smoothed[w])
+
+        # 当前第1名已下播或取不到数据时立即更换
+        if not self._is_live(by_id.get(self.leader)):
+            self._promote(candidate, now)
+            return candidate
+
+        if candidate == self.leader:
+            self.challenger = None
+            return self.leader
+
+        leader_value = self.smoothed[self.leader]
+        allowed = self.smoothed[candidate] > leader_value * (1 + self.margin)
+        if allowed:
+            if self.challenger is None or self.challenger[0] != candidate:
+                self.challenger = (candidate, now)
+            allowed = now - self.challenger[1] >= self.min_dwell
+        else:
+            self.challenger = None
+        if allowed:
+            last = self.last_promoted.get(candidate)
+            allowed = last is None or now - last >= self.switch_cooldown
+
+        if allowed:
+            self._promote(candidate, now)
+            return candidate
+        return self.leader
+
+    def _promote(self, webcast_id, now):
+        if self.leader is not None and webcast_id != self.leader:
+            self.switches += 1
+        self.leader = webcast_id
+        self.leader_since = now
+        self.last_promoted[webcast_id] = now
+        self.challenger = None
+
+    def rank(self, live_infos, now=None):
+        """替代原始排序：返回按平滑人数排列的直播间（第1名经过滞回判断）"""
+        now = time.monotonic() if now is None else now
+        self.observe(live_infos)
+
+        by_id = {info['webcast_id']: info for info in live_infos}
+        successful = [info['webcast_id'] for info in live_infos if info['success']]
+        ordered = self._sticky_order(successful)
+
+        leader = self._choose_leader(by_id, ordered, now)
+        if leader in ordered:
+            ordered.remove(leader)
+            ordered.insert(0, leader)
+        self.order = ordered
+
+        ranked = []
+        for webcast_id in ordered:
+            info = dict(by_id[webcast_id])
+            info['smoothed_count'] = round(self.smoothed[webcast_id])
+            ranked.append(info)
+        ranked.extend(info for info in live_infos if not info['success'])
+        return ranked
+
+    def get_stats(self):
+        return {
+            'leader': self.leader,
+            'switches': self.switches,
+            'suppressed': self.suppressed,
+            'raw_switches': self.raw_switches
+        }
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地排名服务（单一轮询进程 + 推送）
+功能：
+1. 只有本进程访问上游API：自适应调度、并发轮询、平滑排名、人数历史日志，与控制器的轮询流程相同
+2. 每次排名更新生成一份快照（序号、时间、第1名、排序后的全部直播间、统计）；订阅者只收到自己登记的直播间
+   和其中的第1名，相同的直播间集合只编码一次
+3. GET /snapshot：最新快照（REST）；GET /stream：Server-Sent Events推送；/ws：WebSocket推送
+4. 订阅者通过rooms参数登记需要的直播间，服务按所有订阅者的并集轮询，上游请求量与订阅者数量无关
+5. 慢订阅者只会收到最新的快照，不会在服务端堆积
+
+用法：python ranking_service.py [--host 127.0.0.1] [--port 8100] [--api 上游API地址] [--urls live_url.txt]
+订阅方式见ranking_subscriber.py
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import uvicorn
+from fastapi import FastAPI, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from douyin_api_client import DEFAULT_API_BASE_URL, AsyncDouyinAPIClient
+from history_log import HistoryLog
+from leaderboard import Leaderboard
+from poll_scheduler import PollScheduler
+from ranking_engine import RankingEngine
+from room_poller import AsyncRoomPoller
+
+def read_webcast_ids(path):
+    """从直播间URL列表文件中提取webcast_id"""
+    webcast_ids = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                match = re.search(r'live\.douyin\.com/(\d+)', line)
+                if match and match.group(1) not in webcast_ids:
+                    webcast_ids.append(match.group(1))
+    except FileNotFoundError:
+        print(f"⚠️ 未找到 {path}，只轮询订阅者登记的直播间")
+    return webcast_ids
+
+
+def parse_rooms(rooms):
+    """解析rooms查询参数（逗号分隔的webcast_id）"""
+    return [webcast_id for webcast_id in (rooms or '').split(',') if webcast_id.strip().isdigit()]
+
+
+class RankingService:
+    """唯一的轮询方，把排名快照推送给所有订阅者"""
+
+    def __init__(self, api_base_url=DEFAULT_API_BASE_URL, webcast_ids=None, history_log_dir='history_log',
+                 max_rps=5.0, rps_per_room=1 / 30.0, min_cycle_interval=1.0, clock=time.monotonic):
+        self.clock = clock
+        self.api_client = AsyncDouyinAPIClient(api_base_url, pool_size=100, per_host_limit=20, timeout=5.0)
+        self.poller = AsyncRoomPoller(self.api_client, max_concurrency=8, room_timeout=5.0, cycle_timeout=8.0)
+        self.scheduler = PollScheduler(fast_interval=3.0, normal_interval=10.0, slow_interval=30.0,
+                                       max_backoff=300.0, top_n=6, contested_margin=0.1, max_rps=max_rps,
+                                       rps_per_room=rps_per_room)
+        self.ranking = RankingEngine(alpha=0.3, margin=0.05, min_dwell=20.0, switch_cooldown=60.0)
+        self.leaderboard = Leaderboard()
+        self.leaderboard_candidates = 50
+        # 服务是人数历史日志的唯一写入方，订阅者只读（重启时回放）
+        self.history_log = HistoryLog(history_log_dir) if history_log_dir else None
+        self.min_cycle_interval = min_cycle_interval
+        self.static_ids = list(webcast_ids or [])   # 启动时指定的直播间，始终轮询
+        self.watchers = Counter()                   # 订阅者登记的直播间 -> 订阅者数量
+        self.seq = 0
+        self.latest = None          # 最新快照（dict）
+        self.latest_json = None     # 最新快照编码后的JSON（全部直播间）
+        self._views = {}            # 直播间集合 -> 本快照只含这些直播间的JSON，登记相同直播间的订阅者共用
+        self._published = asyncio.Event()
+        self._watch_changed = asyncio.Event()
+        self._task = None
+        self.subscribers = 0
+        self.snapshots_sent = 0
+
+    # ---- 订阅者登记 ----
+
+    @property
+    def webcast_ids(self):
+        webcast_ids = list(self.static_ids)
+        webcast_ids.extend(webcast_id for webcast_id in self.watchers if webcast_id not in self.static_ids)
+        return webcast_ids
+
+    def watch(self, webcast_ids):
+        """登记订阅者需要的直播间，新直播间立即到期"""
+        new = [webcast_id for webcast_id in webcast_ids
+               if webcast_id not in self.watchers and webcast_id not in self.static_ids]
+        self.watchers.update(webcast_ids)
+        self.subscribers += 1
+        if new:
+            self.scheduler.sync(self.webcast_ids, self.clock())
+            self._watch_changed.set()
+
+    def unwatch(self, webcast_ids):
+        """订阅者断开：没有任何订阅者需要的直播间不再轮询"""
+        self.subscribers -= 1
+        self.watchers.subtract(webcast_ids)
+        dropped = [webcast_id for webcast_id, count in self.watchers.items() if count <= 0]
+        for webcast_id in dropped:
+            del self.watchers[webcast_id]
+            if webcast_id not in self.static_ids:
+                self.leaderboard.remove(webcast_id)
+        if dropped:
+            self.scheduler.sync(self.webcast_ids, self.clock())
+
+    # ---- 轮询 ----
+
+    async def poll_rooms(self, webcast_ids):
+        """并发轮询指定直播间，合并后按平滑人数排序（与控制器的poll_rooms相同），返回全部登记的直播间
+
+        前50名经过平滑排名，其余按平滑人数接在后面，请求失败的在最后；
+        每个订阅者的直播间都在快照里，不会因为不在全局前50名而收不到数据。
+        """
+        results = await self.poller.poll(webcast_ids)
+        if self.poller.last_timed_out:
+            print(f"⏱️ 本轮有 {self.poller.last_timed_out} 个直播间超时，使用部分结果")
+
+        now = self.clock()
+        self.scheduler.record(results, now)
+        if self.history_log is not None:
+            self.history_log.append(results)
+        self.ranking.observe(results)
+        self.leaderboard.update_many(results, self.ranking.smoothed)
+        candidates = self.leaderboard.top(self.leaderboard_candidates)
+        live_infos = self.ranking.rank(candidates + self.leaderboard.failed(self.leaderboard_candidates), now)
+        self.scheduler.reschedule(webcast_ids, live_infos, now)
+
+        rest = [dict(info, smoothed_count=round(self.ranking.smoothed[info['webcast_id']]))
+                for info in self.leaderboard.top(len(self.leaderboard))[self.leaderboard_candidates:]]
+        failed = self.leaderboard.failed()[self.leaderboard_candidates:]
+        ranked = [info for info in live_infos if info['success']]
+        return ranked + rest + [info for info in live_infos if not info['success']] + failed
+
+    def publish(self, live_infos):
+        """生成快照并唤醒所有订阅者（只编码一次）"""
+        self.seq += 1
+        self.latest = {
+            'seq': self.seq,
+            'time': time.time(),
+            'clock': self.clock(),
+            'leader': self.ranking.leader,
+            'rooms': live_infos,
+            'stats': {
+                'api': self.poller.get_stats(),
+                'ranking': self.ranking.get_stats(),
+                'scheduler': self.scheduler.get_stats(),
+                'subscribers': self.subscribers
+            }
+        }
+        self.latest_json = json.dumps(self.latest, ensure_ascii=False)
+        self._views = {}
+        published, self._published = self._published, asyncio.Event()
+        published.set()
+
+    def view(self, webcast_ids):
+        """只含指定直播间的最新快照（dict），第1名取这些直播间中排名最前的成功结果"""
+        wanted = set(webcast_ids)
+        rooms = [info for info in self.latest['rooms'] if info['webcast_id'] in wanted]
+        leader = next((info['webcast_id'] for info in rooms if info['success']), None)
+        return dict(self.latest, rooms=rooms, leader=leader)
+
+    def snapshot_json(self, webcast_ids=None):
+        """最新快照的JSON；指定直播间时只含这些直播间（同一快照内按直播间集合缓存）"""
+        if not webcast_ids:
+            return self.latest_json
+        key = frozenset(webcast_ids)
+        data = self._views.get(key)
+        if data is None:
+            data = self._views[key] = json.dumps(self.view(key), ensure_ascii=False)
+        return data
+
+    async def wait_published(self, seq, timeout=None, webcast_ids=None):
+        """等待比seq更新的快照，返回最新快照的JSON（只含webcast_ids）；超时返回None"""
+        if self.seq > seq:
+            return self.snapshot_json(webcast_ids)
+        published = self._published
+        try:
+            await asyncio.wait_for(published.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self.snapshot_json(webcast_ids)
+
+    async def _run(self):
+        self.scheduler.sync(self.webcast_ids, self.clock())
+        while True:
+            try:
+                self._watch_changed.clear()
+                webcast_ids = self.scheduler.due(self.clock())
+                if webcast_ids:
+                    self.publish(await self.poll_rooms(webcast_ids))
+                wait = max(self.scheduler.wait_time(self.clock()), self.min_cycle_interval)
+                try:
+                    # 有订阅者登记新直播间时提前醒来
+                    await asyncio.wait_for(self._watch_changed.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ 排名服务轮询出错: {e}")
+                await asyncio.sleep(5)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.poller.close()
+        if self.history_log is not None:
+            self.history_log.close()
+
+    def get_stats(self):
+        return {
+            'rooms': len(self.webcast_ids),
+            'subscribers': self.subscribers,
+            'seq': self.seq,
+            'snapshots_sent': self.snapshots_sent,
+            'api': self.poller.get_stats()
+        }
+
+
+def create_app(service, keepalive=15.0):
+    """创建FastAPI应用：/snapshot、/stream（SSE）、/ws（WebSocket）、/stats"""
+
+    @asynccontextmanager
+    async def lifespan(app):
+        service.start()
+        try:
+            yield
+        finally:
+            await service.stop()
+
+    app = FastAPI(title="抖音直播间排名服务", lifespan=lifespan)
+
+    @app.get("/snapshot")
+    async def snapshot(rooms: str = Query(None)):
+        """最新快照，rooms参数只保留指定直播间"""
+        webcast_ids = parse_rooms(rooms)
+        if service.latest is None:
+            return JSONResponse({'error': '尚未完成第一轮轮询'}, status_code=503)
+        return Response(service.snapshot_json(webcast_ids), media_type="application/json")
+
+    @app.get("/stream")
+    async def stream(rooms: str = Query(None)):
+        """Server-Sent Events：每次排名更新推送一条ranking事件，空闲时定期发送注释行保持连接"""
+        webcast_ids = parse_rooms(rooms)
+
+        async def events():
+            service.watch(webcast_ids)
+            try:
+                seq = 0
+                while True:
+                    data = await service.wait_published(seq, keepalive, webcast_ids)
+                    if data is None:
+                        yield ": keepalive\n\n"
+                        continue
+                    seq = service.seq
+                    service.snapshots_sent += 1
+                    yield f"id: {seq}\nevent: ranking\ndata: {data}\n\n"
+            finally:
+                service.unwatch(webcast_ids)
+
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.websocket("/ws")
+    async def websocket_stream(websocket: WebSocket, rooms: str = Query(None)):
+        """WebSocket：每次排名更新发送一条JSON文本消息"""
+        webcast_ids = parse_rooms(rooms)
+        await websocket.accept()
+        service.watch(webcast_ids)
+        try:
+            seq = 0
+            while True:
+                data = await service.wait_published(seq, keepalive, webcast_ids)
+                if data is None:
+                    continue
+                seq = service.seq
+                service.snapshots_sent += 1
+                await websocket.send_text(data)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            service.unwatch(webcast_ids)
+
+    @app.get("/stats")
+    async def stats():
+        return service.get_stats()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地排名服务（单一轮询进程，SSE/WebSocket推送）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--api', default=DEFAULT_API_BASE_URL, help='上游API地址')
+    parser.add_argument('--urls', default='live_url.txt', help='直播间URL列表（订阅者还可以登记其他直播间）')
+    parser.add_argument('--max-rps', type=float, default=5.0, help='上游每秒请求数上限（直播间少时）')
+    parser.add_argument('--rps-per-room', type=float, default=1 / 30.0,
+                        help='每个直播间增加的每秒请求数，上限取max(--max-rps, 直播间数 × 该值)，0表示固定为--max-rps')
+    parser.add_argument('--history-log', default='history_log', help='人数历史日志目录，空字符串表示不写入')
+    args = parser.parse_args()
+
+    webcast_ids = read_webcast_ids(args.urls)
+    service = RankingService(args.api, webcast_ids, history_log_dir=args.history_log or None,
+                             max_rps=args.max_rps, rps_per_room=args.rps_per_room)
+    print(f"🚀 排名服务: http://{args.host}:{args.port}，{len(webcast_ids)} 个直播间，上游 {args.api}")
+    print("📡 订阅: /stream（SSE）、/ws（WebSocket）；快照: /snapshot")
+    uvicorn.run(create_app(service), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+排名服务订阅端
+功能：
+1. RankingSubscriber：异步订阅ranking_service.py的SSE推送（aiohttp），断线后自动重连，供OBS控制器使用
+2. iter_snapshots：同步逐条读取SSE推送（requests流式读取），供表格监控工具使用
+3. 订阅时登记需要的直播间，服务按所有订阅者的并集轮询
+4. 快照中的polled_at是服务端的单调时钟，订阅端按首个快照换算到本地时钟，人数历史的去重和趋势计算不受影响
+"""
+
+import asyncio
+import json
+import time
+
+import aiohttp
+import requests
+
+DEFAULT_SERVICE_URL = "http://127.0.0.1:8100"
+
+
+class SSEParser:
+    """逐行解析Server-Sent Events，完整的一条事件返回(event, data)，否则返回None"""
+
+    def __init__(self):
+        self.event = None
+        self.data = []
+
+    def feed(self, line):
+        if not line:
+            if not self.data:
+                self.event = None
+                return None
+            event, data = self.event or 'message', '\n'.join(self.data)
+            self.event, self.data = None, []
+            return event, data
+        if line.startswith(':'):
+            return None
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if field == 'event':
+            self.event = value
+        elif field == 'data':
+            self.data.append(value)
+        return None
+
+
+def stream_url(base_url, rooms=None):
+    url = f"{base_url.rstrip('/')}/stream"
+    if rooms:
+        url += f"?rooms={','.join(rooms)}"
+    return url
+
+
+def iter_snapshots(base_url=DEFAULT_SERVICE_URL, rooms=None, timeout=(3.0, 60.0)):
+    """同步读取排名快照（生成器），连接失败或断开时抛出requests.RequestException"""
+    with requests.get(stream_url(base_url, rooms), stream=True, timeout=timeout,
+                      headers={'Accept': 'text/event-stream'}) as response:
+        response.raise_for_status()
+        parser = SSEParser()
+        for line in response.iter_lines(decode_unicode=True):
+            message = parser.feed(line)
+            if message is not None and message[0] == 'ranking':
+                yield json.loads(message[1])
+    raise requests.ConnectionError("排名服务已断开")
+
+
+class RankingSubscriber:
+    """异步订阅排名服务，保存最新快照"""
+
+    def __init__(self, base_url=DEFAULT_SERVICE_URL, rooms=None, reconnect_delay=2.0, clock=time.monotonic):
+        self.base_url = base_url
+        self.rooms = list(rooms or [])
+        self.reconnect_delay = reconnect_delay
+        self.clock = clock
+        self.latest = None           # 最新快照（polled_at已换算到本地时钟）
+        self.clock_offset = None     # 本地时钟 - 服务端时钟
+        self.connected = False
+        self.received = 0
+        self.reconnects = 0
+        self._consumed = None
+        self._updated = asyncio.Event()
+        self._task = None
+        self._session = None
+
+    async def start(self, timeout=5.0, keep_trying=False):
+        """连接并等待第一份快照，超时或连接失败返回False
+
+        keep_trying为True时失败后仍在后台重连，服务启动后fresh变为True。
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        try:
+            await asyncio.wait_for(self._updated.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            if not keep_trying:
+                await self.close()
+            return False
+
+    def _rebase(self, snapshot):
+        if self.clock_offset is None:
+            self.clock_offset = self.clock() - snapshot['clock']
+        for info in snapshot['rooms']:
+            if 'polled_at' in info:
+                info['polled_at'] += self.clock_offset
+        return snapshot
+
+    async def _run(self):
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=None, sock_connect=3.0,
+                                                                            sock_read=60.0),
+                                              read_bufsize=1024 * 1024)
+        try:
+            while True:
+                try:
+                    await self._listen()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    if self.connected:
+                        print(f"⚠️ 排名服务连接断开: {e}，{self.reconnect_delay:g}秒后重连")
+                self.connected = False
+                self.reconnects += 1
+                await asyncio.sleep(self.reconnect_delay)
+        finally:
+            self.connected = False
+            await self._session.close()
+
+    async def _listen(self):
+        async with self._session.get(stream_url(self.base_url, self.rooms),
+                                     headers={'Accept': 'text/event-stream'}) as response:
+            response.raise_for_status()
+            self.connected = True
+            parser = SSEParser()
+            async for raw in response.content:
+                message = parser.feed(raw.decode('utf-8').rstrip('\r\n'))
+                if message is None or message[0] != 'ranking':
+                    continue
+                self.latest = self._rebase(json.loads(message[1]))
+                self.received += 1
+                self._updated.set()
+        raise ConnectionError("排名服务关闭了推送")
+
+    @property
+    def fresh(self):
+        """是否有尚未取过的快照"""
+        return self.latest is not None and self.latest is not self._consumed
+
+    async def next(self, timeout=None):
+        """等待一份尚未取过的快照（多份未取时只返回最新的一份），超时返回None"""
+        if not self.fresh:
+            self._updated.clear()
+            try:
+                await asyncio.wait_for(self._updated.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        self._consumed = self.latest
+        return self.latest
+
+    @property
+    def stats(self):
+        """服务端附带的统计（API请求、排名引擎、轮询调度）"""
+        return self.latest['stats'] if self.latest else {}
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.connected = False
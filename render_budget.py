@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按排名分配的渲染预算
+功能：
+1. 第1名：全分辨率、全帧率
+2. 其余可见源：降低分辨率和帧率
+3. 预热中的源：隐藏但保持加载，设置与可见源相同，进入画面时无需重新加载
+4. 源池中刚离开画面的源（保留）：同样不关闭浏览器，重新进入时才算真正的命中
+5. 其余前N名以外的源：隐藏时关闭浏览器（shutdown），不再占用OBS的CPU/GPU
+6. 每轮估算渲染负载（百万像素/秒）
+
+注意：OBS浏览器源修改宽高只会调整大小，而修改帧率或shutdown会重建浏览器（页面重新加载）。
+因此分辨率立即生效，可见源的帧率要等所在等级稳定fps_dwell_cycles轮后才调整。
+"""
+
+LEADER = 'leader'
+VISIBLE = 'visible'
+WARM = 'warm'
+CACHED = 'cached'
+OFFSCREEN = 'offscreen'
+
+TIER_NAMES = {LEADER: '第1名', VISIBLE: '可见', WARM: '预热', CACHED: '保留', OFFSCREEN: '画面外'}
+
+
+class RenderBudgetPolicy:
+    """根据排名为每个浏览器源计算渲染设置"""
+
+    def __init__(self, full_width=1080, full_height=1920, full_fps=30,
+                 reduced_scale=0.5, reduced_fps=15, offscreen_shutdown=True, fps_dwell_cycles=3):
+        self.full_width = full_width
+        self.full_height = full_height
+        self.full_fps = full_fps
+        self.reduced_scale = reduced_scale
+        self.reduced_fps = reduced_fps
+        self.offscreen_shutdown = offscreen_shutdown
+        self.fps_dwell_cycles = fps_dwell_cycles
+        self.applied = {}      # sourceName -> 已生效的设置
+        self.tiers = {}        # sourceName -> (等级, 连续轮数)
+        self.last_load = None
+
+    def tier_settings(self, tier):
+        """各等级的目标设置"""
+        if tier == LEADER:
+            return {"width": self.full_width, "height": self.full_height, "fps": self.full_fps, "shutdown": False}
+        if tier in (VISIBLE, WARM, CACHED):
+            return {"width": int(self.full_width * self.reduced_scale),
+                    "height": int(self.full_height * self.reduced_scale),
+                    "fps": self.reduced_fps, "shutdown": False}
+        return {"width": int(self.full_width * self.reduced_scale),
+                "height": int(self.full_height * self.reduced_scale),
+                "fps": self.reduced_fps, "shutdown": self.offscreen_shutdown}
+
+    def _update_tiers(self, tiers):
+        for source_name, tier in tiers.items():
+            previous, cycles = self.tiers.get(source_name, (None, 0))
+            self.tiers[source_name] = (tier, cycles + 1 if previous == tier else 1)
+
+    def plan(self, tiers):
+        """tiers: {sourceName: 等级}，返回需要发送的SetInputSettings请求列表"""
+        self._update_tiers(tiers)
+        requests = []
+        for source_name, tier in tiers.items():
+            target = self.tier_settings(tier)
+            # 未记录过的源按创建时的满配置处理
+            current = self.applied.setdefault(source_name, self.tier_settings(LEADER))
+            changes = {key: value for key, value in target.items() if current.get(key) != value}
+            # 可见源修改帧率会重新加载页面，等级稳定后再调整
+            if "fps" in changes and tier != OFFSCREEN and self.tiers[source_name][1] < self.fps_dwell_cycles:
+                changes.pop("fps")
+            if changes:
+                requests.append((source_name, changes))
+        return requests
+
+    def record(self, source_name, settings):
+        self.applied.setdefault(source_name, self.tier_settings(LEADER)).update(settings)
+
+    def resync(self, input_settings):
+        """重连后以OBS中的实际设置替换已生效的记录，input_settings为{sourceName: inputSettings}"""
+        keys = self.tier_settings(LEADER).keys()
+        self.applied = {source_name: {key: settings[key] for key in keys if key in settings}
+                        for source_name, settings in input_settings.items()}
+
+    def estimate_load(self, tiers):
+        """估算渲染负载（百万像素/秒），与全部源满配置渲染对比"""
+        load = 0.0
+        for source_name, tier in tiers.items():
+            settings = self.applied.get(source_name) or self.tier_settings(tier)
+            if tier == OFFSCREEN and settings.get("shutdown"):
+                continue
+            load += settings["width"] * settings["height"] * settings["fps"] / 1e6
+        baseline = len(tiers) * self.full_width * self.full_height * self.full_fps / 1e6
+        counts = {tier: 0 for tier in TIER_NAMES}
+        for tier in tiers.values():
+            counts[tier] += 1
+        self.last_load = {
+            'mpix_per_sec': round(load, 1),
+            'baseline_mpix_per_sec': round(baseline, 1),
+            'saved_ratio': round(1 - load / baseline, 4) if baseline else 0.0,
+            'tiers': counts
+        }
+        return self.last_load
+
+    async def apply(self, obs, tiers):
+        """发送变化的设置并返回本轮负载估算"""
+        requests = self.plan(tiers)
+        if requests:
+            results = await obs.call_batch([
+                ("SetInputSettings", {"inputName": source_name, "inputSettings": changes})
+                for source_name, changes in requests
+            ])
+            for (source_name, changes), result in zip(requests, results):
+                if result and result["requestStatus"]["result"]:
+                    self.record(source_name, changes)
+        return self.estimate_load(tiers)
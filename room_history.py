@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+直播间人数历史（环形缓冲区）
+功能：
+1. 每个直播间一行固定长度的NumPy环形缓冲区，记录(时间, 人数)，长期运行内存有上限
+2. 增速（最小二乘斜率）、移动平均、分位数对所有直播间一次性向量化计算
+3. 记录每个直播间的人数峰值和累计领先（第1名）时长
+"""
+
+import time
+
+import numpy as np
+
+
+class RoomHistory:
+    """所有直播间的人数时间序列
+
+    时间以相对base_time的秒数保存为float32（运行数天仍有约0.02秒的精度），
+    人数保存为float32，每个样本8字节。NaN时间表示空位。
+    """
+
+    def __init__(self, capacity=120, initial_rooms=64):
+        self.capacity = capacity
+        self.base_time = None   # 首个样本的时间，相对时间以此为零点
+        self.index = {}     # webcast_id -> 行号
+        self.ids = []       # 行号 -> webcast_id
+        self._times = np.full((initial_rooms, capacity), np.nan, dtype=np.float32)
+        self._counts = np.zeros((initial_rooms, capacity), dtype=np.float32)
+        self._heads = np.zeros(initial_rooms, dtype=np.int32)           # 下一个写入位置
+        self._last_sampled = np.full(initial_rooms, np.nan)              # 最近一次记录的轮询时间
+        self.peaks = np.zeros(initial_rooms, dtype=np.int64)
+        self.lead_seconds = np.zeros(initial_rooms)
+        self.leader = None
+        self._leader_since = None
+        self.last_stats = None
+
+    @property
+    def nbytes(self):
+        arrays = (self._times, self._counts, self._heads, self._last_sampled, self.peaks, self.lead_seconds)
+        return sum(array.nbytes for array in arrays)
+
+    def _grow(self, rows):
+        def extend(array, fill):
+            shape = (rows,) + array.shape[1:]
+            grown = np.full(shape, fill, dtype=array.dtype)
+            grown[:len(array)] = array
+            return grown
+
+        self._times = extend(self._times, np.nan)
+        self._counts = extend(self._counts, 0)
+        self._heads = extend(self._heads, 0)
+        self._last_sampled = extend(self._last_sampled, np.nan)
+        self.peaks = extend(self.peaks, 0)
+        self.lead_seconds = extend(self.lead_seconds, 0)
+
+    def _row(self, webcast_id):
+        row = self.index.get(webcast_id)
+        if row is None:
+            row = len(self.ids)
+            if row >= len(self._heads):
+                self._grow(len(self._heads) * 2)
+            self.index[webcast_id] = row
+            self.ids.append(webcast_id)
+        return row
+
+    def record(self, live_infos, now=None):
+        """写入本轮成功的结果（同一次轮询的结果只写入一次），返回写入的样本数"""
+        now = time.monotonic() if now is None else now
+        if self.base_time is None:
+            self.base_time = now
+        rows, times, counts = [], [], []
+        for info in live_infos:
+            if not info['success']:
+                continue
+            row = self._row(info['webcast_id'])
+            sampled_at = info.get('polled_at', now)
+            if self._last_sampled[row] == sampled_at:
+                continue
+            self._last_sampled[row] = sampled_at
+            rows.append(row)
+            times.append(sampled_at - self.base_time)
+            counts.append(info['user_count'])
+        if not rows:
+            return 0
+
+        rows = np.asarray(rows)
+        heads = self._heads[rows]
+        self._times[rows, heads] = times
+        self._counts[rows, heads] = counts
+        self._heads[rows] = (heads + 1) % self.capacity
+        self.peaks[rows] = np.maximum(self.peaks[rows], np.asarray(counts, dtype=np.int64))
+        return len(rows)
+
+    def load(self, webcast_ids, times, counts):
+        """批量载入历史样本（times为monotonic时间），每个直播间只保留最近capacity个，返回载入的直播间数"""
+        webcast_ids = np.asarray(webcast_ids)
+        times = np.asarray(times, dtype=np.float64)
+        counts = np.asarray(counts)
+        if not len(times):
+            return 0
+        if self.base_time is None:
+            self.base_time = float(times.max())
+        order = np.lexsort((times, webcast_ids))
+        unique, starts, sizes = np.unique(webcast_ids[order], return_index=True, return_counts=True)
+        for webcast_id, start, size in zip(unique.tolist(), starts, sizes):
+            row = self._row(str(webcast_id))
+            take = order[start + max(size - self.capacity, 0):start + size]
+            positions = (self._heads[row] + np.arange(len(take))) % self.capacity
+            self._times[row, positions] = times[take] - self.base_time
+            self._counts[row, positions] = counts[take]
+            self._heads[row] = (self._heads[row] + len(take)) % self.capacity
+            self.peaks[row] = max(self.peaks[row], int(counts[order[start:start + size]].max()))
+            self._last_sampled[row] = times[take[-1]]
+        return len(unique)
+
+    def note_leader(self, webcast_id, now=None):
+        """累计第1名的领先时长（每轮调用）"""
+        now = time.monotonic() if now is None else now
+        if self.leader is not None and self.leader in self.index:
+            self.lead_seconds[self.index[self.leader]] += now - self._leader_since
+        self.leader = webcast_id
+        self._leader_since = now
+        if webcast_id is not None:
+            self._row(webcast_id)
+
+    def _trend(self, window, now):
+        """最近window秒样本的最小二乘斜率（人/秒）和平均值，按行向量化计算"""
+        rows = len(self.ids)
+        base_time = now if self.base_time is None else self.base_time
+        times = self._times[:rows].astype(np.float64)
+        counts = self._counts[:rows].astype(np.float64)
+        valid = ~np.isnan(times)
+        recent = valid & (times >= now - base_time - window)
+        samples = recent.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_t = np.where(recent, times, 0).sum(axis=1) / samples
+            mean_c = np.where(recent, counts, 0).sum(axis=1) / samples
+            dt = np.where(recent, times - mean_t[:, None], 0)
+            dc = np.where(recent, counts - mean_c[:, None], 0)
+            slope = (dt * dc).sum(axis=1) / (dt * dt).sum(axis=1)
+        latest = counts[np.arange(rows), (self._heads[:rows] - 1) % self.capacity]
+        return valid, counts, latest, np.nan_to_num(slope), np.nan_to_num(mean_c)
+
+    def compute(self, window=60.0, now=None):
+        """向量化计算所有直播间的统计量
+
+        返回各字段为按行排列的数组：latest最新人数、rate_per_min最近window秒的增速（人/分钟）、
+        moving_average最近window秒的平均人数、p50/p95缓冲区内的分位数（最近秩法）、
+        peak历史峰值、lead_seconds领先时长。
+        """
+        now = time.monotonic() if now is None else now
+        rows = len(self.ids)
+        valid, counts, latest, slope, moving_average = self._trend(window, now)
+
+        # 空位排到末尾后按有效样本数取分位数
+        ordered = np.sort(np.where(valid, counts, np.inf), axis=1)
+        samples = valid.sum(axis=1)
+
+        def percentile(p):
+            ranks = np.clip(np.ceil(p * samples).astype(np.int64) - 1, 0, self.capacity - 1)
+            values = np.take_along_axis(ordered, ranks[:, None], axis=1)[:, 0]
+            return np.where(samples > 0, values, 0.0)
+
+        lead_seconds = self.lead_seconds[:rows].copy()
+        if self.leader in self.index:
+            lead_seconds[self.index[self.leader]] += now - self._leader_since
+
+        self.last_stats = {
+            'ids': list(self.ids),
+            'latest': latest,
+            'rate_per_min': slope * 60,
+            'moving_average': moving_average,
+            'p50': percentile(0.5),
+            'p95': percentile(0.95),
+            'peak': self.peaks[:rows].copy(),
+            'lead_seconds': lead_seconds,
+            'samples': samples
+        }
+        return self.last_stats
+
+    def predict_all(self, horizon, window=60.0, now=None):
+        """按最近window秒的线性趋势预测horizon秒后的人数，返回{webcast_id: 人数}"""
+        now = time.monotonic() if now is None else now
+        valid, counts, latest, slope, moving_average = self._trend(window, now)
+        predicted = np.maximum(latest + slope * horizon, 0.0)
+        return dict(zip(self.ids, predicted.tolist()))
+
+    def room_stats(self, webcast_id):
+        """最近一次compute结果中单个直播间的统计量"""
+        stats = self.last_stats
+        if stats is None or webcast_id not in self.index or self.index[webcast_id] >= len(stats['ids']):
+            return None
+        row = self.index[webcast_id]
+        return {key: values[row].item() for key, values in stats.items() if key != 'ids'}
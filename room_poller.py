@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+抖音直播间并发轮询器
+功能：
+1. 基于aiohttp并发获取所有直播间信息
+2. 通过并发上限控制对本地API的压力
+3. 单个直播间超时与整轮超时，超时后返回已获取的部分结果
+"""
+
+import asyncio
+import time
+
+from douyin_api_client import AsyncDouyinAPIClient, error_info
+
+
+class AsyncRoomPoller:
+    """并发直播间轮询器
+
+    每轮最多同时发出 max_concurrency 个请求，单个直播间超过 room_timeout
+    秒记为超时，整轮超过 cycle_timeout 秒后放弃剩余请求并返回部分结果，
+    因此一轮耗时取决于最慢的允许请求，而不是所有请求耗时之和。
+    """
+
+    def __init__(self, client, max_concurrency=8, room_timeout=5.0, cycle_timeout=8.0):
+        if isinstance(client, str):
+            client = AsyncDouyinAPIClient(client)
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.room_timeout = room_timeout
+        self.cycle_timeout = cycle_timeout
+        self.last_cycle_duration = 0.0
+        self.last_timed_out = 0
+
+    async def fetch_room(self, webcast_id, semaphore=None):
+        """获取单个直播间信息"""
+        semaphore = semaphore or asyncio.Semaphore(1)
+        async with semaphore:
+            return await self.client.get_live_info(webcast_id, timeout=self.room_timeout)
+
+    async def poll(self, webcast_ids):
+        """并发获取所有直播间信息，结果顺序与webcast_ids一致"""
+        start = time.perf_counter()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        tasks = [asyncio.ensure_future(self.fetch_room(webcast_id, semaphore))
+                 for webcast_id in webcast_ids]
+
+        pending = set()
+        if tasks:
+            done, pending = await asyncio.wait(tasks, timeout=self.cycle_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        # 只有到整轮截止时仍未完成的请求记为超时，请求本身抛出的异常按实际错误记录
+        live_infos = []
+        for webcast_id, task in zip(webcast_ids, tasks):
+            if task in pending:
+                live_infos.append(error_info(webcast_id, '本轮超时'))
+            elif task.cancelled():
+                live_infos.append(error_info(webcast_id, '请求已取消'))
+            elif task.exception() is not None:
+                error = task.exception()
+                live_infos.append(error_info(webcast_id, f'请求出错({type(error).__name__}: {error})'))
+            else:
+                live_infos.append(task.result())
+        timed_out = len(pending)
+
+        self.last_cycle_duration = time.perf_counter() - start
+        self.last_timed_out = timed_out
+        return live_infos
+
+    def get_stats(self):
+        """HTTP连接统计"""
+        return self.client.get_stats()
+
+    async def close(self):
+        """关闭HTTP会话"""
+        await self.client.close()
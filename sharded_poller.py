@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片多进程轮询器
+功能：
+1. 按webcast_id的哈希把直播间分配到多个工作进程，每个进程有自己的事件循环和HTTP连接池
+2. 主进程作为汇总方，下发每轮的分片任务并收集结果，接口与AsyncRoomPoller相同
+3. 每个工作进程一条Pipe：每轮一条任务消息、一条结果消息（整个分片的结果一起发送）；
+   两端都在管道可读时由事件循环唤醒，再在线程池中读取整条消息（一万个直播间的结果有数MB，
+   读取不阻塞事件循环），不再定时轮询
+4. 分片超时返回部分结果，上一轮迟到的结果会被丢弃
+5. 直播间少于min_rooms或只有一个CPU核心时不分片，直接在主进程轮询：
+   主进程每个请求约0.3-0.4ms CPU，直播间不多时多进程只会增加进程间传输的开销
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+import zlib
+
+from douyin_api_client import AsyncDouyinAPIClient, ConnectionStats, error_info
+from room_poller import AsyncRoomPoller
+
+
+def shard_of(webcast_id, shards):
+    """稳定的分片下标（不受PYTHONHASHSEED影响）"""
+    return zlib.crc32(webcast_id.encode('utf-8')) % shards
+
+
+async def _recv(conn):
+    """等待Pipe的下一条消息
+
+    可读只说明已有部分字节到达，conn.recv()会阻塞到整条消息读完，所以可读后在线程池中接收；
+    等待可读期间不占用线程（不支持add_reader的事件循环直接在线程池中等待）。
+    """
+    loop = asyncio.get_running_loop()
+    readable = loop.create_future()
+    fd = conn.fileno()
+    try:
+        loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+    except NotImplementedError:
+        readable = None
+    if readable is not None:
+        try:
+            await readable
+        finally:
+            loop.remove_reader(fd)
+    return await loop.run_in_executor(None, conn.recv)
+
+
+def _worker_main(shard_index, api_base_url, options, conn):
+    """工作进程入口"""
+    try:
+        asyncio.run(_worker_loop(shard_index, api_base_url, options, conn))
+    except (KeyboardInterrupt, EOFError):
+        pass
+
+
+async def _worker_loop(shard_index, api_base_url, options, conn):
+    client = AsyncDouyinAPIClient(api_base_url,
+                                  pool_size=options['pool_size'],
+                                  per_host_limit=options['per_host_limit'],
+                                  timeout=options['room_timeout'])
+    poller = AsyncRoomPoller(client,
+                             max_concurrency=options['max_concurrency'],
+                             room_timeout=options['room_timeout'],
+                             cycle_timeout=options['cycle_timeout'])
+    try:
+        while True:
+            task = await _recv(conn)
+            if task is None:
+                break
+            cycle_id, webcast_ids = task
+            live_infos = await poller.poll(webcast_ids)
+            conn.send((cycle_id, shard_index, live_infos, poller.last_timed_out, client.get_stats()))
+    finally:
+        await poller.close()
+
+
+class ShardedRoomPoller:
+    """把直播间分片到多个工作进程轮询，结果在主进程汇总
+
+    每个工作进程内部仍使用AsyncRoomPoller，max_concurrency、pool_size等参数
+    均为单个进程的配置。一轮的直播间少于min_rooms（或只有一个CPU核心）时不分片，
+    由主进程的AsyncRoomPoller轮询（local_client为其HTTP客户端，默认新建）。
+    """
+
+    def __init__(self, api_base_url, workers=4, max_concurrency=8, room_timeout=5.0, cycle_timeout=8.0,
+                 pool_size=100, per_host_limit=20, min_rooms=8000, require_multicore=True, local_client=None):
+        self.api_base_url = api_base_url
+        self.workers = workers
+        self.min_rooms = min_rooms
+        self.require_multicore = require_multicore   # 只有一个CPU核心时不分片（基准测试可关闭）
+        self.cycle_timeout = cycle_timeout
+        self.options = {
+            'max_concurrency': max_concurrency,
+            'room_timeout': room_timeout,
+            'cycle_timeout': cycle_timeout,
+            'pool_size': pool_size,
+            'per_host_limit': per_host_limit
+        }
+        self.local_poller = AsyncRoomPoller(local_client or api_base_url,
+                                            max_concurrency=max_concurrency,
+                                            room_timeout=room_timeout,
+                                            cycle_timeout=cycle_timeout)
+        self.processes = []
+        self.connections = []     # 每个工作进程一条Pipe（主进程端）
+        self.shard_stats = {}     # 分片下标 -> 该进程的连接统计
+        self._reading = {}        # 分片下标 -> 进行中的接收任务（超时取消收集时保留，下一轮继续使用）
+        self.cycle_id = 0
+        self.sharded_cycles = 0
+        self.local_cycles = 0
+        self.last_cycle_duration = 0.0
+        self.last_timed_out = 0
+
+    def should_shard(self, rooms):
+        """直播间足够多且有多个CPU核心时才分片"""
+        return self.workers > 1 and rooms >= self.min_rooms and \
+            (not self.require_multicore or (os.cpu_count() or 1) > 1)
+
+    def start(self):
+        """启动工作进程（首次分片轮询时自动调用）"""
+        if self.processes:
+            return
+        context = multiprocessing.get_context()
+        for shard_index in range(self.workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_worker_main,
+                                      args=(shard_index, self.api_base_url, self.options, child_conn),
+                                      daemon=True)
+            process.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.processes.append(process)
+
+    async def _collect(self, shard_index, cycle_id):
+        """等待分片本轮的结果，丢弃上一轮迟到的结果
+
+        线程池中的recv无法取消，超时后接收任务保留到下一轮，同一管道不会有两个线程同时读取。
+        """
+        while True:
+            reading = self._reading.get(shard_index)
+            if reading is None:
+                reading = asyncio.ensure_future(_recv(self.connections[shard_index]))
+                self._reading[shard_index] = reading
+            try:
+                message = await asyncio.shield(reading)
+            finally:
+                if reading.done():
+                    self._reading.pop(shard_index, None)
+            self.shard_stats[shard_index] = message[4]
+            if message[0] == cycle_id:
+                return message
+
+    async def poll(self, webcast_ids):
+        """分片并发获取所有直播间信息，结果顺序与webcast_ids一致"""
+        if not self.should_shard(len(webcast_ids)):
+            live_infos = await self.local_poller.poll(webcast_ids)
+            self.local_cycles += 1
+            self.last_cycle_duration = self.local_poller.last_cycle_duration
+            self.last_timed_out = self.local_poller.last_timed_out
+            return live_infos
+
+        start = time.perf_counter()
+        self.start()
+        self.cycle_id += 1
+        self.sharded_cycles += 1
+
+        shards = {}
+        for webcast_id in webcast_ids:
+            shards.setdefault(shard_of(webcast_id, self.workers), []).append(webcast_id)
+        for shard_index, shard_ids in shards.items():
+            # 工作进程空闲时一直在读取管道，发送不会长时间阻塞
+            self.connections[shard_index].send((self.cycle_id, shard_ids))
+
+        # 工作进程自身有整轮超时，这里额外留出进程间传输的余量
+        collectors = [asyncio.ensure_future(self._collect(shard_index, self.cycle_id)) for shard_index in shards]
+        done, pending = await asyncio.wait(collectors, timeout=self.cycle_timeout + 1.0)
+        for collector in pending:
+            collector.cancel()
+        results = {}
+        timed_out = 0
+        for collector in done:
+            if collector.exception() is not None:   # 工作进程已退出（EOFError）等
+                continue
+            cycle_id, shard_index, live_infos, shard_timed_out, stats = collector.result()
+            timed_out += shard_timed_out
+            for info in live_infos:
+                results[info['webcast_id']] = info
+
+        live_infos = []
+        for webcast_id in webcast_ids:
+            info = results.get(webcast_id)
+            if info is None:
+                timed_out += 1
+                info = error_info(webcast_id, '本轮超时')
+            live_infos.append(info)
+
+        self.last_cycle_duration = time.perf_counter() - start
+        self.last_timed_out = timed_out
+        return live_infos
+
+    def get_stats(self):
+        """主进程和所有工作进程的连接统计之和"""
+        stats = ConnectionStats()
+        for shard in list(self.shard_stats.values()) + [self.local_poller.get_stats()]:
+            stats.requests += shard['requests']
+            stats.connections_created += shard['connections_created']
+            stats.errors += shard['errors']
+        return stats.snapshot()
+
+    async def close(self):
+        """通知工作进程退出并等待结束"""
+        for conn in self.connections:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        loop = asyncio.get_running_loop()
+        for process in self.processes:
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
+        # 工作进程退出后管道关闭，仍在读取的接收任务以EOFError结束
+        if self._reading:
+            await asyncio.gather(*self._reading.values(), return_exceptions=True)
+            self._reading = {}
+        for conn in self.connections:
+            conn.close()
+        self.processes = []
+        self.connections = []
+        await self.local_poller.close()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+终端差量渲染（无闪烁）
+功能：
+1. 用ANSI光标定位只重写内容变化的行，不再每次刷新都os.system('cls'/'clear')清屏（每次都会启动一个shell）
+2. 按显示宽度（中日韩文字和emoji占2列）截断和补齐，昵称列在终端中对齐
+3. 超出终端宽度的行截断、超出终端高度的行不输出，保证每行的屏幕位置固定；终端尺寸变化时整屏重画
+4. 每轮的状态消息用note()记下，作为页脚和下一帧一起输出（页脚只占画面下方剩余的行，不会让屏幕滚动）；
+   watch_stdout()期间其他地方直接打印到stdout时，下一帧整屏覆盖（不清屏），修复被滚动打乱的画面；
+   另外每隔若干帧整屏覆盖一次
+5. Windows 10+ 自动开启控制台的VT序列支持；输出不是终端（重定向到文件）时逐帧完整输出纯文本
+"""
+
+import os
+import shutil
+import sys
+import unicodedata
+from contextlib import contextmanager, redirect_stdout
+from functools import lru_cache
+
+CSI = "\x1b["
+
+
+@lru_cache(maxsize=4096)
+def char_width(char):
+    """单个字符的显示宽度：宽字符2列，组合字符和零宽字符0列，其余1列"""
+    if char in "\u200b\u200c\u200d\ufe0e\ufe0f" or unicodedata.combining(char):
+        return 0
+    if unicodedata.category(char) == 'Cc':
+        return 0
+    return 2 if unicodedata.east_asian_width(char) in ('W', 'F') else 1
+
+
+def display_width(text):
+    """字符串在终端中占的列数"""
+    if text.isascii():
+        return len(text)
+    return sum(char_width(char) for char in text)
+
+
+def fit(text, width, align='<'):
+    """按显示宽度截断并补齐到width列（align为'<'左对齐或'>'右对齐）"""
+    text = str(text)
+    used = 0
+    for index, char in enumerate(text):
+        char_cols = char_width(char)
+        if used + char_cols > width:
+            text = text[:index]
+            break
+        used += char_cols
+    padding = " " * (width - used)
+    return padding + text if align == '>' else text + padding
+
+
+def enable_windows_vt():
+    """Windows控制台开启ENABLE_VIRTUAL_TERMINAL_PROCESSING，成功或不需要时返回True"""
+    if os.name != 'nt':
+        return True
+    try:
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.GetStdHandle(-11)   # STD_OUTPUT_HANDLE
+        mode = ctypes.c_uint32()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return False
+        return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))
+    except Exception:
+        return False
+
+
+class _OutputWatcher:
+    """转发到原来的stdout，并记下渲染器以外的输出"""
+
+    def __init__(self, renderer, stream):
+        self._renderer = renderer
+        self._stream = stream
+
+    def write(self, text):
+        if text:
+            self._renderer.foreign_output = True
+        return self._stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class TerminalRenderer:
+    """按行比较前后两帧，只重写变化的行"""
+
+    def __init__(self, stream=None, full_refresh_every=30):
+        self.stream = stream                        # None表示使用当前的sys.stdout（兼容redirect_stdout）
+        self.full_refresh_every = full_refresh_every
+        self.ansi = enable_windows_vt()
+        self.previous = []                          # 上一帧输出到屏幕的行（已截断）
+        self.notes = []                             # 本帧之前记下的状态消息（页脚）
+        self.foreign_output = False                 # 上一帧之后有其他输出写到了stdout
+        self.size = None
+        self.frames = 0
+        self.lines_written = 0
+        self.bytes_written = 0
+        self.full_redraws = 0                       # 因其他输出而整屏覆盖的次数
+
+    def _output(self):
+        stream = self.stream if self.stream is not None else sys.stdout
+        return stream._stream if isinstance(stream, _OutputWatcher) else stream
+
+    @contextmanager
+    def watch_stdout(self):
+        """期间打印到stdout的其他输出会让下一帧整屏覆盖"""
+        with redirect_stdout(_OutputWatcher(self, sys.stdout)):
+            yield
+
+    def note(self, line):
+        """记下一条状态消息，在下一帧的画面下方显示（输出不是终端时直接输出）"""
+        stream = self._output()
+        if not (self.ansi and stream.isatty()):
+            stream.write(line + "\n")
+            stream.flush()
+            return
+        self.notes.append(line)
+
+    def clear(self):
+        """清屏并让下一帧整屏重画"""
+        stream = self._output()
+        if self.ansi and stream.isatty():
+            stream.write(f"{CSI}H{CSI}2J")
+            stream.flush()
+        self.previous = []
+
+    def invalidate(self):
+        """下一帧整屏覆盖（不清屏）"""
+        self.previous = []
+
+    def _clip(self, lines, columns, rows):
+        clipped = []
+        for line in lines[:max(rows - 1, 1)]:
+            # 纯ASCII且长度不超过终端宽度时无需逐字符计算
+            if len(line) * 2 >= columns and display_width(line) >= columns:
+                line = fit(line, columns - 1).rstrip()
+            clipped.append(line)
+        return clipped
+
+    def render(self, lines):
+        """输出一帧，返回本帧重写的行数"""
+        stream = self._output()
+        self.frames += 1
+        if not (self.ansi and stream.isatty()):
+            text = "\n".join(lines) + "\n"
+            stream.write(text)
+            stream.flush()
+            self.lines_written += len(lines)
+            self.bytes_written += len(text)
+            return len(lines)
+
+        size = shutil.get_terminal_size()
+        # 页脚只使用画面下方剩余的行，放不下时保留最新的消息
+        room = max(size.lines - 1 - len(lines), 0)
+        notes = self.notes[-room:] if room else []
+        self.notes = []
+        lines = self._clip(lines + notes, size.columns, size.lines)
+        parts = []
+        if size != self.size:
+            parts.append(f"{CSI}H{CSI}2J")
+            self.previous = []
+            self.size = size
+        elif self.foreign_output:
+            # 其他输出可能已让屏幕滚动，绝对行号对应的内容不再可信
+            self.previous = []
+            self.full_redraws += 1
+        elif self.full_refresh_every and self.frames % self.full_refresh_every == 0:
+            self.previous = []
+        self.foreign_output = False
+
+        previous = self.previous
+        changed = 0
+        for row, line in enumerate(lines):
+            if row < len(previous) and previous[row] == line:
+                continue
+            parts.append(f"{CSI}{row + 1};1H{line}{CSI}K")
+            changed += 1
+        # 清除画面下方（上一帧多出的行和两帧之间的其他输出），光标停在画面下一行
+        parts.append(f"{CSI}{len(lines) + 1};1H{CSI}J")
+
+        text = "".join(parts)
+        stream.write(text)
+        stream.flush()
+        self.previous = lines
+        self.lines_written += changed
+        self.bytes_written += len(text)
+        return changed
+
+    def get_stats(self):
+        return {
+            'frames': self.frames,
+            'lines_written': self.lines_written,
+            'bytes_written': self.bytes_written,
+            'full_redraws': self.full_redraws
+        }
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""BrowserSourcePool 的保持加载与淘汰按注入的时钟判断"""
+
+from browser_source_pool import BrowserSourcePool
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def rooms(*webcast_ids):
+    return [(webcast_id, f"https://live.douyin.com/{webcast_id}") for webcast_id in webcast_ids]
+
+
+def test_keep_loaded_follows_injected_clock():
+    clock = FakeClock(1000.0)
+    pool = BrowserSourcePool(3, keep_loaded_seconds=120.0, clock=clock)
+    pool.assign(rooms('a', 'b'))
+    pool.assign(rooms('b'))          # a 离开画面
+    source_a = pool.source_for('a')
+
+    clock.now += 120.0
+    assert source_a in pool.loaded_sources()
+    clock.now += 0.5
+    assert source_a not in pool.loaded_sources()
+
+    # 页面已关闭，重新进入计为未命中并重新加载
+    pool.assign(rooms('a', 'b'))
+    assert pool.get_stats()['reloads'] == 1
+    assert pool.hits == 0
+
+
+def test_return_within_keep_loaded_is_a_hit():
+    clock = FakeClock(0.0)
+    pool = BrowserSourcePool(3, keep_loaded_seconds=120.0, clock=clock)
+    pool.assign(rooms('a', 'b'))
+    pool.assign(rooms('b'))
+    clock.now += 60.0
+    assert pool.assign(rooms('a', 'b')) == []
+    assert pool.hits == 1 and pool.reloads == 0
+
+
+def test_eviction_picks_least_recently_used_by_clock():
+    clock = FakeClock(0.0)
+    pool = BrowserSourcePool(2, keep_loaded_seconds=None, clock=clock)
+    pool.assign(rooms('a'))
+    clock.now = 10.0
+    pool.assign(rooms('b'))
+    clock.now = 20.0
+    retargets = pool.assign(rooms('c'))
+    assert retargets == [(pool.source_for('c'), "https://live.douyin.com/c")]
+    assert pool.source_for('a') is None
+    assert pool.source_for('b') is not None
+    assert pool.evictions == 1
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""同步客户端的连接统计和共享客户端参数检查"""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import douyin_api_client
+from douyin_api_client import DouyinAPIClient, get_shared_client
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"code": 400}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def no_shared_clients(monkeypatch):
+    monkeypatch.setattr(douyin_api_client, '_shared_clients', {})
+
+
+def test_connections_counted_when_stats_are_read(api_url, monkeypatch):
+    client = DouyinAPIClient(api_url)
+    counted = []
+    count_connections = client._count_connections
+    monkeypatch.setattr(client, '_count_connections', lambda: counted.append(1) or count_connections())
+    for _ in range(5):
+        client.get_live_info("1")
+    assert counted == []
+    stats = client.get_stats()
+    assert stats['requests'] == 5
+    assert stats['connections_created'] == 1
+    assert stats['connections_reused'] == 4
+    client.close()
+    assert client.stats.connections_created == 1
+
+
+def test_shared_client_is_reused():
+    client = get_shared_client("http://api.test", per_host_limit=4)
+    assert get_shared_client("http://api.test") is client
+    assert get_shared_client("http://api.test", per_host_limit=4) is client
+    assert get_shared_client("http://other.test") is not client
+
+
+def test_shared_client_rejects_different_options():
+    get_shared_client("http://api.test", per_host_limit=4)
+    with pytest.raises(ValueError):
+        get_shared_client("http://api.test", per_host_limit=8)
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""LayoutReconciler 的三步协议（创建 → 变更 → 确认URL后显示）与每轮请求数，使用 MockOBSServer"""
+
+import asyncio
+
+import pytest
+import websockets
+
+from browser_source_pool import BrowserSourcePool
+from layout_reconciler import LayoutReconciler
+from mock_obs_server import MockOBSServer
+from obs_command_queue import OBSCommandQueue
+from obs_connection import OBSConnection
+from obs_scene_graph import OBSSceneGraph
+
+SCENE = "直播间综合监控"
+
+
+class RecordingOBSServer(MockOBSServer):
+    """按顺序记录收到的请求和发出的响应：('request' | 'ack', requestType, requestData)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.log = []
+        self._received = []
+
+    def _process(self, request):
+        request_data = request.get("requestData") or {}
+        self.log.append(('request', request.get("requestType"), request_data))
+        self._received.append((request.get("requestType"), request_data))
+        return super()._process(request)
+
+    def _respond(self, session, message, events, extra_delay=0.0):
+        received, self._received = self._received, []
+
+        async def respond(delay):
+            await asyncio.sleep(delay)
+            self.log.extend(('ack', request_type, request_data) for request_type, request_data in received)
+            await self._send_later(session, message, events, 0.0)
+
+        task = asyncio.ensure_future(respond(self._delay() + extra_delay))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+
+def room(index):
+    webcast_id = str(1000 + index)
+    return {'success': True, 'webcast_id': webcast_id, 'status': 2, 'user_count': 10000 - index,
+            'url': f"https://live.douyin.com/{webcast_id}"}
+
+
+def settings(url):
+    return {'url': url, 'width': 1080, 'height': 1920, 'fps': 30}
+
+
+async def connect(server):
+    websocket = await websockets.connect(server.url)
+    obs = OBSConnection(websocket)
+    await obs.identify()
+    graph = OBSSceneGraph()
+    graph.attach(obs)
+    obs.start()
+    await graph.load(obs)
+    return obs, graph
+
+
+def run_with_server(scenario, **server_kwargs):
+    async def main():
+        server = RecordingOBSServer(latency=0.002, **server_kwargs)
+        await server.start(port=0)
+        obs, graph = await connect(server)
+        try:
+            return await scenario(server, obs, graph)
+        finally:
+            await obs.close()
+            await server.stop()
+    return asyncio.run(main())
+
+
+async def reconcile_counted(server, layout, obs, graph, live_infos, warm_infos=()):
+    """执行一轮reconcile，返回(统计, 本轮OBS收到的请求数)"""
+    before = server.total_requests
+    stats = await layout.reconcile(obs, graph, live_infos, warm_infos)
+    return stats, server.total_requests - before
+
+
+def test_unchanged_layout_sends_no_requests():
+    async def scenario(server, obs, graph):
+        layout = LayoutReconciler(SCENE, settings, max_slots=6)
+        rooms = [room(index) for index in range(8)]
+
+        stats, requests = await reconcile_counted(server, layout, obs, graph, rooms)
+        # CreateScene + 6 × (CreateInput + GetSceneItemId)，再6条位置
+        assert requests == 1 + 6 * 2 + 6
+        assert stats['created'] == 6 and stats['moved'] == 6 and stats['round_trips'] == 2
+
+        for _ in range(3):
+            stats, requests = await reconcile_counted(server, layout, obs, graph, rooms)
+            assert requests == 0
+            assert stats['round_trips'] == 0
+
+    run_with_server(scenario)
+
+
+def test_rank_swap_only_moves_swapped_sources():
+    async def scenario(server, obs, graph):
+        layout = LayoutReconciler(SCENE, settings, max_slots=6)
+        rooms = [room(index) for index in range(8)]
+        await layout.reconcile(obs, graph, rooms)
+
+        swapped = list(rooms)
+        swapped[1], swapped[4] = swapped[4], swapped[1]
+        before = len(server.log)
+        stats, requests = await reconcile_counted(server, layout, obs, graph, swapped)
+        assert requests == 2
+        assert stats['moved'] == 2 and stats['round_trips'] == 1
+        sent = [entry for entry in server.log[before:] if entry[0] == 'request']
+        assert {entry[1] for entry in sent} == {"SetSceneItemTransform"}
+
+    run_with_server(scenario)
+
+
+def test_room_dropping_out_is_hidden_not_removed():
+    async def scenario(server, obs, graph):
+        layout = LayoutReconciler(SCENE, settings, max_slots=6)
+        rooms = [room(index) for index in range(8)]
+        await layout.reconcile(obs, graph, rooms)
+
+        entering = rooms[:5] + [rooms[6]]
+        stats, requests = await reconcile_counted(server, layout, obs, graph, entering)
+        # 第1步创建新源（CreateInput + GetSceneItemId），第2步移动新源并隐藏跌出的源
+        assert requests == 2 + 2
+        assert stats == dict(stats, created=1, moved=1, hidden=1, shown=0, round_trips=2)
+        assert server.request_counts["RemoveInput"] == 0
+
+    run_with_server(scenario)
+
+
+@pytest.mark.parametrize('queued', [False, True])
+def test_retargeted_pool_slot_is_shown_only_after_url_ack(queued):
+    async def scenario(server, obs, graph):
+        target = OBSCommandQueue(obs) if queued else obs
+        pool = BrowserSourcePool(8, keep_loaded_seconds=None)
+        layout = LayoutReconciler(SCENE, settings, max_slots=6, pool=pool)
+        rooms = [room(index) for index in range(8)]
+
+        stats, requests = await reconcile_counted(server, layout, target, graph, rooms)
+        # 一次性创建所有槽位（已分配的直接使用目标URL），再设置6个位置并显示
+        assert requests == 1 + 8 * 2 + 6 + 6
+        assert stats['retargeted'] == 0 and stats['round_trips'] == 2
+
+        stats, requests = await reconcile_counted(server, layout, target, graph, rooms)
+        assert requests == 0
+
+        before = len(server.log)
+        entering = rooms[:5] + [rooms[7]]
+        stats, requests = await reconcile_counted(server, layout, target, graph, entering)
+        source_name = pool.source_for(rooms[7]['webcast_id'])
+        scene_item_id = graph.get_scene_item_id(SCENE, source_name)
+        # 第2步：SetInputSettings + 位置 + 隐藏跌出的源；第3步：显示
+        assert requests == 4
+        assert stats == dict(stats, retargeted=1, moved=1, hidden=1, shown=1, failed=0, round_trips=2)
+
+        log = server.log[before:]
+        ack = log.index(('ack', "SetInputSettings",
+                         {"inputName": source_name, "inputSettings": {"url": rooms[7]['url']}}))
+        show = log.index(('request', "SetSceneItemEnabled",
+                          {"sceneName": SCENE, "sceneItemId": scene_item_id, "sceneItemEnabled": True}))
+        assert ack < show
+        assert server.inputs[source_name]['inputSettings']['url'] == rooms[7]['url']
+        assert rooms[7]['webcast_id'] in layout.visible_ids
+        if queued:
+            await target.close()
+
+    run_with_server(scenario)
+
+
+def test_failed_retarget_is_not_shown_and_slot_is_released():
+    async def scenario(server, obs, graph):
+        pool = BrowserSourcePool(8, keep_loaded_seconds=None)
+        layout = LayoutReconciler(SCENE, settings, max_slots=6, pool=pool)
+        rooms = [room(index) for index in range(8)]
+        await layout.reconcile(obs, graph, rooms)
+
+        server.error_rate = 1.0
+        server.error_requests = {"SetInputSettings"}
+        entering = rooms[:5] + [rooms[7]]
+        stats, requests = await reconcile_counted(server, layout, obs, graph, entering)
+        assert stats['retargeted'] == 0 and stats['shown'] == 0 and stats['failed'] == 1
+        assert stats['round_trips'] == 1
+        assert server.request_counts["SetSceneItemEnabled"] == 6 + 1   # 只有初始显示和本轮的隐藏
+        assert pool.source_for(rooms[7]['webcast_id']) is None
+        assert rooms[7]['webcast_id'] not in layout.visible_ids
+
+    run_with_server(scenario)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""live_decoder 的人数解析（各种格式）和人数字段的数据源优先级"""
+
+import json
+import math
+
+import pytest
+
+from live_decoder import _count_value, decode_live_info, parse_count, stdlib_loads
+
+
+@pytest.mark.parametrize('value, count, display', [
+    (12345, 12345, "12345"),
+    (0, 0, "0"),
+    ("12345", 12345, "12345"),
+    (" 12345 ", 12345, "12345"),
+    ("1,234", 1234, "1234"),
+    ("1,234,567", 1234567, "1234567"),
+    ("999+", 999, "999"),
+    (1234.0, 1234, "1234"),
+    (1234.6, 1235, "1235"),
+    ("1234.0", 1234, "1234"),
+    ("1.2万", 12000, "1.2万"),
+    ("10万+", 100000, "10万+"),
+    ("1.2万+", 12000, "1.2万+"),
+    ("3.5w", 35000, "3.5w"),
+    ("3.5W", 35000, "3.5W"),
+    ("1亿", 100000000, "1亿"),
+    ("1.5亿+", 150000000, "1.5亿+"),
+    ("2.5k", 2500, "2.5k"),
+    ("12K", 12000, "12K"),
+])
+def test_parse_count_formats(value, count, display):
+    assert parse_count(value) == (count, display)
+
+
+@pytest.mark.parametrize('value', [
+    None, "", "   ", "abc", "万", "--", True, False,
+    math.nan, math.inf, -math.inf, "nan", "inf", "1e999",
+])
+def test_parse_count_unrecognized_is_zero(value):
+    assert parse_count(value) == (0, "--")
+
+
+def test_parse_count_returns_int():
+    for value in (1234.0, "1234.0", "1.2万", "3.5w"):
+        count, _ = parse_count(value)
+        assert count.__class__ is int
+
+
+def test_count_value_prefers_stats():
+    room = {'stats': {'user_count_str': '1.2万'}, 'room_view_stats': {'display_value': 9000},
+            'user_count_str': '8000'}
+    assert _count_value(room) == '1.2万'
+
+
+@pytest.mark.parametrize('stats', [None, {}, {'user_count_str': ''}, {'user_count_str': '  '},
+                                   {'user_count_str': None}, 'not a dict'])
+def test_count_value_falls_back_to_room_view_stats(stats):
+    room = {'stats': stats, 'room_view_stats': {'display_value': 9000}, 'user_count_str': '8000'}
+    assert _count_value(room) == 9000
+
+
+@pytest.mark.parametrize('view_stats', [None, {}, {'display_value': None}, ['not', 'a', 'dict']])
+def test_count_value_falls_back_to_user_count_str(view_stats):
+    room = {'stats': {}, 'room_view_stats': view_stats, 'user_count_str': '8000'}
+    assert _count_value(room) == '8000'
+
+
+def test_count_value_defaults_to_zero():
+    assert _count_value({}) == '0'
+    assert parse_count(_count_value({})) == (0, "0")
+
+
+def response(room, code=200):
+    return {'code': code, 'data': {'data': {'data': [room] if room else [], 'user': {'nickname': '主播'}}}}
+
+
+def test_decode_live_info_extracts_ranking_fields():
+    room = {'id_str': '7000', 'title': '标题', 'status': 2,
+            'stats': {'user_count_str': '1.2万+'}, 'user_count_str': '999'}
+    body = json.dumps(response(room), ensure_ascii=False).encode('utf-8')
+    info = decode_live_info('123', body)
+    assert info == {
+        'success': True, 'webcast_id': '123', 'url': "https://live.douyin.com/123",
+        'nickname': '主播', 'title': '标题', 'user_count': 12000, 'user_count_display': '1.2万+',
+        'user_count_raw': '1.2万+', 'status': 2, 'room_id': '7000'
+    }
+
+
+@pytest.mark.parametrize('data', [response(None), response({'id_str': '1'}, code=500)])
+def test_decode_live_info_closed_room(data):
+    info = decode_live_info('123', json.dumps(data))
+    assert info['success'] is False
+    assert info['error'] == '直播间关闭'
+
+
+def test_stdlib_loads_accepts_bytes_and_str():
+    text = '{"名称": "主播", "n": 1}'
+    assert stdlib_loads(text.encode('utf-8')) == stdlib_loads(text) == {'名称': '主播', 'n': 1}
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""OBSCommandQueue：按键合并、优先级、切换通道、分批和限速（使用假的OBSConnection）"""
+
+import asyncio
+
+from obs_command_queue import OBSCommandQueue
+
+
+class FakeOBS:
+    """记录收到的请求；gate未打开时批量请求停在途中"""
+
+    def __init__(self):
+        self.connected = True
+        self.calls = []          # 单条请求 (requestType, requestData)
+        self.batches = []        # 每个批次的 [(requestType, requestData), ...]
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.in_flight = 0
+
+    @staticmethod
+    def _result(request_type, request_data):
+        return {'requestType': request_type, 'requestData': request_data,
+                'requestStatus': {'result': True, 'code': 100}}
+
+    async def call(self, request_type, request_data=None, timeout=None):
+        self.calls.append((request_type, request_data))
+        await asyncio.sleep(0)
+        return self._result(request_type, request_data)
+
+    async def call_batch(self, requests, halt_on_failure=False, execution_type=None, timeout=None):
+        self.batches.append(list(requests))
+        self.in_flight += 1
+        try:
+            await self.gate.wait()
+        finally:
+            self.in_flight -= 1
+        return [self._result(request_type, request_data) for request_type, request_data in requests]
+
+    @property
+    def sent(self):
+        return self.calls + [request for batch in self.batches for request in batch]
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def transform(item_id, **fields):
+    return ("SetSceneItemTransform", {'sceneName': '直播间综合监控', 'sceneItemId': item_id,
+                                      'sceneItemTransform': fields})
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_pending_transform_is_replaced_and_all_futures_get_surviving_result():
+    async def scenario():
+        obs = FakeOBS()
+        queue = OBSCommandQueue(obs)
+        first = asyncio.ensure_future(queue.call(*transform(1, positionX=10, positionY=20)))
+        second = asyncio.ensure_future(queue.call(*transform(1, positionX=30)))
+        third = asyncio.ensure_future(queue.call(*transform(1, scaleX=0.5)))
+        results = await asyncio.gather(first, second, third)
+        await queue.close()
+        return obs, queue, results
+
+    obs, queue, results = run(scenario())
+    assert len(obs.sent) == 1
+    request_type, request_data = obs.sent[0]
+    assert request_type == "SetSceneItemTransform"
+    assert request_data['sceneItemTransform'] == {'positionX': 30, 'positionY': 20, 'scaleX': 0.5}
+    assert results[0] is results[1] is results[2]
+    assert results[0]['requestData'] is request_data
+    assert queue.merged == 2
+    assert queue.enqueued == 3
+
+
+def test_visibility_and_program_scene_keep_only_latest():
+    async def scenario():
+        obs = FakeOBS()
+        queue = OBSCommandQueue(obs)
+        enabled = ("SetSceneItemEnabled", {'sceneName': 's', 'sceneItemId': 3, 'sceneItemEnabled': True})
+        disabled = ("SetSceneItemEnabled", {'sceneName': 's', 'sceneItemId': 3, 'sceneItemEnabled': False})
+        results = await asyncio.gather(
+            queue.call(*enabled), queue.call(*disabled),
+            queue.call("SetCurrentProgramScene", {'sceneName': 'A'}),
+            queue.call("SetCurrentProgramScene", {'sceneName': 'B'}))
+        await queue.close()
+        return obs, results
+
+    obs, results = run(scenario())
+    assert sorted(obs.sent, key=lambda request: request[0]) == [
+        ("SetCurrentProgramScene", {'sceneName': 'B'}),
+        ("SetSceneItemEnabled", {'sceneName': 's', 'sceneItemId': 3, 'sceneItemEnabled': False}),
+    ]
+    assert results[0] is results[1]
+    assert results[2] is results[3]
+
+
+def test_different_targets_are_not_merged():
+    async def scenario():
+        obs = FakeOBS()
+        queue = OBSCommandQueue(obs)
+        await asyncio.gather(queue.call(*transform(1, positionX=1)), queue.call(*transform(2, positionX=2)),
+                             queue.call("CreateInput", {'inputName': 'x'}),
+                             queue.call("CreateInput", {'inputName': 'x'}))
+        await queue.close()
+        return obs, queue
+
+    obs, queue = run(scenario())
+    assert len(obs.sent) == 4
+    assert queue.merged == 0
+
+
+def test_bulk_batch_is_ordered_by_priority():
+    async def scenario():
+        obs = FakeOBS()
+        queue = OBSCommandQueue(obs)
+        await asyncio.gather(
+            queue.call("CreateInput", {'inputName': 'x'}),
+            queue.call(*transform(1, positionX=1)),
+            queue.call("SetSceneItemEnabled", {'sceneName': 's', 'sceneItemId': 1, 'sceneItemEnabled': True}))
+        await queue.close()
+        return obs
+
+    obs = run(scenario())
+    assert [request_type for request_type, _ in obs.batches[0]] == \
+        ["SetSceneItemEnabled", "SetSceneItemTransform", "CreateInput"]
+
+
+def test_program_scene_switch_is_not_queued_behind_relayout():
+    async def scenario():
+        obs = FakeOBS()
+        obs.gate.clear()
+        queue = OBSCommandQueue(obs, max_rps=2000.0, burst=500, max_batch=50, clock=FakeClock())
+        relayout = [asyncio.ensure_future(queue.call(*transform(item_id, positionX=item_id)))
+                    for item_id in range(500)]
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert obs.in_flight == 1
+
+        switch = await asyncio.wait_for(queue.call("SetCurrentProgramScene", {'sceneName': '直播_1'}), 1.0)
+        assert switch['requestType'] == "SetCurrentProgramScene"
+        assert obs.calls == [("SetCurrentProgramScene", {'sceneName': '直播_1'})]
+        # 切换完成时重排只发出了第一批，其余仍在队列中
+        assert len(obs.batches) == 1
+        assert not any(future.done() for future in relayout)
+
+        obs.gate.set()
+        await asyncio.wait_for(asyncio.gather(*relayout), 1.0)
+        await queue.close()
+        return obs
+
+    obs = run(scenario())
+    assert [len(batch) for batch in obs.batches] == [50] * 10
+
+
+def test_max_batch_splits_bulk_commands():
+    async def scenario():
+        obs = FakeOBS()
+        queue = OBSCommandQueue(obs, max_batch=50, clock=FakeClock())
+        await queue.call_batch([transform(item_id, positionX=item_id) for item_id in range(120)])
+        await queue.close()
+        return obs, queue
+
+    obs, queue = run(scenario())
+    assert [len(batch) for batch in obs.batches] == [50, 50, 20]
+    assert queue.batches == 3
+    assert queue.sent == 120
+
+
+def test_token_bucket_limits_commands_until_clock_advances():
+    async def scenario():
+        obs = FakeOBS()
+        clock = FakeClock()
+        queue = OBSCommandQueue(obs, max_rps=100.0, burst=5, max_batch=50, clock=clock)
+        futures = [asyncio.ensure_future(queue.call(*transform(item_id, positionX=1))) for item_id in range(8)]
+        await asyncio.sleep(0.05)
+        # 时钟不走，令牌用完后不再发送
+        assert len(obs.sent) == 5
+        assert queue.tokens == 0
+
+        clock.now += 0.03        # 补充3个令牌
+        await asyncio.wait_for(asyncio.gather(*futures), 1.0)
+        await queue.close()
+        return obs, queue
+
+    obs, queue = run(scenario())
+    assert len(obs.sent) == 8
+    assert [len(batch) for batch in obs.batches] == [5, 3]
+
+
+def test_switch_and_get_requests_do_not_consume_tokens():
+    async def scenario():
+        obs = FakeOBS()
+        queue = OBSCommandQueue(obs, max_rps=100.0, burst=1, clock=FakeClock())
+        await queue.call(*transform(1, positionX=1))
+        await asyncio.wait_for(queue.call("SetCurrentProgramScene", {'sceneName': 'A'}), 1.0)
+        await asyncio.wait_for(queue.call("GetSceneItemId", {'sceneName': 'A', 'sourceName': 'x'}), 1.0)
+        tokens = queue.tokens
+        await queue.close()
+        return tokens
+
+    assert run(scenario()) == 0
+
+
+def test_close_fails_unsent_commands():
+    async def scenario():
+        obs = FakeOBS()
+        queue = OBSCommandQueue(obs, max_rps=100.0, burst=1, clock=FakeClock())
+        futures = [asyncio.ensure_future(queue.call(*transform(item_id, positionX=1))) for item_id in range(3)]
+        await asyncio.sleep(0.01)
+        await queue.close()
+        return await asyncio.gather(*futures, return_exceptions=True)
+
+    results = run(scenario())
+    assert isinstance(results[0], dict)
+    assert all(isinstance(result, ConnectionError) for result in results[1:])
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""OBSConnection 握手认证，使用 MockOBSServer（两端共用 obs_connection.auth_string）"""
+
+import asyncio
+import base64
+import hashlib
+
+import pytest
+import websockets
+
+from mock_obs_server import MockOBSServer
+from obs_connection import OBSConnection, auth_string
+
+
+def test_auth_string_follows_obs_websocket_v5():
+    # 按协议文档独立计算，避免客户端与模拟服务器共用的实现一起出错而测试仍然通过
+    secret = base64.b64encode(hashlib.sha256(b"secret" + b"salt").digest())
+    expected = base64.b64encode(hashlib.sha256(secret + b"challenge").digest()).decode('utf-8')
+    assert auth_string("secret", "salt", "challenge") == expected
+
+
+def identify_with(server_password, password):
+    async def main():
+        server = MockOBSServer(password=server_password)
+        await server.start(port=0)
+        websocket = await websockets.connect(server.url)
+        try:
+            return await OBSConnection(websocket).identify(password)
+        finally:
+            await websocket.close()
+            await server.stop()
+    return asyncio.run(main())
+
+
+def test_identify_with_password():
+    assert identify_with("secret", "secret")["negotiatedRpcVersion"] == 1
+
+
+def test_identify_with_wrong_password_fails():
+    with pytest.raises(ConnectionError):
+        identify_with("secret", "wrong")
+
+
+def test_identify_without_password_when_required_fails():
+    with pytest.raises(ConnectionError, match="需要密码"):
+        identify_with("secret", None)
+
+
+class FakeWebSocket:
+    async def send(self, message):
+        pass
+
+    async def close(self):
+        pass
+
+
+def test_async_event_handlers_are_kept_and_failures_logged(capsys):
+    async def main():
+        obs = OBSConnection(FakeWebSocket())
+        finished = asyncio.Event()
+
+        async def failing(event_type, event_data):
+            raise RuntimeError("回调失败")
+
+        async def slow(event_type, event_data):
+            await finished.wait()
+
+        obs.subscribe("SceneItemCreated", failing)
+        obs.subscribe("SceneItemCreated", slow)
+        obs._handle_message({"op": 5, "d": {"eventType": "SceneItemCreated", "eventData": {}}})
+        assert len(obs.handler_tasks) == 2
+        await asyncio.sleep(0.01)
+        assert len(obs.handler_tasks) == 1
+        await obs.close()
+        assert obs.handler_tasks == set()
+
+    asyncio.run(main())
+    assert "OBS事件回调出错(SceneItemCreated): 回调失败" in capsys.readouterr().out
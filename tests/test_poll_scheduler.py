@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""PollScheduler：令牌桶补充、按名次的轮询间隔、指数退避上限（now全部由测试给定）"""
+
+import pytest
+
+from poll_scheduler import PollScheduler
+
+
+def live(webcast_id, count, status=2):
+    return {'webcast_id': webcast_id, 'success': True, 'status': status, 'user_count': count}
+
+
+def failed(webcast_id):
+    return {'webcast_id': webcast_id, 'success': False, 'error': '请求出错'}
+
+
+def make_scheduler(**kwargs):
+    kwargs.setdefault('jitter', 0.0)
+    return PollScheduler(fast_interval=3.0, normal_interval=10.0, slow_interval=30.0, max_backoff=300.0,
+                         top_n=3, contested_margin=0.1, **kwargs)
+
+
+def poll(scheduler, results, now):
+    """模拟一轮：记录结果并按人数排名后重新安排"""
+    scheduler.record(results, now)
+    ranked = sorted(scheduler.snapshot(), key=lambda info: info.get('user_count', -1), reverse=True)
+    scheduler.reschedule([info['webcast_id'] for info in results], ranked, now)
+
+
+def test_new_rooms_are_due_immediately_in_order():
+    scheduler = make_scheduler(max_rps=100.0)
+    scheduler.sync(['a', 'b', 'c'], now=0.0)
+    assert scheduler.due(0.0) == ['a', 'b', 'c']
+    assert scheduler.due(0.0) == []
+
+
+def test_token_bucket_limits_and_refills():
+    scheduler = make_scheduler(max_rps=2.0, burst=2)
+    scheduler.sync([str(index) for index in range(6)], now=0.0)
+
+    assert scheduler.due(0.0) == ['0', '1']
+    assert scheduler.due(0.0) == []
+    assert scheduler.throttled == 2       # 两次都有到期直播间因令牌不足被推迟
+    assert scheduler.wait_time(0.0) == pytest.approx(0.5)
+
+    assert scheduler.due(0.25) == []
+    assert scheduler.due(0.5) == ['2']
+    # 补充不超过burst
+    assert scheduler.due(100.0) == ['3', '4']
+    assert scheduler.polls == 5
+
+
+def test_rate_scales_with_room_count():
+    scheduler = make_scheduler(max_rps=5.0, rps_per_room=0.1)
+    scheduler.sync([str(index) for index in range(20)], now=0.0)
+    assert scheduler.rate == 5.0
+    scheduler.sync([str(index) for index in range(200)], now=0.0)
+    assert scheduler.rate == pytest.approx(20.0)
+    assert scheduler.burst == pytest.approx(20.0)
+    assert scheduler.get_stats()['max_rps'] == 20.0
+
+    scheduler.due(0.0)
+    assert len(scheduler.due(1.0)) == 20
+
+
+def test_intervals_by_rank_and_contention():
+    scheduler = make_scheduler(max_rps=100.0)
+    results = [live('a', 10000), live('b', 9500), live('c', 5000), live('d', 4800), live('e', 1000)]
+    scheduler.sync([info['webcast_id'] for info in results], now=0.0)
+    scheduler.due(0.0)
+    poll(scheduler, results, now=0.0)
+
+    assert scheduler.intervals == {
+        'a': 3.0,    # 前3名，与第2名相差5%
+        'b': 3.0,
+        'c': 3.0,    # 与第4名（前3名之外）相差4%
+        'd': 10.0,   # 前3名之外但接近第3名
+        'e': 30.0,   # 排名靠后
+    }
+    assert scheduler.due_at['a'] == 3.0
+    assert scheduler.due_at['e'] == 30.0
+
+
+def test_stable_top_rooms_use_normal_interval():
+    scheduler = make_scheduler(max_rps=100.0)
+    results = [live('a', 10000), live('b', 5000), live('c', 2000), live('d', 100)]
+    scheduler.sync([info['webcast_id'] for info in results], now=0.0)
+    scheduler.due(0.0)
+    poll(scheduler, results, now=0.0)
+    assert scheduler.intervals == {'a': 10.0, 'b': 10.0, 'c': 10.0, 'd': 30.0}
+
+
+def test_rooms_outside_ranking_candidates_are_slow():
+    scheduler = make_scheduler(max_rps=100.0)
+    scheduler.sync(['a', 'b'], now=0.0)
+    scheduler.due(0.0)
+    scheduler.record([live('a', 10000), live('b', 9900)], now=0.0)
+    # 只把a交给排名（只对前K名排名时b不在候选中）
+    scheduler.reschedule(['a', 'b'], [scheduler.latest['a']], now=0.0)
+    assert scheduler.intervals['b'] == 30.0
+
+
+@pytest.mark.parametrize('result', [failed('x'), live('x', 0, status=4)])
+def test_offline_or_failed_rooms_back_off_up_to_cap(result):
+    scheduler = make_scheduler(max_rps=100.0)
+    scheduler.sync(['x'], now=0.0)
+    intervals = []
+    now = 0.0
+    for _ in range(7):
+        assert scheduler.due(now) == ['x']
+        poll(scheduler, [dict(result)], now)
+        intervals.append(scheduler.intervals['x'])
+        now = scheduler.due_at['x']
+    assert intervals == [30.0, 60.0, 120.0, 240.0, 300.0, 300.0, 300.0]
+    assert scheduler.get_stats()['backoff'] == 1
+
+
+def test_backoff_resets_when_room_comes_back():
+    scheduler = make_scheduler(max_rps=100.0)
+    scheduler.sync(['x', 'y'], now=0.0)
+    scheduler.due(0.0)
+    poll(scheduler, [failed('x'), live('y', 100)], now=0.0)
+    poll(scheduler, [failed('x')], now=30.0)
+    assert scheduler.intervals['x'] == 60.0
+    poll(scheduler, [live('x', 100000)], now=90.0)
+    assert 'x' not in scheduler.failures
+    assert scheduler.intervals['x'] == 10.0
+
+
+def test_due_room_without_reschedule_falls_back_to_normal_interval():
+    scheduler = make_scheduler(max_rps=100.0)
+    scheduler.sync(['a'], now=0.0)
+    assert scheduler.due(5.0) == ['a']
+    assert scheduler.due_at['a'] == 15.0
+    assert scheduler.due(14.9) == []
+    assert scheduler.due(15.0) == ['a']
+
+
+def test_sync_drops_removed_rooms():
+    scheduler = make_scheduler(max_rps=100.0)
+    scheduler.sync(['a', 'b'], now=0.0)
+    scheduler.due(0.0)
+    poll(scheduler, [failed('a'), live('b', 1)], now=0.0)
+    scheduler.sync(['b'], now=1.0)
+    assert set(scheduler.due_at) == {'b'}
+    assert 'a' not in scheduler.latest and 'a' not in scheduler.failures
+    assert scheduler.due(1000.0) == ['b']
+
+
+def test_jitter_stays_within_bounds():
+    scheduler = make_scheduler(max_rps=1000.0, jitter=0.1)
+    webcast_ids = [str(index) for index in range(200)]
+    scheduler.sync(webcast_ids, now=0.0)
+    scheduler.due(0.0)
+    poll(scheduler, [failed(webcast_id) for webcast_id in webcast_ids], now=0.0)
+    assert all(27.0 <= scheduler.due_at[webcast_id] <= 33.0 for webcast_id in webcast_ids)
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""CycleProfiler 报告文件名不重复，报告在线程池中写入"""
+
+import asyncio
+import os
+import threading
+from datetime import datetime
+
+from profiler import CycleProfiler
+
+
+def test_report_names_within_the_same_millisecond_are_unique(tmp_path):
+    profiler = CycleProfiler(str(tmp_path))
+    now = datetime(2026, 10, 18, 12, 0, 0, 123456)
+    first = profiler._report_base(now)
+    second = profiler._report_base(now)
+    assert os.path.basename(first) == "profile-20261018-120000-123"
+    assert os.path.basename(second) == "profile-20261018-120000-123-2"
+
+
+def test_reports_are_written_off_the_event_loop(tmp_path, monkeypatch):
+    threads = []
+    write_report = CycleProfiler.write_report
+    monkeypatch.setattr(CycleProfiler, 'write_report',
+                        staticmethod(lambda report: threads.append(threading.get_ident()) or write_report(report)))
+
+    async def main():
+        profiler = CycleProfiler(str(tmp_path), sample_interval=0.01)
+        for _ in range(2):
+            assert profiler.start(cycles=1)
+            await asyncio.sleep(0)
+            profiler.cycle_done()
+        await profiler.flush()
+        return profiler
+
+    profiler = asyncio.run(main())
+    assert profiler.reports == 2
+    assert len(threads) == 2 and threading.get_ident() not in threads
+    reports = sorted(name for name in os.listdir(tmp_path) if name.endswith(".txt"))
+    assert len(reports) == 2
+    assert all(os.path.exists(tmp_path / (name[:-4] + ".prof")) for name in reports)
+    assert "控制循环1轮" in (tmp_path / reports[0]).read_text(encoding='utf-8')
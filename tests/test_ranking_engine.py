@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""RankingEngine 的切换判断：近似平局不切换、持续领先后切换、冷却期、下播立即更换"""
+
+import pytest
+
+from ranking_engine import RankingEngine
+
+
+def room(webcast_id, count, status=2, success=True):
+    return {'webcast_id': webcast_id, 'success': success, 'status': status, 'user_count': count}
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_engine(**kwargs):
+    # alpha=1 时平滑值等于最新采样，便于精确控制领先幅度
+    kwargs.setdefault('alpha', 1.0)
+    return RankingEngine(**kwargs)
+
+
+def test_first_leader_is_not_a_switch():
+    engine = make_engine()
+    ranked = engine.rank([room('a', 1000), room('b', 900)], now=0.0)
+    assert ranked[0]['webcast_id'] == 'a'
+    assert engine.leader == 'a'
+    assert engine.switches == 0
+
+
+def test_hovering_near_tie_does_not_flip():
+    engine = make_engine(margin=0.05, min_dwell=20.0, switch_cooldown=60.0)
+    clock = FakeClock()
+    engine.rank([room('a', 1000), room('b', 990)], now=clock())
+    # b 在原始排序里反复超过 a，但领先不到5%
+    for step in range(1, 60):
+        clock.now = float(step)
+        b_count = 1030 if step % 2 else 980
+        engine.rank([room('a', 1000), room('b', b_count)], now=clock())
+        assert engine.leader == 'a'
+    stats = engine.get_stats()
+    assert stats['switches'] == 0
+    # 原始排序每次翻到 b 都被抑制（翻回 a 与引擎一致，不算抑制）
+    assert stats['raw_switches'] == 59
+    assert stats['suppressed'] == 30
+
+
+def test_leader_flips_once_min_dwell_has_passed():
+    engine = make_engine(margin=0.05, min_dwell=20.0, switch_cooldown=60.0)
+    engine.rank([room('a', 1000), room('b', 900)], now=0.0)
+
+    engine.rank([room('a', 1000), room('b', 2000)], now=1.0)
+    assert engine.leader == 'a'
+    assert engine.challenger == ('b', 1.0)
+
+    engine.rank([room('a', 1000), room('b', 2000)], now=20.9)
+    assert engine.leader == 'a'
+
+    ranked = engine.rank([room('a', 1000), room('b', 2000)], now=21.0)
+    assert engine.leader == 'b'
+    assert ranked[0]['webcast_id'] == 'b'
+    assert engine.switches == 1
+    assert engine.leader_since == 21.0
+
+
+def test_challenger_dwell_resets_when_lead_drops_below_margin():
+    engine = make_engine(margin=0.05, min_dwell=20.0, switch_cooldown=0.0)
+    engine.rank([room('a', 1000), room('b', 900)], now=0.0)
+    engine.rank([room('a', 1000), room('b', 2000)], now=1.0)
+    engine.rank([room('a', 1000), room('b', 1010)], now=15.0)
+    assert engine.challenger is None
+    engine.rank([room('a', 1000), room('b', 2000)], now=16.0)
+    engine.rank([room('a', 1000), room('b', 2000)], now=30.0)
+    assert engine.leader == 'a'
+    engine.rank([room('a', 1000), room('b', 2000)], now=36.0)
+    assert engine.leader == 'b'
+
+
+def test_cooldown_blocks_flip_back():
+    engine = make_engine(margin=0.05, min_dwell=5.0, switch_cooldown=60.0)
+    engine.rank([room('a', 1000), room('b', 900)], now=0.0)
+    engine.rank([room('a', 1000), room('b', 2000)], now=1.0)
+    engine.rank([room('a', 1000), room('b', 2000)], now=6.0)
+    assert engine.leader == 'b'
+
+    # a 立刻反超并持续领先，但距离它上次成为第1名不足60秒
+    for now in (7.0, 12.0, 30.0, 59.9):
+        engine.rank([room('a', 5000), room('b', 2000)], now=now)
+        assert engine.leader == 'b'
+
+    engine.rank([room('a', 5000), room('b', 2000)], now=60.0)
+    assert engine.leader == 'a'
+    assert engine.switches == 2
+
+
+@pytest.mark.parametrize('gone', [
+    room('a', 1000, status=4),
+    room('a', 1000, success=False),
+])
+def test_offline_or_failed_leader_is_replaced_immediately(gone):
+    engine = make_engine(margin=0.05, min_dwell=20.0, switch_cooldown=60.0)
+    engine.rank([room('a', 1000), room('b', 900)], now=0.0)
+    # b 刚当过第1名也不受冷却期限制
+    engine.last_promoted['b'] = 0.5
+
+    ranked = engine.rank([gone, room('b', 900)], now=1.0)
+    assert engine.leader == 'b'
+    assert ranked[0]['webcast_id'] == 'b'
+    assert engine.switches == 1
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""TerminalRenderer 差量重画：页脚状态消息不滚屏，其他输出触发整屏覆盖"""
+
+import io
+import os
+import sys
+
+import pytest
+
+import terminal_renderer
+from terminal_renderer import CSI, TerminalRenderer
+
+
+class FakeTTY(io.StringIO):
+    def isatty(self):
+        return True
+
+
+@pytest.fixture
+def tty(monkeypatch):
+    monkeypatch.setattr(terminal_renderer.shutil, 'get_terminal_size', lambda: os.terminal_size((80, 10)))
+    stream = FakeTTY()
+    renderer = TerminalRenderer(stream=stream, full_refresh_every=0)
+    renderer.ansi = True
+    return renderer, stream
+
+
+def frame(tick):
+    return ["标题", f"第{tick}轮", "底部"]
+
+
+def test_unchanged_rows_are_not_rewritten(tty):
+    renderer, stream = tty
+    assert renderer.render(frame(1)) == 3
+    assert renderer.render(frame(2)) == 1
+    assert renderer.render(frame(2)) == 0
+
+
+def test_notes_render_below_frame_without_scrolling(tty):
+    renderer, stream = tty
+    renderer.render(frame(1))
+    for index in range(20):
+        renderer.note(f"消息{index}")
+    stream.seek(0)
+    stream.truncate()
+    renderer.render(frame(1))
+    output = stream.getvalue()
+    # 10行的终端：画面3行 + 页脚最多6行（最后一行留给光标），保留最新的消息
+    assert renderer.previous == frame(1) + [f"消息{index}" for index in range(14, 20)]
+    assert f"{CSI}9;1H消息19" in output
+    assert "\n" not in output
+    assert renderer.notes == []
+
+
+def test_notes_are_cleared_by_the_next_frame(tty):
+    renderer, stream = tty
+    renderer.note("🏆 当前最高人气")
+    renderer.render(frame(1))
+    assert renderer.render(frame(1)) == 0
+    assert renderer.previous == frame(1)
+
+
+def test_foreign_output_forces_full_redraw(tty, monkeypatch):
+    renderer, stream = tty
+    monkeypatch.setattr(sys, 'stdout', stream)
+    with renderer.watch_stdout():
+        renderer.render(frame(1))
+        assert renderer.render(frame(1)) == 0
+        print("⚠️ OBS连接已断开")
+        assert renderer.render(frame(1)) == 3
+        assert renderer.render(frame(1)) == 0
+    assert renderer.full_redraws == 1
+    assert sys.stdout is stream
+
+
+def test_notes_are_written_immediately_when_not_a_tty():
+    stream = io.StringIO()
+    renderer = TerminalRenderer(stream=stream)
+    renderer.note("🔥 预热中: 主播")
+    assert stream.getvalue() == "🔥 预热中: 主播\n"
+    assert renderer.notes == []
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+控制循环的分段追踪（Chrome trace / Perfetto JSON）
+功能：
+1. span(name, lane)记录一段耗时：上游请求、响应解析、轮询、排名、布局调整、切换场景、OBS请求到响应
+2. 人数突变（与该直播间上一个样本相差超过spike_ratio）分配一个关联ID，通过contextvars跟随到
+   排名、布局调整/切换场景、OBS命令队列和对应的OBS响应，在trace中用流向箭头连起来
+3. 事件写入滚动的JSON文件（traces/trace-YYYYmmdd-HHMMSS.json），超过大小后新建文件，只保留最近几个；
+   可直接用 chrome://tracing 或 https://ui.perfetto.dev 打开（正在写入的文件没有结尾的"]"，两者都能读取）
+4. 未启用（install之前）时span返回共享的空对象，不分配、不计时
+"""
+
+import contextvars
+import json
+import os
+import time
+from datetime import datetime
+
+_correlation = contextvars.ContextVar('trace_correlation', default=())
+_tracer = None
+
+
+class _NullSpan:
+    """未启用追踪时的span"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args):
+        pass
+
+    def spike(self, webcast_id, user_count):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'lane', 'args', 'started', 'flow_starts')
+
+    def __init__(self, tracer, name, lane, args):
+        self.tracer = tracer
+        self.name = name
+        self.lane = lane
+        self.args = args
+        self.flow_starts = ()
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args['error'] = exc_type.__name__
+        self.tracer.complete(self.name, self.lane, self.started, time.perf_counter(), self.args,
+                             _correlation.get(), self.flow_starts)
+        return False
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def spike(self, webcast_id, user_count):
+        """人数相对上一个样本突变时，从本span开始一条关联链"""
+        cid = self.tracer.observe_count(webcast_id, user_count)
+        if cid is not None:
+            self.flow_starts += (cid,)
+            self.args.setdefault('spikes', {})[webcast_id] = cid
+
+
+def span(name, lane, **args):
+    """记录一段耗时（with语句），lane为trace中的轨道名"""
+    if _tracer is None:
+        return NULL_SPAN
+    return _Span(_tracer, name, lane, args)
+
+
+def record(name, lane, started, **args):
+    """记录已经结束的一段（started为time.perf_counter()的值），用于包住整轮循环等较长的代码块"""
+    if _tracer is not None:
+        _tracer.complete(name, lane, started, time.perf_counter(), args, _correlation.get(), steps=False)
+
+
+def correlation():
+    """当前上下文的关联ID元组"""
+    return _correlation.get()
+
+
+def set_correlation(cids):
+    """设置当前上下文（当前task）之后的操作所属的关联ID"""
+    if _tracer is not None or _correlation.get():
+        _correlation.set(tuple(cids))
+
+
+def take_spikes(webcast_ids):
+    """取出这些直播间本轮新出现的人数突变的关联ID"""
+    return _tracer.take_spikes(webcast_ids) if _tracer is not None else ()
+
+
+def flush():
+    """把缓冲的事件写入文件（每轮控制循环结束时调用）"""
+    if _tracer is not None:
+        _tracer.flush()
+
+
+def active():
+    return _tracer
+
+
+def install(tracer):
+    global _tracer
+    _tracer = tracer
+    return tracer
+
+
+def uninstall():
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+
+
+class Tracer:
+    """收集trace事件并写入滚动的Chrome trace JSON文件"""
+
+    def __init__(self, directory='traces', max_file_bytes=32 * 1024 * 1024, max_files=5, spike_ratio=0.05):
+        self.directory = directory
+        self.max_file_bytes = max_file_bytes
+        self.max_files = max_files
+        self.spike_ratio = spike_ratio
+        self.pid = os.getpid()
+        self.lanes = {}            # 轨道名 -> tid
+        self.last_counts = {}      # webcast_id -> 上一个样本的人数
+        self.spikes = {}           # webcast_id -> 尚未被排名取走的关联ID
+        self._next_cid = 1
+        self._buffer = []
+        self._file = None
+        self._file_size = 0
+        self.current_path = None
+        self.events = 0
+        self.files_written = 0
+
+    # ---- 关联ID ----
+
+    def observe_count(self, webcast_id, user_count):
+        previous = self.last_counts.get(webcast_id)
+        self.last_counts[webcast_id] = user_count
+        if previous is None or abs(user_count - previous) < max(previous, 1) * self.spike_ratio:
+            return None
+        cid = self._next_cid
+        self._next_cid += 1
+        self.spikes[webcast_id] = cid
+        return cid
+
+    def take_spikes(self, webcast_ids):
+        cids = tuple(self.spikes[webcast_id] for webcast_id in webcast_ids if webcast_id in self.spikes)
+        self.spikes.clear()
+        return cids
+
+    # ---- 事件 ----
+
+    def _tid(self, lane):
+        tid = self.lanes.get(lane)
+        if tid is None:
+            tid = self.lanes[lane] = len(self.lanes) + 1
+            if self._file is not None:   # 新文件打开时会写入全部轨道名
+                self._buffer.append(self._lane_metadata(lane, tid))
+        return tid
+
+    def _lane_metadata(self, lane, tid):
+        return {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': lane}}
+
+    def complete(self, name, lane, started, ended, args, cids=(), flow_starts=(), steps=True):
+        """记录一个完整的span；steps为False时只在参数中记录关联ID，不画流向箭头（用于包住整轮的span）"""
+        tid = self._tid(lane)
+        ts = round(started * 1e6, 1)
+        if cids:
+            args['cids'] = list(cids)
+        self._buffer.append({'name': name, 'cat': 'control', 'ph': 'X', 'ts': ts,
+                             'dur': round((ended - started) * 1e6, 1), 'pid': self.pid, 'tid': tid, 'args': args})
+        # 流向事件绑定到包含该时间点的span上：突变的上游请求为起点，之后经过的每一段为中间点
+        for cid in flow_starts:
+            self._buffer.append({'name': 'spike', 'cat': 'spike', 'ph': 's', 'id': cid,
+                                 'ts': ts, 'pid': self.pid, 'tid': tid})
+        for cid in cids if steps else ():
+            self._buffer.append({'name': 'spike', 'cat': 'spike', 'ph': 't', 'id': cid,
+                                 'ts': ts, 'pid': self.pid, 'tid': tid})
+
+    # ---- 文件 ----
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.current_path = os.path.join(self.directory, f"trace-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.json")
+        self._file = open(self.current_path, 'w', encoding='utf-8')
+        self._file.write("[\n")
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0, 'args': {'name': '抖音OBS控制器'}}]
+        metadata += [self._lane_metadata(lane, tid) for lane, tid in self.lanes.items()]
+        text = ",\n".join(json.dumps(event, ensure_ascii=False) for event in metadata)
+        self._file.write(text)
+        self._file_size = len(text)
+        self.files_written += 1
+        self._prune()
+
+    def _prune(self):
+        files = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith('trace-') and name.endswith('.json'))
+        for name in files[:-self.max_files]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.write("\n]\n")
+            self._file.close()
+            self._file = None
+
+    def flush(self):
+        """把缓冲的事件追加到当前文件（每轮控制循环结束时调用），超过大小时换新文件"""
+        if not self._buffer:
+            return 0
+        if self._file is not None and self._file_size >= self.max_file_bytes:
+            self._close_file()
+        if self._file is None:
+            self._open()
+        events, self._buffer = self._buffer, []
+        text = "".join(",\n" + json.dumps(event, ensure_ascii=False, separators=(',', ':')) for event in events)
+        self._file.write(text)
+        self._file.flush()
+        self._file_size += len(text)
+        self.events += len(events)
+        return len(events)
+
+    def close(self):
+        self.flush()
+        self._close_file()
+
+    def get_stats(self):
+        return {
+            'events': self.events,
+            'files_written': self.files_written,
+            'current_file': self.current_path,
+            'current_file_bytes': self._file_size
+        }